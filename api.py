@@ -1,6 +1,36 @@
-from fastapi import FastAPI
+import secrets
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Query
+from config import config
+from database.database import async_session
+from database.queries import DatabaseQueries
+from utils.bot_manager import bot_manager
+from utils.redis_manager import redis_manager
+from utils.status_manager import StatusManager
 
-app = FastAPI(title="CRM Bot API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await redis_manager.connect()
+    # Главный бот нужен очереди переименований тем
+    main_bot = bot_manager.create_bot(config.MAIN_BOT_TOKEN)
+    bot_manager.connected_bots[0] = main_bot
+    try:
+        yield
+    finally:
+        await main_bot.session.close()
+        await redis_manager.disconnect()
+
+
+app = FastAPI(title="CRM Bot API", lifespan=lifespan)
+
+def _check_api_key(x_api_key: Optional[str]):
+    """Проверка ключа API; без API_KEY в настройках изменяющие запросы отклоняются"""
+    if not config.API_KEY:
+        raise HTTPException(status_code=503, detail="API key is not configured")
+    if not secrets.compare_digest(x_api_key or '', config.API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
 @app.get("/")
 async def root():
@@ -21,3 +51,38 @@ async def get_users():
 @app.get("/subscriptions")
 async def get_subscriptions():
     return {"message": "Manage subscriptions (placeholder for payment management)"}
+
+@app.post("/chats/end-idle")
+async def end_idle_chats(
+    idle_minutes: int = Query(..., gt=0),
+    bot_id: Optional[int] = None,
+    group_id: Optional[int] = None,
+    x_api_key: Optional[str] = Header(None)
+):
+    """Завершение диалогов бота или группы без сообщений дольше idle_minutes"""
+    _check_api_key(x_api_key)
+    if bot_id is None and group_id is None:
+        raise HTTPException(status_code=400, detail="bot_id or group_id is required")
+
+    ended = await StatusManager.end_idle_chats(
+        idle_minutes * 60, bot_id=bot_id, group_id=group_id,
+        group_bot=await bot_manager.get_bot(0)
+    )
+    return {"ended": ended}
+
+@app.put("/bots/{bot_id}/idle-timeout")
+async def set_idle_timeout(
+    bot_id: int,
+    seconds: Optional[int] = Query(None, ge=0),
+    x_api_key: Optional[str] = Header(None)
+):
+    """Порог автозавершения диалогов бота (без seconds - IDLE_CHAT_TIMEOUT, 0 - выключено)"""
+    _check_api_key(x_api_key)
+
+    async with async_session() as session:
+        db = DatabaseQueries(session)
+        if not await db.get_connected_bot_by_id(bot_id):
+            raise HTTPException(status_code=404, detail="Bot not found")
+        await db.update_bot_settings(bot_id, idle_timeout=seconds)
+
+    return {"bot_id": bot_id, "idle_timeout": seconds}
@@ -7,12 +7,102 @@ class Config:
     MAIN_BOT_TOKEN = os.getenv('MAIN_BOT_TOKEN')
     DATABASE_URL = os.getenv('DATABASE_URL')
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # Ключ для изменяющих запросов к API (заголовок X-API-Key), без него они отклоняются
+    API_KEY = os.getenv('API_KEY')
     
     # Настройки шифрования
     ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
     ENCRYPTION_PASSWORD = os.getenv('ENCRYPTION_PASSWORD', 'default_crm_bot_password_2024')
     ENCRYPTION_SALT = os.getenv('ENCRYPTION_SALT', 'crm_bot_salt_2024')
     
+    # Приоритеты исходящих запросов (на каждого бота)
+    OUTBOUND_RATE_PER_SECOND = float(os.getenv('OUTBOUND_RATE_PER_SECOND', '25'))
+    OUTBOUND_MAX_CONCURRENT = int(os.getenv('OUTBOUND_MAX_CONCURRENT', '4'))
+    OUTBOUND_STARVATION_LIMIT = int(os.getenv('OUTBOUND_STARVATION_LIMIT', '5'))
+    # Слоты, которые медиа и рассылки не занимают (остаются командам и тексту)
+    OUTBOUND_RESERVED_SLOTS = int(os.getenv('OUTBOUND_RESERVED_SLOTS', '1'))
+    
+    # Индикаторы активности: не чаще одного раза за интервал (сек) на чат
+    CHAT_ACTION_INTERVAL = float(os.getenv('CHAT_ACTION_INTERVAL', '4'))
+    
+    # Время жизни связей исходных и пересланных сообщений (сек)
+    MESSAGE_MAPPING_TTL = int(os.getenv('MESSAGE_MAPPING_TTL', str(7 * 24 * 3600)))
+    
+    # Рассылки по клиентам подключенных ботов
+    BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '100'))
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '5'))
+    BROADCAST_JOB_TTL = int(os.getenv('BROADCAST_JOB_TTL', str(3 * 24 * 3600)))
+    # Время жизни блокировки владельца рассылки, продлевается, пока владелец работает (сек)
+    BROADCAST_OWNER_TTL = int(os.getenv('BROADCAST_OWNER_TTL', '30'))
+    
+    # Время жизни file_id, полученных ботами-получателями при пересылке (сек)
+    FILE_ID_CACHE_TTL = int(os.getenv('FILE_ID_CACHE_TTL', str(30 * 24 * 3600)))
+    
+    # Потоковая пересылка больших файлов без загрузки в память
+    STREAM_MIN_FILE_SIZE = int(os.getenv('STREAM_MIN_FILE_SIZE', str(5 * 1024 * 1024)))
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', str(64 * 1024)))
+    STREAM_TIMEOUT = int(os.getenv('STREAM_TIMEOUT', '300'))
+    
+    # Хранение файлов до пересылки: маленькие в Redis, большие на диске
+    BLOB_REDIS_MAX_SIZE = int(os.getenv('BLOB_REDIS_MAX_SIZE', str(512 * 1024)))
+    BLOB_SPOOL_DIR = os.getenv('BLOB_SPOOL_DIR', 'spool')
+    BLOB_SPOOL_MAX_BYTES = int(os.getenv('BLOB_SPOOL_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+    BLOB_TTL = int(os.getenv('BLOB_TTL', '3600'))
+    
+    # Одновременные скачивания файлов одной медиагруппы
+    MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv('MEDIA_DOWNLOAD_CONCURRENCY', '4'))
+    
+    # Сборка медиагрупп: таймаут ожидания следующей части (сек) и его границы
+    MEDIA_GROUP_TIMEOUT = float(os.getenv('MEDIA_GROUP_TIMEOUT', '1.0'))
+    MEDIA_GROUP_MIN_TIMEOUT = float(os.getenv('MEDIA_GROUP_MIN_TIMEOUT', '0.3'))
+    MEDIA_GROUP_MAX_TIMEOUT = float(os.getenv('MEDIA_GROUP_MAX_TIMEOUT', '3.0'))
+    MEDIA_GROUP_TTL = int(os.getenv('MEDIA_GROUP_TTL', '600'))
+    MEDIA_GROUP_GAP_TTL = int(os.getenv('MEDIA_GROUP_GAP_TTL', str(7 * 24 * 3600)))
+    
+    # Общий лимит байтов медиа в памяти на время пересылки
+    MEDIA_BYTE_BUDGET = int(os.getenv('MEDIA_BYTE_BUDGET', str(256 * 1024 * 1024)))
+    
+    # Кэш информации о темах: предел записей в памяти, время жизни (сек), копия в Redis
+    TOPIC_CACHE_MAX_SIZE = int(os.getenv('TOPIC_CACHE_MAX_SIZE', '10000'))
+    TOPIC_CACHE_TTL = int(os.getenv('TOPIC_CACHE_TTL', '3600'))
+    TOPIC_CACHE_REDIS = os.getenv('TOPIC_CACHE_REDIS', 'true').lower() in ('1', 'true', 'yes')
+    # Сколько помнить темы групп, не привязанные к чатам (сек, 0 - не запоминать)
+    TOPIC_MISS_TTL = int(os.getenv('TOPIC_MISS_TTL', '300'))
+    
+    # Переименование тем: задержка сбора изменений, не чаще одного раза на тему
+    # за интервал, пауза между переименованиями в одной группе (сек)
+    TOPIC_RENAME_DELAY = float(os.getenv('TOPIC_RENAME_DELAY', '1.0'))
+    TOPIC_RENAME_INTERVAL = int(os.getenv('TOPIC_RENAME_INTERVAL', '10'))
+    TOPIC_RENAME_GROUP_INTERVAL = float(os.getenv('TOPIC_RENAME_GROUP_INTERVAL', '1.0'))
+    # Запас заранее созданных тем в каждой группе (0 - темы создаются по запросу)
+    # и остаток, ниже которого запас пополняется
+    TOPIC_POOL_SIZE = int(os.getenv('TOPIC_POOL_SIZE', '5'))
+    TOPIC_POOL_MIN = int(os.getenv('TOPIC_POOL_MIN', '2'))
+    TOPIC_POOL_NAME = os.getenv('TOPIC_POOL_NAME', '🆕 Новый чат')
+    # Сколько последних сообщений чата повторить в теме, созданной заново после удаления
+    TOPIC_REPLAY_MESSAGES = int(os.getenv('TOPIC_REPLAY_MESSAGES', '20'))
+    # Время жизни проверки доступа бота к группе (сек)
+    GROUP_ACCESS_TTL = int(os.getenv('GROUP_ACCESS_TTL', '600'))
+    
+    # Автозавершение диалогов без сообщений (сек, 0 - выключено; у бота можно задать свой порог)
+    IDLE_CHAT_TIMEOUT = int(os.getenv('IDLE_CHAT_TIMEOUT', '0'))
+    IDLE_CHECK_INTERVAL = int(os.getenv('IDLE_CHECK_INTERVAL', '60'))
+    
+    # Интервал записи метрик очередей и кэшей в лог (сек, 0 - не записывать)
+    STATS_LOG_INTERVAL = int(os.getenv('STATS_LOG_INTERVAL', '300'))
+    
+    # Локальный кэш скачанных файлов (MEDIA_CACHE_MAX_BYTES=0 - отключен)
+    MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', 'media_cache')
+    MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+    MEDIA_CACHE_TTL = int(os.getenv('MEDIA_CACHE_TTL', str(7 * 24 * 3600)))
+    
+    # Собственный сервер telegram-bot-api (пусто - облачный Bot API)
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+    TELEGRAM_API_LOCAL = os.getenv('TELEGRAM_API_LOCAL', 'true').lower() in ('1', 'true', 'yes')
+    # Каталог файлов сервера и путь, по которому он смонтирован у бота (если отличается)
+    TELEGRAM_API_SERVER_FILES_DIR = os.getenv('TELEGRAM_API_SERVER_FILES_DIR')
+    TELEGRAM_API_LOCAL_FILES_DIR = os.getenv('TELEGRAM_API_LOCAL_FILES_DIR')
+    
     # Статусы и эмодзи
     STATUS_WAITING = 'waiting'
     STATUS_ANSWERED = 'answered'
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, BigInteger, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from utils.encryption import TokenEncryption
@@ -20,6 +20,8 @@ class ConnectedBot(Base):
     welcome_text_en = Column(Text, nullable=True)
     info_text_ru = Column(Text, nullable=True)
     info_text_en = Column(Text, nullable=True)
+    # Завершение диалогов без активности (сек): None - IDLE_CHAT_TIMEOUT, 0 - не завершать
+    idle_timeout = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Связи
@@ -77,11 +79,18 @@ class Chat(Base):
     username = Column(String(50), nullable=True)
     first_name = Column(String(100), nullable=True)
     last_name = Column(String(100), nullable=True)
+    # Группа операторов, в которой создана тема (ID тем уникальны только внутри группы)
+    group_id = Column(BigInteger, nullable=True)
     topic_id = Column(Integer, nullable=True)
     status = Column(String(20), default='waiting')
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Поиск чата по теме в обработчиках операторов
+        Index('ix_chats_group_topic', 'group_id', 'topic_id'),
+    )
+    
 
     bot = relationship("ConnectedBot", back_populates="chats")
     messages = relationship("Message", back_populates="chat")
@@ -97,6 +106,11 @@ class Message(Base):
     message_type = Column(String(20), default='text')
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Поиск последних сообщений чата и проверка простоя
+        Index('ix_messages_chat_created', 'chat_id', 'created_at'),
+    )
+    
 
     chat = relationship("Chat", back_populates="messages")
 
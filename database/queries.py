@@ -1,6 +1,9 @@
-from typing import Optional, List
-from sqlalchemy import select, update, delete
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+from sqlalchemy import select, update, delete, exists
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from .models import ConnectedBot, Chat, Message, BannedUser
 
 class DatabaseQueries:
@@ -46,6 +49,26 @@ class DatabaseQueries:
         )
         return result.scalars().all()
 
+    async def get_linked_group_ids(self) -> List[int]:
+        """ID групп, к которым привязаны активные боты"""
+        result = await self.session.execute(
+            select(ConnectedBot.group_id)
+            .where(
+                ConnectedBot.is_active == True,
+                ConnectedBot.group_id.is_not(None)
+            )
+            .distinct()
+        )
+        return list(result.scalars().all())
+
+    async def get_idle_timeouts(self) -> List[Tuple[int, Optional[int]]]:
+        """Пороги простоя активных ботов: (ID бота, idle_timeout)"""
+        result = await self.session.execute(
+            select(ConnectedBot.id, ConnectedBot.idle_timeout)
+            .where(ConnectedBot.is_active == True)
+        )
+        return [(row.id, row.idle_timeout) for row in result.all()]
+
     async def update_bot_group(self, bot_id: int, group_id: int):
         """Обновление группы бота"""
         await self.session.execute(
@@ -109,22 +132,86 @@ class DatabaseQueries:
         )
         return result.scalar_one_or_none()
 
-    async def get_chat_by_topic(self, topic_id: int) -> Optional[Chat]:
-        """Получение чата по ID темы"""
+    async def get_chat_by_id(self, chat_id: int) -> Optional[Chat]:
+        """Получение чата по ID вместе с ботом"""
+        result = await self.session.execute(
+            select(Chat).options(selectinload(Chat.bot)).where(Chat.id == chat_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_chat_topic_id(self, chat_id: int) -> Optional[int]:
+        """Получение ID темы чата"""
+        result = await self.session.execute(
+            select(Chat.topic_id).where(Chat.id == chat_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_chat_by_topic(self, group_id: int, topic_id: int) -> Optional[Chat]:
+        """Получение чата по теме группы одним запросом (индекс ix_chats_group_topic, без загрузки бота)"""
         result = await self.session.execute(
-            select(Chat).where(Chat.topic_id == topic_id)
+            select(Chat)
+            .where(Chat.group_id == group_id, Chat.topic_id == topic_id)
+            .limit(1)
         )
         return result.scalar_one_or_none()
 
-    async def update_chat_topic(self, chat_id: int, topic_id: int):
-        """Обновление ID темы чата"""
+    async def get_broadcast_recipients(self, bot_id: int, after_chat_id: int = 0,
+                                       limit: int = 100) -> List[Tuple[int, int]]:
+        """Получение следующей порции получателей рассылки (keyset-пагинация по Chat.id)"""
+        from config import config
+        
+        result = await self.session.execute(
+            select(Chat.id, Chat.user_id)
+            .where(
+                Chat.bot_id == bot_id,
+                Chat.id > after_chat_id,
+                Chat.status != config.STATUS_BANNED,
+                ~exists().where(
+                    BannedUser.bot_id == Chat.bot_id,
+                    BannedUser.user_id == Chat.user_id
+                )
+            )
+            .order_by(Chat.id)
+            .limit(limit)
+        )
+        return [(row.id, row.user_id) for row in result.all()]
+
+    async def get_group_topic_chats(self, group_id: int, after_chat_id: int = 0,
+                                    limit: int = 500) -> List[Chat]:
+        """Следующая порция чатов активных ботов, у которых есть тема в группе (keyset-пагинация по Chat.id)"""
+        result = await self.session.execute(
+            select(Chat)
+            .join(ConnectedBot, ConnectedBot.id == Chat.bot_id)
+            .where(
+                Chat.group_id == group_id,
+                Chat.topic_id.is_not(None),
+                Chat.id > after_chat_id,
+                ConnectedBot.is_active == True
+            )
+            .order_by(Chat.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def update_chat_topic(self, chat_id: int, topic_id: int, group_id: int):
+        """Обновление темы чата"""
         await self.session.execute(
             update(Chat)
             .where(Chat.id == chat_id)
-            .values(topic_id=topic_id)
+            .values(topic_id=topic_id, group_id=group_id)
         )
         await self.session.commit()
 
+    async def clear_chat_topic(self, chat_id: int, topic_id: int) -> bool:
+        """Снятие ссылки на тему, если чат все еще привязан к ней"""
+        result = await self.session.execute(
+            update(Chat)
+            .where(Chat.id == chat_id, Chat.topic_id == topic_id)
+            .values(topic_id=None)
+        )
+        await self.session.commit()
+        return result.rowcount > 0
+
     async def update_chat_status(self, chat_id: int, status: str):
         """Обновление статуса чата"""
         await self.session.execute(
@@ -134,6 +221,71 @@ class DatabaseQueries:
         )
         await self.session.commit()
 
+    async def end_idle_chats(self, idle_seconds: int, bot_id: int = None,
+                             group_id: int = None, chat_ids: List[int] = None,
+                             include_hold: bool = False) -> List[Row]:
+        """
+        Завершение диалогов без сообщений дольше idle_seconds одним UPDATE ... RETURNING
+        
+        Args:
+            idle_seconds: Сколько секунд без сообщений считается простоем
+            bot_id: Только чаты этого бота
+            group_id: Только чаты ботов, привязанных к этой группе
+            chat_ids: Только эти чаты
+            include_hold: Завершать и диалоги на удержании (по умолчанию не трогаются)
+            
+        Returns:
+            Завершенные чаты (id, group_id, topic_id, first_name, username, status)
+        """
+        from config import config
+        
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=idle_seconds)
+        
+        statuses = [config.STATUS_WAITING, config.STATUS_ANSWERED]
+        if include_hold:
+            statuses.append(config.STATUS_HOLD)
+        
+        stmt = (
+            update(Chat)
+            .where(
+                Chat.status.in_(statuses),
+                Chat.created_at < cutoff,
+                ~exists().where(
+                    Message.chat_id == Chat.id,
+                    Message.created_at >= cutoff
+                )
+            )
+            .values(status=config.STATUS_ENDED, updated_at=now)
+            .returning(Chat.id, Chat.group_id, Chat.topic_id, Chat.first_name, Chat.username, Chat.status)
+            .execution_options(synchronize_session=False)
+        )
+        if bot_id is not None:
+            stmt = stmt.where(Chat.bot_id == bot_id)
+        if group_id is not None:
+            stmt = stmt.where(Chat.bot_id.in_(
+                select(ConnectedBot.id).where(ConnectedBot.group_id == group_id)
+            ))
+        if chat_ids is not None:
+            stmt = stmt.where(Chat.id.in_(chat_ids))
+        
+        result = await self.session.execute(stmt)
+        chats = result.all()
+        await self.session.commit()
+        return chats
+
+    async def get_open_chat_ids(self, chat_ids: List[int]) -> List[int]:
+        """ID незавершенных чатов из списка (ожидают ответа, отвечены или на удержании)"""
+        from config import config
+        
+        result = await self.session.execute(
+            select(Chat.id).where(
+                Chat.id.in_(chat_ids),
+                Chat.status.in_([config.STATUS_WAITING, config.STATUS_ANSWERED, config.STATUS_HOLD])
+            )
+        )
+        return list(result.scalars().all())
+
     # Методы для работы с сообщениями
     async def create_message(self, chat_id: int, message_id: int, from_user: bool,
                            content: str = None, message_type: str = 'text') -> Message:
@@ -150,6 +302,16 @@ class DatabaseQueries:
         await self.session.refresh(message)
         return message
 
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[Message]:
+        """Последние сообщения чата в порядке отправки"""
+        result = await self.session.execute(
+            select(Message)
+            .where(Message.chat_id == chat_id)
+            .order_by(Message.id.desc())
+            .limit(limit)
+        )
+        return list(reversed(result.scalars().all()))
+
     # Методы для работы с банами
     async def ban_user(self, bot_id: int, user_id: int):
         """Бан пользователя"""
@@ -7,6 +7,7 @@ from database.queries import DatabaseQueries
 from database.models import ConnectedBot
 from utils.message_handler import MessageHandler
 from utils.redis_manager import redis_manager
+from utils.activity_tracker import activity_tracker
 from config import config
 from utils.text_utils import get_text
 
@@ -93,6 +94,24 @@ class ConnectedBotHandlers:
             except Exception as e:
                 logger.error(f"Ошибка в обработчике /info для бота {bot_db_id}: {e}")
         
+        @router.edited_message()
+        async def connected_bot_edited_message(message: Message):
+            """Перенос правок пользователя в тему операторов"""
+            try:
+                from utils.message_sender import MessageSender
+                
+                async with async_session() as session:
+                    db = DatabaseQueries(session)
+                    
+                    # Проверяем бан
+                    if await db.is_user_banned(bot_db_id, message.from_user.id):
+                        return
+                
+                await MessageSender.edit_forwarded_message(message)
+                
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике правок для бота {bot_db_id}: {e}")
+        
         @router.message()
         async def connected_bot_message(message: Message):
             """Обработка всех остальных сообщений"""
@@ -131,6 +150,9 @@ class ConnectedBotHandlers:
                     # Устанавливаем связь с ботом для MessageHandler
                     chat_data.bot = bot_data
                     
+                    # Активность отмечается для каждого входящего сообщения, в том числе на удержании
+                    await activity_tracker.touch(bot_db_id, chat_data.id)
+                    
                     # Получаем главного бота для пересылки
                     main_bot = await bot_manager.get_bot(0)  # Главный бот с ID 0
                     if main_bot:
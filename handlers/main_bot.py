@@ -53,6 +53,7 @@ class BotConnectionStates(StatesGroup):
     waiting_for_welcome_text = State()
     waiting_for_info_text = State()
     waiting_for_group_id = State()
+    waiting_for_broadcast = State()
 
 router = Router()
 
@@ -256,6 +257,53 @@ async def bot_settings(callback: CallbackQuery, lang: str):
         parse_mode=ParseMode.MARKDOWN_V2
     )
 
+@router.callback_query(F.data.startswith("broadcast:"))
+async def broadcast(callback: CallbackQuery, state: FSMContext, lang: str):
+    """Запрос сообщения для рассылки"""
+    bot_id = int(callback.data.split(":")[1])
+    
+    text = get_text("broadcast_prompt", lang)
+    
+    from aiogram.enums import ParseMode
+    
+    await callback.message.edit_text(text, parse_mode=ParseMode.MARKDOWN_V2)
+    await state.set_state(BotConnectionStates.waiting_for_broadcast)
+    await state.update_data(bot_id=bot_id)
+
+@router.message(StateFilter(BotConnectionStates.waiting_for_broadcast))
+async def process_broadcast(message: Message, state: FSMContext, lang: str):
+    """Запуск рассылки по клиентам бота"""
+    from utils.broadcast_manager import broadcast_manager
+    
+    data = await state.get_data()
+    bot_id = data['bot_id']
+    
+    async with async_session() as session:
+        result = await session.execute(
+            select(ConnectedBot).where(ConnectedBot.id == bot_id)
+        )
+        bot_data = result.scalar_one_or_none()
+    
+    from aiogram.enums import ParseMode
+    
+    if not bot_data or bot_data.user_id != message.from_user.id:
+        await message.answer(get_text("bot_not_found", lang), parse_mode=ParseMode.MARKDOWN_V2)
+        await state.clear()
+        return
+    
+    job_id = await broadcast_manager.create_job(bot_id, message.from_user.id, message, lang)
+    if not job_id:
+        await message.answer(get_text("broadcast_unsupported", lang), parse_mode=ParseMode.MARKDOWN_V2)
+        await state.clear()
+        return
+    
+    await message.answer(
+        get_text("broadcast_started", lang).format(job_id=job_id),
+        reply_markup=bot_management_keyboard(bot_id, lang, bot_data.is_active),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+    await state.clear()
+
 @router.callback_query(F.data.startswith("edit_welcome:"))
 async def edit_welcome(callback: CallbackQuery, state: FSMContext, lang: str):
     """Редактирование приветствия"""
@@ -409,6 +457,10 @@ async def process_group_selection(message: Message, state: FSMContext, lang: str
             db = DatabaseQueries(session)
             await db.update_bot_group(bot_id, group_id)
 
+        # Заранее создаем темы для новых чатов группы
+        from utils.topic_pool import topic_pool
+        topic_pool.schedule_refill(main_bot, group_id)
+
         from utils.markdown_utils import escape_md
         text = get_text("group_linked_success", lang).format(title=escape_md(group_title), group_id=group_id)
 
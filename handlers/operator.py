@@ -1,16 +1,19 @@
 import logging
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.enums.content_type import ContentType
-from aiogram.enums import ParseMode
+from aiogram.enums import ChatType, ParseMode
 
 from database.database import async_session
 from database.queries import DatabaseQueries
 
 from utils.message_handler import MessageHandler
+from utils.message_sender import MessageSender
 from utils.status_manager import StatusManager
 from utils.bot_manager import bot_manager
+from utils.topic_router import topic_router
+from utils.activity_tracker import activity_tracker
 from utils.markdown_utils import MarkdownV2Utils, escape_md, bold, code
 from config import config
 
@@ -45,7 +48,7 @@ async def hold_chat(message: Message):
             logger.info(f"Attempting to set hold status for thread {message.message_thread_id}")
             
 
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 await message.reply(MarkdownV2Utils.format_error_message("Чат не найден"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
@@ -86,7 +89,7 @@ async def ban_user(message: Message):
             db = DatabaseQueries(session)
             
 
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 await message.reply(MarkdownV2Utils.format_error_message("Чат не найден"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
@@ -131,7 +134,7 @@ async def unhold_chat(message: Message):
         async with async_session() as session:
             db = DatabaseQueries(session)
             
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 await message.reply(MarkdownV2Utils.format_error_message("Чат не найден"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
@@ -146,6 +149,8 @@ async def unhold_chat(message: Message):
                 return
             
             await StatusManager.update_status(chat_data.id, config.STATUS_WAITING, main_bot)
+            # Отсчет простоя начинается заново: на удержании чат мог выпасть из учета активности
+            await activity_tracker.touch(chat_data.bot_id, chat_data.id)
             
             await message.reply(f"🟢 Диалог {bold('снят с удержания')}", parse_mode=ParseMode.MARKDOWN_V2)
             
@@ -165,7 +170,7 @@ async def unban_user(message: Message):
             db = DatabaseQueries(session)
             
 
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 await message.reply(MarkdownV2Utils.format_error_message("Чат не найден"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
@@ -206,7 +211,7 @@ async def end_chat(message: Message):
             db = DatabaseQueries(session)
             
 
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 await message.reply(MarkdownV2Utils.format_error_message("Чат не найден"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
@@ -225,6 +230,68 @@ async def end_chat(message: Message):
     except Exception as e:
         await message.reply(MarkdownV2Utils.format_error_message(f"Ошибка при завершении диалога: {str(e)}"), parse_mode=ParseMode.MARKDOWN_V2)
 
+async def _is_linked_group_admin(message: Message) -> bool:
+    """Отправлена ли команда администратором группы, привязанной к подключенному боту"""
+    if message.chat.type != ChatType.SUPERGROUP:
+        return False
+    
+    async with async_session() as session:
+        db = DatabaseQueries(session)
+        if message.chat.id not in await db.get_linked_group_ids():
+            return False
+    
+    # Анонимный администратор пишет от имени самой группы
+    if message.sender_chat and message.sender_chat.id == message.chat.id:
+        return True
+    
+    try:
+        member = await message.bot.get_chat_member(message.chat.id, message.from_user.id)
+    except Exception as e:
+        logger.error(f"Ошибка при проверке прав {message.from_user.id} в группе {message.chat.id}: {e}")
+        return False
+    
+    return member.status in ['administrator', 'creator']
+
+@router.message(Command("endidle"))
+async def end_idle_chats(message: Message, command: CommandObject):
+    """Завершить все диалоги группы без сообщений дольше указанного времени"""
+    if not await _is_linked_group_admin(message):
+        await message.reply(
+            MarkdownV2Utils.format_error_message("Команда доступна только администраторам группы операторов"),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        return
+    
+    try:
+        idle_seconds = StatusManager.parse_idle_period(command.args or '')
+    except ValueError:
+        await message.reply(
+            MarkdownV2Utils.format_error_message("Укажите время простоя: /endidle 30m, 12h или 2d"),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        return
+    
+    try:
+        main_bot = await bot_manager.get_bot(0)
+        if not main_bot:
+            await message.reply(MarkdownV2Utils.format_error_message("Главный бот недоступен"), parse_mode=ParseMode.MARKDOWN_V2)
+            return
+        
+        ended = await StatusManager.end_idle_chats(idle_seconds, group_id=message.chat.id, group_bot=main_bot)
+        
+        await message.reply(f"❌ Завершено диалогов без активности: {bold(str(ended))}", parse_mode=ParseMode.MARKDOWN_V2)
+        
+    except Exception as e:
+        await message.reply(MarkdownV2Utils.format_error_message(f"Ошибка при завершении диалогов: {str(e)}"), parse_mode=ParseMode.MARKDOWN_V2)
+
+@router.edited_message(F.message_thread_id)
+async def operator_edit(message: Message):
+    """Перенос правок оператора в чат пользователя"""
+    try:
+        await MessageSender.edit_forwarded_message(message)
+    except Exception as e:
+        logger.error(f"Ошибка при переносе правки оператора в теме {message.message_thread_id}: {str(e)}", exc_info=True)
+
 @router.message(F.message_thread_id)
 async def operator_reply(message: Message):
     """Ответ оператора пользователю"""
@@ -246,7 +313,7 @@ async def operator_reply(message: Message):
         async with async_session() as session:
             db = DatabaseQueries(session)
 
-            chat_data = await db.get_chat_by_topic(message.message_thread_id)
+            chat_data = await topic_router.get_chat(db, message.chat.id, message.message_thread_id)
             if not chat_data:
                 logger.warning(f"Чат не найден для темы {message.message_thread_id}")
                 return
@@ -256,6 +323,9 @@ async def operator_reply(message: Message):
                 await message.reply(MarkdownV2Utils.format_info_message("Диалог завершен или пользователь заблокирован"), parse_mode=ParseMode.MARKDOWN_V2)
                 return
             
+            # Активность отмечается до пересылки, чтобы сбой отправки не завершил диалог по простою
+            await activity_tracker.touch(chat_data.bot_id, chat_data.id)
+            
             # Получаем главного бота для обновления статуса
             main_bot = await bot_manager.get_bot(0)
             if not main_bot:
@@ -44,6 +44,7 @@ def bot_management_keyboard(bot_id: int, lang='ru', is_active=True):
     if lang == 'ru':
         builder.add(InlineKeyboardButton(text="Выбрать группу", callback_data=f"choose_group:{bot_id}"))
         builder.add(InlineKeyboardButton(text="Настройки", callback_data=f"bot_settings:{bot_id}"))
+        builder.add(InlineKeyboardButton(text="Рассылка", callback_data=f"broadcast:{bot_id}"))
         
         # Динамически добавляем кнопку запуска/остановки
         if is_active:
@@ -56,6 +57,7 @@ def bot_management_keyboard(bot_id: int, lang='ru', is_active=True):
     else:
         builder.add(InlineKeyboardButton(text="Choose Group", callback_data=f"choose_group:{bot_id}"))
         builder.add(InlineKeyboardButton(text="Settings", callback_data=f"bot_settings:{bot_id}"))
+        builder.add(InlineKeyboardButton(text="Broadcast", callback_data=f"broadcast:{bot_id}"))
         
         # Динамически добавляем кнопку запуска/остановки
         if is_active:
@@ -1,8 +1,6 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
 
 from config import config
@@ -10,8 +8,19 @@ from database.database import init_db, drop_db
 from handlers.main_bot import router as main_router
 from handlers.operator import router as operator_router
 from middlewares.language import LanguageMiddleware
+from middlewares.priority import PriorityMiddleware
+from utils.activity_tracker import activity_tracker
+from utils.blob_store import blob_store
 from utils.bot_manager import bot_manager
+from utils.broadcast_manager import broadcast_manager
+from utils.media_cache import media_cache
+from utils.media_group_handler import media_group_handler
 from utils.redis_manager import redis_manager
+from utils.stats_reporter import stats_reporter
+from utils.topic_manager import TopicManager
+from utils.topic_pool import topic_pool
+from utils.topic_renamer import topic_renamer
+from utils.topic_router import topic_router
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,14 +31,15 @@ logging.basicConfig(
 async def main():
     # Подключаемся к Redis
     await redis_manager.connect()
+    
+    # Удаляем файлы, оставшиеся от пересылок до перезапуска
+    await blob_store.cleanup()
+    await media_cache.cleanup()
 
     await drop_db()
     await init_db()
 
-    main_bot = Bot(
-        token=config.MAIN_BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2)
-    )
+    main_bot = bot_manager.create_bot(config.MAIN_BOT_TOKEN)
     
     # Используем Redis для хранения состояний FSM
     storage = RedisStorage.from_url(config.REDIS_URL)
@@ -37,6 +47,7 @@ async def main():
     
 
     dp.message.middleware(LanguageMiddleware())
+    dp.message.middleware(PriorityMiddleware())
     dp.callback_query.middleware(LanguageMiddleware())
     
 
@@ -49,21 +60,51 @@ async def main():
 
     bot_manager.connected_bots[0] = main_bot
     
+    # Продолжаем рассылки, прерванные перезапуском
+    await broadcast_manager.resume_jobs()
+    
+    # Отправляем альбомы, собранные до перезапуска
+    await media_group_handler.resume()
+    
+    # Отправляем переименования тем, запрошенные до перезапуска
+    await topic_renamer.resume()
+    
+    # Исправляем названия тем, разошедшиеся со статусами за время простоя
+    await TopicManager.reconcile_topics(main_bot)
+    
+    # Создаем запас тем в группах операторов
+    await topic_pool.warm_up(main_bot)
+    
+    # Принимаем сброс маршрутов тем из API
+    topic_router.start()
+    
+    # Завершаем диалоги без активности дольше порога бота
+    activity_tracker.start(main_bot)
+    
+    # Пишем метрики очередей и кэшей в лог
+    stats_reporter.start()
+    
     logging.info("Бот запущен")
     
     try:
 
         await dp.start_polling(main_bot, skip_updates=True)
     finally:
+        activity_tracker.stop()
+        stats_reporter.stop()
+        topic_router.stop()
+        
+        # Рассылки снимают свои блокировки, поэтому останавливаются до отключения от Redis
+        await broadcast_manager.stop()
+        
+        for task in bot_manager.bot_tasks.values():
+            task.cancel()
+        
         # Закрываем соединения
         await main_bot.session.close()
         await redis_manager.disconnect()
         await storage.close()
         
-
-        for task in bot_manager.bot_tasks.values():
-            task.cancel()
-        
         for bot in bot_manager.connected_bots.values():
             if bot != main_bot:
                 await bot.session.close()
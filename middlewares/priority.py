@@ -0,0 +1,69 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (
+    TelegramMethod, GetUpdates, SendPhoto, SendVideo, SendDocument, SendAudio,
+    SendAnimation, SendVoice, SendVideoNote, SendSticker, SendMediaGroup, SendChatAction
+)
+from aiogram.types import Message
+from utils.priority_scheduler import Priority, PriorityScheduler, current_priority
+
+# Методы, которые уходят в полосу медиа
+MEDIA_METHODS = (
+    SendPhoto, SendVideo, SendDocument, SendAudio, SendAnimation,
+    SendVoice, SendVideoNote, SendSticker, SendMediaGroup
+)
+
+# Индикатор активности - короткий запрос: в полосе медиа он ждал бы загрузку,
+# о которой сообщает, поэтому он идет с текстовыми ответами и не обгоняет их
+TEXT_METHODS = (SendChatAction,)
+
+# Long polling не должен занимать слоты отправки
+UNSCHEDULED_METHODS = (GetUpdates,)
+
+
+class PriorityMiddleware(BaseMiddleware):
+    """Помечает обработку команд операторов как управляющий трафик"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+
+        if isinstance(event, Message) and event.text and event.text.startswith('/'):
+            token = current_priority.set(Priority.CONTROL)
+            try:
+                return await handler(event, data)
+            finally:
+                current_priority.reset(token)
+
+        return await handler(event, data)
+
+
+class PriorityRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает исходящие запросы бота через планировщик с приоритетами"""
+
+    def __init__(self, scheduler: PriorityScheduler = None):
+        self.scheduler = scheduler or PriorityScheduler()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ):
+
+        if isinstance(method, UNSCHEDULED_METHODS):
+            return await make_request(bot, method)
+
+        if isinstance(method, TEXT_METHODS):
+            priority = Priority.TEXT
+        else:
+            priority = current_priority.get()
+        if priority is None:
+            priority = Priority.MEDIA if isinstance(method, MEDIA_METHODS) else Priority.TEXT
+
+        async with self.scheduler.slot(priority):
+            return await make_request(bot, method)
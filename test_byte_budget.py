@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Тесты общего лимита байтов медиа: учет занятого места и очередь ожидающих
+"""
+
+import asyncio
+
+from utils.byte_budget import ByteBudget
+
+
+def test_reserve_accounts_and_releases():
+    """Резерв учитывается на время пересылки и освобождается после нее"""
+
+    async def scenario():
+        budget = ByteBudget(capacity=100)
+
+        async with budget.reserve(30):
+            assert budget.in_use == 30
+            async with budget.reserve(50):
+                assert budget.in_use == 80
+
+        assert budget.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiters_served_in_fifo_order():
+    """Маленький файл не обгоняет большой, стоящий в очереди раньше"""
+
+    async def scenario():
+        budget = ByteBudget(capacity=100)
+        order = []
+
+        async def transfer(name: str, size: int):
+            await budget.acquire(size)
+            order.append(name)
+
+        await budget.acquire(60)
+        large = asyncio.create_task(transfer('large', 80))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(transfer('small', 10))
+        await asyncio.sleep(0)
+
+        # Для маленького файла место есть, но он ждет большой
+        assert order == []
+        assert budget.get_stats()['waiting'] == 2
+        assert budget.get_stats()['waiting_bytes'] == 90
+
+        budget.release(60)
+        await asyncio.gather(large, small)
+
+        assert order == ['large', 'small']
+        assert budget.in_use == 90
+
+    asyncio.run(scenario())
+
+
+def test_oversized_file_clamped_to_capacity():
+    """Файл больше всего лимита ждет освобождения и идет один"""
+
+    async def scenario():
+        budget = ByteBudget(capacity=100)
+        started = asyncio.Event()
+        finished = asyncio.Event()
+
+        async def transfer():
+            async with budget.reserve(500):
+                started.set()
+                await finished.wait()
+
+        await budget.acquire(10)
+        oversized = asyncio.create_task(transfer())
+        await asyncio.sleep(0)
+        assert not started.is_set()
+
+        budget.release(10)
+        await started.wait()
+        assert budget.in_use == 100
+
+        finished.set()
+        await oversized
+        assert budget.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_unblocks_queue():
+    """Отмененная пересылка уходит из очереди и пропускает следующие"""
+
+    async def scenario():
+        budget = ByteBudget(capacity=100)
+
+        await budget.acquire(50)
+        large = asyncio.create_task(budget.acquire(80))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(budget.acquire(20))
+        await asyncio.sleep(0)
+        assert not small.done()
+
+        large.cancel()
+        await asyncio.gather(large, return_exceptions=True)
+        await small
+
+        assert budget.in_use == 70
+        assert budget.get_stats()['waiting'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_resize_to_actual_size():
+    """Резерв по заявленному размеру заменяется фактическим и пропускает ожидающих"""
+
+    async def scenario():
+        budget = ByteBudget(capacity=100)
+
+        await budget.acquire(80)
+        waiting = asyncio.create_task(budget.acquire(50))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        budget.resize(80, 30)
+        await waiting
+        assert budget.in_use == 80
+
+        # Размер не был известен заранее - фактический добавляется без ожидания
+        budget.resize(0, 40)
+        assert budget.in_use == 120
+
+    asyncio.run(scenario())
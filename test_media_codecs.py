@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Тесты реестра типов медиа: определение типа сообщения, имена файлов и
+параметры отправки
+"""
+
+from types import SimpleNamespace
+
+from aiogram.enums import ChatAction
+
+from utils.media_codecs import MEDIA_CODECS, get_codec
+
+
+def _message(**media):
+    fields = {message_type: None for message_type in MEDIA_CODECS}
+    fields.update(media)
+    return SimpleNamespace(**fields)
+
+
+def test_get_codec_by_message_type():
+    """Тип определяется по заполненному полю сообщения"""
+    video = SimpleNamespace(file_id='v')
+    assert get_codec(_message(video=video)).type == 'video'
+    assert get_codec(_message()) is None
+
+
+def test_animation_checked_before_document():
+    """У анимации заполнен и document, но тип - animation"""
+    animation = SimpleNamespace(file_id='a')
+    document = SimpleNamespace(file_id='d')
+    message = _message(animation=animation, document=document)
+
+    assert get_codec(message).type == 'animation'
+    assert list(MEDIA_CODECS).index('animation') < list(MEDIA_CODECS).index('document')
+
+
+def test_photo_uses_largest_size():
+    """Для фото берется наибольший размер"""
+    sizes = [SimpleNamespace(file_id='small'), SimpleNamespace(file_id='large')]
+    codec = get_codec(_message(photo=sizes))
+
+    assert codec.type == 'photo'
+    assert codec.get_media(_message(photo=sizes)).file_id == 'large'
+    assert codec.get_media(_message(photo=[])) is None
+
+
+def test_default_filenames():
+    """Имя файла из исходного файла или по умолчанию с ID сообщения"""
+    assert MEDIA_CODECS['photo'].get_filename(SimpleNamespace(), '7') == 'photo_7.jpg'
+    assert MEDIA_CODECS['document'].get_filename(SimpleNamespace(file_name=None), '7') == 'document_7'
+    assert MEDIA_CODECS['document'].get_filename(SimpleNamespace(file_name='report.pdf'), '7') == 'report.pdf'
+
+
+def test_sticker_filename_by_format():
+    """Расширение стикера зависит от формата"""
+    codec = MEDIA_CODECS['sticker']
+
+    assert codec.get_filename(SimpleNamespace(is_animated=True, is_video=False), '5') == 'sticker_5.tgs'
+    assert codec.get_filename(SimpleNamespace(is_animated=False, is_video=True), '5') == 'sticker_5.webm'
+    assert codec.get_filename(SimpleNamespace(is_animated=False, is_video=False), '5') == 'sticker_5.webp'
+
+
+def test_send_kwargs_skip_empty_fields():
+    """В параметры отправки попадают только заполненные send_fields"""
+    codec = MEDIA_CODECS['audio']
+    message_data = {'duration': 120, 'performer': None, 'title': 'Song', 'mime_type': 'audio/mpeg'}
+
+    assert codec.send_method == 'send_audio'
+    assert codec.send_kwargs(message_data) == {'duration': 120, 'title': 'Song'}
+
+
+def test_album_groups():
+    """Фото и видео совместимы в альбоме, документы и аудио - только со своим типом"""
+    assert MEDIA_CODECS['photo'].album == MEDIA_CODECS['video'].album
+    assert MEDIA_CODECS['document'].album != MEDIA_CODECS['audio'].album
+    assert MEDIA_CODECS['voice'].album is None
+    assert MEDIA_CODECS['sticker'].streamable is False
+
+
+def test_chat_actions():
+    """Индикатор загрузки соответствует типу файла"""
+    assert MEDIA_CODECS['voice'].chat_action == ChatAction.UPLOAD_VOICE
+    assert MEDIA_CODECS['audio'].chat_action == ChatAction.UPLOAD_DOCUMENT
+    assert MEDIA_CODECS['photo'].chat_action == ChatAction.UPLOAD_PHOTO
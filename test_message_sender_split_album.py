@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Тесты разбиения медиагруппы на части для send_media_group
+"""
+
+from utils.message_sender import MessageSender
+
+
+def _album(*types):
+    return [{'type': message_type, 'message_id': index} for index, message_type in enumerate(types)]
+
+
+def _chunk_types(chunks):
+    return [[message_data['type'] for message_data in chunk] for chunk in chunks]
+
+
+def test_photos_and_videos_share_chunk():
+    """Фото и видео объединяются в одну часть"""
+    chunks = MessageSender._split_album(_album('photo', 'video', 'photo'))
+
+    assert _chunk_types(chunks) == [['photo', 'video', 'photo']]
+
+
+def test_documents_and_audio_kept_apart():
+    """Документы и аудио не смешиваются с другими типами"""
+    chunks = MessageSender._split_album(_album('photo', 'document', 'document', 'audio', 'video'))
+
+    assert _chunk_types(chunks) == [['photo'], ['document', 'document'], ['audio'], ['video']]
+
+
+def test_non_album_types_sent_alone():
+    """Типы без альбома идут отдельными частями из одного элемента"""
+    chunks = MessageSender._split_album(_album('voice', 'voice', 'sticker', 'unknown'))
+
+    assert _chunk_types(chunks) == [['voice'], ['voice'], ['sticker'], ['unknown']]
+
+
+def test_chunk_size_limited():
+    """В одной части не больше ALBUM_MAX_SIZE элементов, порядок сохраняется"""
+    messages = _album(*['photo'] * 23)
+    chunks = MessageSender._split_album(messages)
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 3]
+    assert [message_data for chunk in chunks for message_data in chunk] == messages
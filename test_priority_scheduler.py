@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Тесты планировщика исходящих запросов: порядок полос, защита от голодания
+и доля слотов для медиа
+"""
+
+import asyncio
+
+from utils.priority_scheduler import Priority, PriorityScheduler
+
+
+async def _run_queued(scheduler: PriorityScheduler, lanes):
+    """Постановка запросов в очередь при занятом слоте; возвращает порядок их выполнения"""
+    order = []
+
+    async def request(priority: Priority):
+        async with scheduler.slot(priority):
+            order.append(priority)
+
+    await scheduler.acquire(Priority.CONTROL)
+    tasks = [asyncio.create_task(request(priority)) for priority in lanes]
+    await asyncio.sleep(0)
+
+    scheduler.release(Priority.CONTROL)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_lanes_served_by_priority():
+    """Свободный слот получает самая приоритетная полоса"""
+    scheduler = PriorityScheduler(rate_per_second=0, max_concurrent=1, starvation_limit=10, reserved_slots=0)
+    lanes = [Priority.BULK, Priority.MEDIA, Priority.TEXT, Priority.CONTROL]
+
+    order = asyncio.run(_run_queued(scheduler, lanes))
+
+    assert order == [Priority.CONTROL, Priority.TEXT, Priority.MEDIA, Priority.BULK]
+
+
+def test_starved_lane_served_out_of_turn():
+    """Полоса, пропущенная starvation_limit раз, обслуживается вне очереди"""
+    scheduler = PriorityScheduler(rate_per_second=0, max_concurrent=1, starvation_limit=2, reserved_slots=0)
+    lanes = [Priority.BULK] + [Priority.CONTROL] * 5
+
+    order = asyncio.run(_run_queued(scheduler, lanes))
+
+    assert order.index(Priority.BULK) == 2
+    assert order.count(Priority.CONTROL) == 5
+
+
+def test_reserved_slot_not_taken_by_media():
+    """Медиа не занимают зарезервированный слот, текст получает его сразу"""
+
+    async def scenario():
+        scheduler = PriorityScheduler(rate_per_second=0, max_concurrent=2, reserved_slots=1)
+
+        await scheduler.acquire(Priority.MEDIA)
+        second_media = asyncio.create_task(scheduler.acquire(Priority.MEDIA))
+        text = asyncio.create_task(scheduler.acquire(Priority.TEXT))
+        await asyncio.sleep(0)
+
+        assert text.done()
+        assert not second_media.done()
+        stats = scheduler.get_stats()
+        assert stats['active'] == 2
+        assert stats['heavy_active'] == 1
+        assert stats['media'] == 1
+
+        scheduler.release(Priority.MEDIA)
+        await asyncio.sleep(0)
+        assert second_media.done()
+        assert scheduler.get_stats()['heavy_active'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_request_leaves_queue():
+    """Отмененный запрос удаляется из очереди и не занимает слот"""
+
+    async def scenario():
+        scheduler = PriorityScheduler(rate_per_second=0, max_concurrent=1, reserved_slots=0)
+
+        await scheduler.acquire(Priority.TEXT)
+        waiting = asyncio.create_task(scheduler.acquire(Priority.BULK))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.release(Priority.TEXT)
+
+        stats = scheduler.get_stats()
+        assert stats['bulk'] == 0
+        assert stats['active'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_requests_do_not_count_as_skips():
+    """Отмененные запросы в начале полосы не увеличивают счетчик пропусков"""
+
+    async def scenario():
+        scheduler = PriorityScheduler(rate_per_second=0, max_concurrent=1, starvation_limit=1, reserved_slots=0)
+
+        await scheduler.acquire(Priority.CONTROL)
+        cancelled = scheduler._lanes[Priority.BULK]
+        future = asyncio.get_running_loop().create_future()
+        future.cancel()
+        cancelled.append(future)
+        text = asyncio.create_task(scheduler.acquire(Priority.TEXT))
+        await asyncio.sleep(0)
+
+        scheduler.release(Priority.CONTROL)
+        await text
+
+        assert scheduler.get_stats()['bulk'] == 0
+        assert scheduler._skipped[Priority.BULK] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора длительности простоя для /endidle
+"""
+
+import pytest
+
+from utils.status_manager import StatusManager
+
+
+@pytest.mark.parametrize('text, seconds', [
+    ('30m', 30 * 60),
+    ('12h', 12 * 3600),
+    ('2d', 2 * 86400),
+    ('3', 3 * 3600),
+    (' 45M ', 45 * 60),
+])
+def test_parse_idle_period(text, seconds):
+    """Минуты, часы и дни; число без единицы - часы"""
+    assert StatusManager.parse_idle_period(text) == seconds
+
+
+@pytest.mark.parametrize('text', ['', 'm', 'abc', '1.5h', '10w', '0h', '-5m'])
+def test_parse_idle_period_invalid(text):
+    """Нераспознанная или неположительная длительность - ValueError"""
+    with pytest.raises(ValueError):
+        StatusManager.parse_idle_period(text)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша тем: вытеснение давно не использованных записей и устаревание по TTL
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from utils import topic_cache as topic_cache_module
+from utils.topic_cache import TopicCache
+
+
+def _info(topic_id: int):
+    return {'topic_id': topic_id, 'group_id': -100}
+
+
+def test_lru_eviction():
+    """При переполнении вытесняется давно не использованная запись"""
+
+    async def scenario():
+        cache = TopicCache(max_size=2, ttl=60, use_redis=False)
+
+        await cache.set(1, _info(1))
+        await cache.set(2, _info(2))
+        # Обращение делает запись 1 недавно использованной
+        assert await cache.get(1) == _info(1)
+        await cache.set(3, _info(3))
+
+        assert await cache.get(2) is None
+        assert await cache.get(1) == _info(1)
+        assert await cache.get(3) == _info(3)
+
+        stats = cache.get_stats()
+        assert stats['size'] == 2
+        assert stats['evictions'] == 1
+        assert stats['hits'] == 3
+        assert stats['misses'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_ttl_expiry(monkeypatch):
+    """Запись старше TTL считается устаревшей и удаляется"""
+    now = [1000.0]
+    monkeypatch.setattr(topic_cache_module, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def scenario():
+        cache = TopicCache(max_size=10, ttl=30, use_redis=False)
+        await cache.set(1, _info(1))
+
+        now[0] += 29
+        assert await cache.get(1) == _info(1)
+
+        now[0] += 2
+        assert await cache.get(1) is None
+        assert cache.get_stats()['size'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_delete_and_clear():
+    """Удаление записи и очистка памяти"""
+
+    async def scenario():
+        cache = TopicCache(max_size=10, ttl=60, use_redis=False)
+        await cache.set(1, _info(1))
+        await cache.set(2, _info(2))
+
+        await cache.delete(1)
+        assert cache.get_local(1) is None
+        assert cache.get_local(2) == _info(2)
+
+        cache.clear()
+        assert cache.get_stats()['size'] == 0
+
+    asyncio.run(scenario())
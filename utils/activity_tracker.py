@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Время последней активности чатов и автозавершение простаивающих диалогов
+
+    Для каждого бота ведется сортированное множество activity:{bot_id}:
+    участник - ID чата, оценка - время последнего сообщения пользователя или
+    ответа оператора (отмечается до пересылки). Планировщик раз в
+    IDLE_CHECK_INTERVAL читает чаты с оценкой старше порога бота
+    (idle_timeout или IDLE_CHAT_TIMEOUT) и завершает их без просмотра таблицы
+    чатов. Из множества удаляются только чаты, которые больше не открыты;
+    открытые (на удержании или с сообщением, которое не попало в Redis)
+    остаются и проверяются снова. Участник с оценкой, обновленной за время
+    проверки, не удаляется.
+    """
+
+    # Сколько чатов читать из множества за один запрос
+    BATCH_SIZE = 500
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(bot_id: int) -> str:
+        return f"activity:{bot_id}"
+
+    async def touch(self, bot_id: int, chat_id: int):
+        """Отметка активности в чате"""
+        await redis_manager.zadd(self._key(bot_id), {str(chat_id): time.time()})
+
+    def start(self, group_bot):
+        """Запуск планировщика автозавершения"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(group_bot))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self, group_bot):
+        while True:
+            try:
+                await self.end_expired(group_bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при автозавершении диалогов: {e}")
+
+            await asyncio.sleep(config.IDLE_CHECK_INTERVAL)
+
+    async def end_expired(self, group_bot) -> int:
+        """
+        Завершение диалогов, в которых нет активности дольше порога бота
+
+        Returns:
+            Число завершенных диалогов
+        """
+        from database.database import async_session
+        from database.queries import DatabaseQueries
+        from utils.status_manager import StatusManager
+
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            idle_timeouts = await db.get_idle_timeouts()
+
+        ended = 0
+        for bot_id, idle_timeout in idle_timeouts:
+            if idle_timeout is None:
+                idle_timeout = config.IDLE_CHAT_TIMEOUT
+            if idle_timeout <= 0:
+                continue
+
+            deadline = time.time() - idle_timeout
+            # Открытые чаты остаются в начале множества - следующая порция идет после них
+            offset = 0
+            while True:
+                members = await redis_manager.zrange_by_score(
+                    self._key(bot_id), deadline, self.BATCH_SIZE, offset
+                )
+                if not members:
+                    break
+
+                chat_ids = [int(member) for member in members]
+
+                # Условие простоя проверяется и в БД: чат с новым сообщением не завершится
+                ended += await StatusManager.end_idle_chats(
+                    idle_timeout, bot_id=bot_id, chat_ids=chat_ids, group_bot=group_bot
+                )
+
+                async with async_session() as session:
+                    open_ids = set(await DatabaseQueries(session).get_open_chat_ids(chat_ids))
+
+                await redis_manager.zrem_by_score(
+                    self._key(bot_id),
+                    [member for member, chat_id in zip(members, chat_ids) if chat_id not in open_ids],
+                    deadline
+                )
+                offset += len(open_ids)
+
+                if len(members) < self.BATCH_SIZE:
+                    break
+
+        return ended
+
+
+# Глобальный экземпляр учета активности
+activity_tracker = ActivityTracker()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Union
+from aiogram.types import FSInputFile, InputFile
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class BlobBackend(ABC):
+    """Хранилище файлов, ожидающих пересылки"""
+
+    name = ""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, ttl: int = None) -> bool:
+        """Сохранение файла на ttl секунд (по умолчанию BLOB_TTL)"""
+
+    @abstractmethod
+    async def open(self, key: str, filename: str) -> Optional[Union[bytes, InputFile]]:
+        """Файл для отправки или None"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """Удаление файла"""
+
+
+class RedisBlobBackend(BlobBackend):
+    """Байты в Redis без base64, с TTL"""
+
+    name = "redis"
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"blob:{key}"
+
+    async def put(self, key: str, data: bytes, ttl: int = None) -> bool:
+        return await redis_manager.set_bytes(self._key(key), data, expire=ttl or config.BLOB_TTL)
+
+    async def open(self, key: str, filename: str) -> Optional[bytes]:
+        return await redis_manager.get_bytes(self._key(key))
+
+    async def delete(self, key: str) -> bool:
+        return await redis_manager.delete(self._key(key))
+
+
+class DiskBlobBackend(BlobBackend):
+    """Файлы в локальном каталоге с ограничением общего размера
+
+    Файлы отдаются через FSInputFile и читаются порциями при загрузке.
+    Файлы старше BLOB_TTL считаются брошенными (процесс упал до отправки)
+    и удаляются при очистке. Файлу с другим сроком хранения время изменения
+    сдвигается так, чтобы он стал брошенным через ttl секунд.
+    """
+
+    name = "disk"
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or config.BLOB_SPOOL_DIR
+        self.max_bytes = max_bytes or config.BLOB_SPOOL_MAX_BYTES
+        self._size: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def _scan(self) -> int:
+        """Текущий размер каталога"""
+        os.makedirs(self.directory, exist_ok=True)
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                total += entry.stat().st_size
+        return total
+
+    def _write(self, path: str, data: bytes, ttl: int = None):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        if ttl and ttl != config.BLOB_TTL:
+            mtime = time.time() + ttl - config.BLOB_TTL
+            os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, path)
+
+    async def put(self, key: str, data: bytes, ttl: int = None) -> bool:
+        async with self._lock:
+            if self._size is None:
+                self._size = await asyncio.to_thread(self._scan)
+
+            if self._size + len(data) > self.max_bytes:
+                await self._cleanup_locked()
+                if self._size + len(data) > self.max_bytes:
+                    logger.warning(f"Каталог {self.directory} заполнен, файл {key} не сохранен")
+                    return False
+
+            try:
+                await asyncio.to_thread(self._write, self._path(key), data, ttl)
+            except OSError as e:
+                logger.error(f"Ошибка записи файла {key} на диск: {e}")
+                return False
+
+            self._size += len(data)
+            return True
+
+    async def open(self, key: str, filename: str) -> Optional[FSInputFile]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            logger.error(f"Файл {key} не найден на диске")
+            return None
+        return FSInputFile(path, filename=filename)
+
+    async def delete(self, key: str) -> bool:
+        async with self._lock:
+            return await self._remove(self._path(key))
+
+    async def cleanup(self) -> int:
+        """Удаление брошенных файлов"""
+        async with self._lock:
+            return await self._cleanup_locked()
+
+    async def _cleanup_locked(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+
+        deadline = time.time() - config.BLOB_TTL
+        removed = 0
+        for entry in list(os.scandir(self.directory)):
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                if await self._remove(entry.path):
+                    removed += 1
+
+        if removed:
+            logger.info(f"Удалено {removed} брошенных файлов из {self.directory}")
+        return removed
+
+    async def _remove(self, path: str) -> bool:
+        try:
+            size = os.path.getsize(path)
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.error(f"Ошибка удаления файла {path}: {e}")
+            return False
+
+        if self._size is not None:
+            self._size = max(0, self._size - size)
+        return True
+
+
+class BlobStore:
+    """Выбор хранилища для файла по размеру
+
+    Ссылка на файл имеет вид "{backend}:{key}", поэтому при чтении и удалении
+    хранилище определяется по самой ссылке.
+    """
+
+    def __init__(self):
+        self.redis = RedisBlobBackend()
+        self.disk = DiskBlobBackend()
+        self._backends: Dict[str, BlobBackend] = {b.name: b for b in (self.redis, self.disk)}
+
+    def _resolve(self, ref: str):
+        name, _, key = ref.partition(':')
+        return self._backends.get(name), key
+
+    async def put(self, key: str, data: bytes, ttl: int = None) -> Optional[str]:
+        """
+        Сохранение файла
+
+        Args:
+            key: Имя файла
+            data: Содержимое
+            ttl: Срок хранения в секундах (по умолчанию BLOB_TTL)
+
+        Returns:
+            Ссылка на файл или None
+        """
+        backend = self.redis if len(data) <= config.BLOB_REDIS_MAX_SIZE else self.disk
+        if not await backend.put(key, data, ttl):
+            return None
+        return f"{backend.name}:{key}"
+
+    async def open(self, ref: str, filename: str) -> Optional[Union[bytes, InputFile]]:
+        """Получение файла для отправки: байты или файл на диске"""
+        backend, key = self._resolve(ref)
+        if not backend:
+            logger.error(f"Неизвестная ссылка на файл {ref}")
+            return None
+        return await backend.open(key, filename)
+
+    async def delete(self, ref: str) -> bool:
+        """Удаление файла после отправки"""
+        backend, key = self._resolve(ref)
+        if not backend:
+            return False
+        return await backend.delete(key)
+
+    async def cleanup(self) -> int:
+        """Удаление брошенных файлов (в Redis они удаляются по TTL)"""
+        return await self.disk.cleanup()
+
+
+# Глобальный экземпляр хранилища файлов
+blob_store = BlobStore()
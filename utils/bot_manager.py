@@ -1,8 +1,11 @@
 import asyncio
 import logging
+from pathlib import Path
 from typing import Dict, Optional
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer, BareFilesPathWrapper, SimpleFilesPathWrapper
 from aiogram.enums import ParseMode
 from database.database import async_session
 from database.queries import DatabaseQueries
@@ -11,6 +14,7 @@ from handlers.connected_bot_handlers import ConnectedBotHandlers
 from sqlalchemy.future import select
 from aiogram.fsm.storage.redis import RedisStorage
 from config import config
+from middlewares.priority import PriorityRequestMiddleware
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +25,39 @@ class BotManager:
         self.bot_dispatchers: Dict[int, Dispatcher] = {}
         self.bot_tasks: Dict[int, asyncio.Task] = {}
 
+    @staticmethod
+    def create_session() -> Optional[AiohttpSession]:
+        """Сессия для собственного сервера Bot API, None - облачный Bot API"""
+        if not config.TELEGRAM_API_URL:
+            return None
+        
+        wrap_local_file = BareFilesPathWrapper()
+        if config.TELEGRAM_API_SERVER_FILES_DIR and config.TELEGRAM_API_LOCAL_FILES_DIR:
+            wrap_local_file = SimpleFilesPathWrapper(
+                Path(config.TELEGRAM_API_SERVER_FILES_DIR),
+                Path(config.TELEGRAM_API_LOCAL_FILES_DIR)
+            )
+        
+        return AiohttpSession(api=TelegramAPIServer.from_base(
+            config.TELEGRAM_API_URL,
+            is_local=config.TELEGRAM_API_LOCAL,
+            wrap_local_file=wrap_local_file
+        ))
+
+    @staticmethod
+    def create_bot(token: str) -> Bot:
+        """Создание экземпляра бота с планировщиком исходящих запросов"""
+        bot = Bot(
+            token=token,
+            session=BotManager.create_session(),
+            default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2)
+        )
+        bot.session.middleware(PriorityRequestMiddleware())
+        return bot
+
     async def add_bot(self, bot_data) -> Optional[Bot]:
         try:
-            bot = Bot(
-                token=bot_data.bot_token,
-                default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2)
-            )
+            bot = self.create_bot(bot_data.bot_token)
 
             await bot.get_me()
             storage = RedisStorage.from_url(config.REDIS_URL)
@@ -53,6 +84,13 @@ class BotManager:
     async def get_bot(self, bot_id: int) -> Optional[Bot]:
         return self.connected_bots.get(bot_id)
 
+    def get_bot_by_telegram_id(self, telegram_bot_id: int) -> Optional[Bot]:
+        """Поиск запущенного бота по его Telegram ID"""
+        for bot in self.connected_bots.values():
+            if bot.id == telegram_bot_id:
+                return bot
+        return None
+
     async def stop_bot(self, bot_id: int):
         """Правильная мягкая остановка бота"""
         if bot_id not in self.bot_dispatchers:
@@ -90,10 +128,7 @@ class BotManager:
                 return
 
             if bot_id not in self.connected_bots:
-                bot = Bot(
-                    token=bot_data.bot_token,
-                    default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2)
-                )
+                bot = self.create_bot(bot_data.bot_token)
                 await bot.get_me()
                 storage = RedisStorage.from_url(config.REDIS_URL)
                 dp = Dispatcher(storage=storage)
@@ -0,0 +1,416 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import Message, BufferedInputFile, FSInputFile
+from database.database import async_session
+from database.queries import DatabaseQueries
+from utils.blob_store import blob_store
+from utils.priority_scheduler import Priority, current_priority
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastManager:
+    """Рассылка сообщения всем клиентам подключенного бота
+
+    Состояние задачи хранится в Redis hash broadcast:{job_id}: получатели
+    выбираются порциями по Chat.id, после каждой порции отправок сохраняется
+    последний обработанный Chat.id, поэтому после перезапуска задача
+    продолжается с места остановки. Задачу выполняет один процесс: он держит
+    блокировку broadcast:{job_id}:owner, пока работает, остальные ждут ее
+    освобождения или истечения. Файл до первой отправки лежит в blob_store
+    (с локальным сервером Bot API - на его диске), загружается в Telegram один
+    раз, дальше рассылается полученный file_id.
+    """
+
+    ACTIVE_JOBS_KEY = "broadcast:active"
+
+    # Типы сообщений, которые можно разослать
+    _MEDIA_TYPES = ('photo', 'video', 'document', 'animation')
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"broadcast:{job_id}"
+
+    @staticmethod
+    def _owner_key(job_id: str) -> str:
+        return f"broadcast:{job_id}:owner"
+
+    async def create_job(self, bot_id: int, owner_id: int, message: Message, lang: str = 'ru') -> Optional[str]:
+        """
+        Создание и запуск рассылки
+
+        Args:
+            bot_id: ID подключенного бота в БД
+            owner_id: Telegram ID владельца, которому придет отчет
+            message: Сообщение, которое нужно разослать
+            lang: Язык отчета
+
+        Returns:
+            ID задачи или None, если тип сообщения не поддерживается
+        """
+        job_id = uuid.uuid4().hex[:12]
+
+        payload = await self._build_payload(job_id, message)
+        if not payload:
+            return None
+
+        job = {
+            'bot_id': bot_id,
+            'owner_id': owner_id,
+            'lang': lang,
+            'status': 'running',
+            'payload': payload,
+            'file_id': '',
+            'last_chat_id': 0,
+            'delivered': 0,
+            'blocked': 0,
+            'failed': 0,
+            'created_at': time.time()
+        }
+
+        if not await redis_manager.hset(self._job_key(job_id), job):
+            logger.error(f"Не удалось сохранить задачу рассылки {job_id}")
+            return None
+
+        await redis_manager.expire(self._job_key(job_id), config.BROADCAST_JOB_TTL)
+        await redis_manager.sadd(self.ACTIVE_JOBS_KEY, job_id)
+
+        self._start(job_id)
+        logger.info(f"Запущена рассылка {job_id} для бота {bot_id}")
+        return job_id
+
+    async def resume_jobs(self):
+        """Продолжение незавершенных рассылок после перезапуска"""
+        for job_id in await redis_manager.smembers(self.ACTIVE_JOBS_KEY):
+            if not await redis_manager.exists(self._job_key(job_id)):
+                await redis_manager.srem(self.ACTIVE_JOBS_KEY, job_id)
+                continue
+
+            logger.info(f"Продолжаем рассылку {job_id}")
+            self._start(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Получение состояния задачи"""
+        job = await redis_manager.hgetall(self._job_key(job_id))
+        return job or None
+
+    def _start(self, job_id: str):
+        """Запуск задачи в фоне"""
+        if job_id in self._tasks and not self._tasks[job_id].done():
+            return
+
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def stop(self):
+        """Остановка рассылок с освобождением блокировок (до отключения от Redis)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _build_payload(self, job_id: str, message: Message) -> Optional[Dict[str, Any]]:
+        """Подготовка содержимого рассылки: текст форматируется, файл скачивается один раз"""
+        from utils.text_formatter import TextFormatter
+        from utils.message_storage import MessageStorage
+        from utils.file_handler import FileHandler
+
+        if message.text:
+            return {
+                'type': 'text',
+                'text': TextFormatter.format_text_with_entities(
+                    message.text,
+                    MessageStorage.serialize_entities(message.entities)
+                )
+            }
+
+        from utils.media_codecs import get_codec
+
+        codec = get_codec(message)
+        if not codec or codec.type not in self._MEDIA_TYPES:
+            return None
+
+        message_type = codec.type
+        media = codec.get_media(message)
+
+        # Файл хранится до первой успешной отправки, затем используется file_id
+        file_bytes = await FileHandler.download_file(
+            message.bot, media.file_id, media.file_unique_id, media.file_size
+        )
+        if not file_bytes:
+            return None
+
+        if isinstance(file_bytes, FSInputFile):
+            # Файл на диске локального сервера Bot API передается по пути
+            file_source = {'local_path': str(file_bytes.path)}
+        else:
+            try:
+                # Файл нужен, пока задача может продолжиться после перезапуска
+                file_ref = await blob_store.put(f"broadcast_{job_id}", file_bytes, ttl=config.BROADCAST_JOB_TTL)
+            finally:
+                FileHandler.release_buffer(file_bytes)
+            if not file_ref:
+                return None
+            file_source = {'file_ref': file_ref}
+
+        return {
+            'type': message_type,
+            **file_source,
+            'filename': getattr(media, 'file_name', None) or f"{message_type}_{job_id}",
+            'caption': TextFormatter.format_caption_with_entities(
+                message.caption,
+                MessageStorage.serialize_entities(message.caption_entities)
+            )
+        }
+
+    async def _run(self, job_id: str):
+        """Выполнение рассылки, пока она не завершена и этот процесс может ей владеть"""
+        # Рассылка не должна задерживать ответы операторов и клиентов
+        current_priority.set(Priority.BULK)
+
+        owner_key = self._owner_key(job_id)
+        try:
+            while await self._acquire_owner(job_id):
+                try:
+                    if await self._run_owned(job_id):
+                        return
+                finally:
+                    await redis_manager.release_lock(owner_key, self._worker_id)
+
+                logger.warning(f"Рассылка {job_id} потеряла владельца, продолжим после повторного захвата")
+        finally:
+            self._tasks.pop(job_id, None)
+
+    async def _acquire_owner(self, job_id: str) -> bool:
+        """
+        Захват блокировки владельца рассылки
+
+        Пока рассылку выполняет другой процесс, захват повторяется раз в
+        BROADCAST_OWNER_TTL: блокировка упавшего процесса не продлевается и
+        истекает, после чего рассылку забирает этот процесс.
+
+        Returns:
+            False, если рассылка уже завершена и владеть нечем
+        """
+        owner_key = self._owner_key(job_id)
+        waiting = False
+
+        while True:
+            job = await self.get_job(job_id)
+            if not job or job.get('status') != 'running':
+                await redis_manager.srem(self.ACTIVE_JOBS_KEY, job_id)
+                return False
+
+            # Блокировка могла остаться от этого же процесса после сбоя продления
+            if (await redis_manager.set_nx(owner_key, self._worker_id, expire=config.BROADCAST_OWNER_TTL)
+                    or await redis_manager.refresh_lock(owner_key, self._worker_id, config.BROADCAST_OWNER_TTL)):
+                return True
+
+            if not waiting:
+                logger.info(f"Рассылку {job_id} выполняет другой процесс, ждем освобождения")
+                waiting = True
+            await asyncio.sleep(config.BROADCAST_OWNER_TTL)
+
+    async def _run_owned(self, job_id: str) -> bool:
+        """
+        Выполнение рассылки под блокировкой владельца
+
+        Блокировка продлевается отдельной задачей независимо от длительности
+        отправок и ожиданий RetryAfter. Если продлить ее не удалось, рассылка
+        останавливается до повторного захвата.
+
+        Returns:
+            False, если блокировка потеряна
+        """
+        keeper = asyncio.create_task(self._keep_owner(job_id))
+        worker = asyncio.create_task(self._process(job_id))
+
+        try:
+            done, _ = await asyncio.wait({keeper, worker}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            keeper.cancel()
+            worker.cancel()
+            await asyncio.gather(keeper, worker, return_exceptions=True)
+
+        return worker in done
+
+    async def _keep_owner(self, job_id: str):
+        """Продление блокировки владельца; завершается, когда блокировка потеряна"""
+        owner_key = self._owner_key(job_id)
+        while True:
+            await asyncio.sleep(config.BROADCAST_OWNER_TTL / 3)
+            if not await redis_manager.refresh_lock(owner_key, self._worker_id, config.BROADCAST_OWNER_TTL):
+                return
+
+    async def _process(self, job_id: str):
+        """Отправка рассылки с последней сохраненной позиции"""
+        try:
+            job = await self.get_job(job_id)
+            if not job or job.get('status') != 'running':
+                await redis_manager.srem(self.ACTIVE_JOBS_KEY, job_id)
+                return
+
+            from utils.bot_manager import bot_manager
+            bot = await bot_manager.get_bot(job['bot_id'])
+            if not bot:
+                logger.error(f"Бот {job['bot_id']} для рассылки {job_id} не запущен")
+                return
+
+            payload = job['payload']
+            file_id = str(job.get('file_id') or '')
+            last_chat_id = int(job.get('last_chat_id') or 0)
+            counters = {name: int(job.get(name) or 0) for name in ('delivered', 'blocked', 'failed')}
+
+            while True:
+                async with async_session() as session:
+                    db = DatabaseQueries(session)
+                    recipients = await db.get_broadcast_recipients(
+                        job['bot_id'], last_chat_id, config.BROADCAST_BATCH_SIZE
+                    )
+
+                if not recipients:
+                    break
+
+                while recipients:
+                    if not file_id and payload['type'] != 'text':
+                        # Первая отправка загружает файл, остальные используют file_id
+                        window, recipients = recipients[:1], recipients[1:]
+                    else:
+                        window = recipients[:config.BROADCAST_CONCURRENCY]
+                        recipients = recipients[config.BROADCAST_CONCURRENCY:]
+
+                    results = await asyncio.gather(*[
+                        self._deliver(bot, job_id, user_id, payload, file_id)
+                        for _, user_id in window
+                    ])
+
+                    for status, sent_file_id in results:
+                        counters[status] += 1
+                        if sent_file_id and not file_id:
+                            file_id = sent_file_id
+                            await self._delete_file(payload)
+
+                    last_chat_id = window[-1][0]
+                    await redis_manager.hset(self._job_key(job_id), {
+                        'last_chat_id': last_chat_id,
+                        'file_id': file_id,
+                        **counters
+                    })
+
+            await redis_manager.hset(self._job_key(job_id), {'status': 'done'})
+            await redis_manager.srem(self.ACTIVE_JOBS_KEY, job_id)
+            await self._delete_file(payload)
+
+            logger.info(f"Рассылка {job_id} завершена: {counters}")
+            await self._report(job['owner_id'], job.get('lang', 'ru'), job_id, counters)
+
+        except asyncio.CancelledError:
+            logger.info(f"Рассылка {job_id} остановлена, продолжится с последней сохраненной порции")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении рассылки {job_id}: {e}")
+
+    @staticmethod
+    async def _delete_file(payload: Dict[str, Any]):
+        """Удаление файла рассылки из хранилища (после загрузки нужен только file_id)"""
+        if payload.get('file_ref'):
+            await blob_store.delete(payload['file_ref'])
+
+    async def _deliver(self, bot: Bot, job_id: str, user_id: int,
+                       payload: Dict[str, Any], file_id: str) -> Tuple[str, Optional[str]]:
+        """
+        Отправка рассылки одному получателю
+
+        Returns:
+            (delivered | blocked | failed, file_id загруженного файла)
+        """
+        while True:
+            try:
+                sent_message = await self._send(bot, job_id, user_id, payload, file_id)
+                return 'delivered', self._extract_file_id(sent_message, payload['type'])
+
+            except TelegramRetryAfter as e:
+                logger.warning(f"Рассылка {job_id}: лимит Telegram, ждем {e.retry_after} сек")
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                return 'blocked', None
+            except Exception as e:
+                logger.debug(f"Рассылка {job_id}: не удалось отправить {user_id}: {e}")
+                return 'failed', None
+
+    async def _send(self, bot: Bot, job_id: str, user_id: int,
+                    payload: Dict[str, Any], file_id: str) -> Message:
+        """Отправка содержимого рассылки"""
+        message_type = payload['type']
+
+        if message_type == 'text':
+            return await bot.send_message(
+                chat_id=user_id,
+                text=payload['text'],
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+
+        media = file_id
+        if not media and payload.get('local_path'):
+            media = FSInputFile(payload['local_path'], filename=payload['filename'],
+                                chunk_size=config.STREAM_CHUNK_SIZE)
+        if not media:
+            media = await blob_store.open(payload.get('file_ref') or '', payload['filename'])
+            if not media:
+                raise Exception("Файл рассылки не найден в хранилище")
+            if isinstance(media, bytes):
+                media = BufferedInputFile(media, filename=payload['filename'])
+
+        send_method = getattr(bot, f"send_{message_type}")
+        return await send_method(
+            user_id,
+            media,
+            caption=payload.get('caption'),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+
+    @staticmethod
+    def _extract_file_id(sent_message: Message, message_type: str) -> Optional[str]:
+        """file_id файла в отправленном сообщении"""
+        if message_type == 'photo':
+            return sent_message.photo[-1].file_id if sent_message.photo else None
+
+        media = getattr(sent_message, message_type, None)
+        return media.file_id if media else None
+
+    async def _report(self, owner_id: int, lang: str, job_id: str, counters: Dict[str, int]):
+        """Отправка отчета владельцу бота"""
+        from utils.bot_manager import bot_manager
+        from utils.text_utils import get_text
+        from utils.markdown_utils import escape_md
+
+        main_bot = await bot_manager.get_bot(0)
+        if not main_bot:
+            return
+
+        text = get_text("broadcast_finished", lang).format(
+            job_id=escape_md(job_id),
+            delivered=counters['delivered'],
+            blocked=counters['blocked'],
+            failed=counters['failed']
+        )
+
+        try:
+            await main_bot.send_message(owner_id, text, parse_mode=ParseMode.MARKDOWN_V2)
+        except Exception as e:
+            logger.error(f"Не удалось отправить отчет о рассылке {job_id}: {e}")
+
+
+# Глобальный экземпляр менеджера рассылок
+broadcast_manager = BroadcastManager()
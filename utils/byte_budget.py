@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Tuple
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudget:
+    """Общий лимит байтов медиа, одновременно находящихся в памяти
+
+    Место занимают только байты, которые действительно лежат в памяти бота:
+    скачанный файл - до сохранения в хранилище или до отправки, поток - на
+    размер порции. Ожидающие пересылки обслуживаются строго по очереди: маленький
+    файл не обгоняет большой, поэтому большие файлы не голодают. Файл больше
+    всего лимита ждет, пока остальные пересылки завершатся, и идет один.
+    """
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity or config.MEDIA_BYTE_BUDGET
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        """Контекстный менеджер, удерживающий size байтов лимита"""
+        size = self._clamp(size)
+        await self.acquire(size)
+        try:
+            yield
+        finally:
+            self.release(size)
+
+    async def acquire(self, size: int):
+        """Ожидание свободного места в лимите"""
+        size = self._clamp(size)
+        if size <= 0:
+            return
+
+        if not self._waiters and self.in_use + size <= self.capacity:
+            self.in_use += size
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((size, future))
+        logger.info(
+            f"Пересылка {size} байт ждет лимита: занято {self.in_use} из {self.capacity}, "
+            f"в очереди {len(self._waiters)}"
+        )
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Место уже было выделено - возвращаем его
+                self.release(size)
+            else:
+                try:
+                    self._waiters.remove((size, future))
+                except ValueError:
+                    pass
+                # Отмененная пересылка могла задерживать очередь
+                self._wake()
+            raise
+
+    def release(self, size: int):
+        """Освобождение места в лимите"""
+        size = self._clamp(size)
+        if size <= 0:
+            return
+
+        self.in_use -= size
+        self._wake()
+
+    def resize(self, reserved: int, actual: int):
+        """Замена резерва по заявленному размеру на фактический, без ожидания"""
+        delta = self._clamp(actual) - self._clamp(reserved)
+        self.in_use += delta
+        if delta < 0:
+            self._wake()
+
+    def _clamp(self, size: int) -> int:
+        """Файл больше всего лимита занимает весь лимит"""
+        return min(max(size, 0), self.capacity)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Текущее состояние лимита"""
+        return {
+            'capacity': self.capacity,
+            'in_use': self.in_use,
+            'waiting': len(self._waiters),
+            'waiting_bytes': sum(size for size, _ in self._waiters)
+        }
+
+    def _wake(self):
+        """Выделение места ожидающим пересылкам по очереди"""
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+
+            if self.in_use + size > self.capacity:
+                return
+
+            self._waiters.popleft()
+            self.in_use += size
+            future.set_result(None)
+
+
+# Глобальный лимит пересылаемых байтов
+byte_budget = ByteBudget()
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.types import Message
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ChatActionManager:
+    """Пересылка индикаторов активности (печатает, загружает файл) с ограничением частоты"""
+
+    # Предел размера таблицы отметок, после которого удаляются устаревшие записи
+    _MAX_TRACKED_CHATS = 10000
+
+    def __init__(self, interval: float = None):
+        self._interval = interval or config.CHAT_ACTION_INTERVAL
+        # Время последней отправки индикатора {(bot_id, chat_id, thread_id): monotonic}
+        self._last_sent: Dict[Tuple[int, int, Optional[int]], float] = {}
+
+    @classmethod
+    def get_media_action(cls, message: Message) -> Optional[str]:
+        """Индикатор для медиа-сообщения или None, если загрузки нет"""
+        from utils.media_codecs import get_codec
+        codec = get_codec(message)
+        return codec.chat_action if codec else None
+
+    async def send(self, bot: Bot, chat_id: int, action: str,
+                   message_thread_id: Optional[int] = None) -> bool:
+        """
+        Отправка индикатора, не чаще одного раза за интервал на чат
+
+        Returns:
+            True если индикатор был отправлен
+        """
+        key = (bot.id, chat_id, message_thread_id)
+        now = time.monotonic()
+
+        last_sent = self._last_sent.get(key)
+        if last_sent is not None and now - last_sent < self._interval:
+            return False
+
+        self._last_sent[key] = now
+        if len(self._last_sent) > self._MAX_TRACKED_CHATS:
+            self._prune(now)
+
+        try:
+            await bot.send_chat_action(
+                chat_id=chat_id,
+                action=action,
+                message_thread_id=message_thread_id
+            )
+            return True
+        except Exception as e:
+            logger.debug(f"Не удалось отправить индикатор {action} в чат {chat_id}: {e}")
+            return False
+
+    @asynccontextmanager
+    async def action(self, bot: Bot, chat_id: int, action: Optional[str],
+                     message_thread_id: Optional[int] = None):
+        """Поддержание индикатора, пока выполняется блок"""
+        if not action:
+            yield
+            return
+
+        task = asyncio.create_task(self._keep_alive(bot, chat_id, action, message_thread_id))
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    async def _keep_alive(self, bot: Bot, chat_id: int, action: str, message_thread_id: Optional[int]):
+        """Периодическая отправка индикатора (Telegram показывает его около 5 секунд)"""
+        try:
+            while True:
+                await self.send(bot, chat_id, action, message_thread_id)
+                await asyncio.sleep(self._interval)
+        except asyncio.CancelledError:
+            pass
+
+    def _prune(self, now: float):
+        """Удаление отметок, срок которых истек"""
+        expired = [key for key, sent_at in self._last_sent.items() if now - sent_at >= self._interval]
+        for key in expired:
+            del self._last_sent[key]
+
+
+# Глобальный экземпляр менеджера индикаторов
+chat_action_manager = ChatActionManager()
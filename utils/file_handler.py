@@ -1,267 +1,265 @@
 import logging
 import aiohttp
 import io
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 from aiogram import Bot
-from aiogram.types import Message, BufferedInputFile
+from aiogram.types import Message, BufferedInputFile, ReplyParameters, InputFile, URLInputFile, FSInputFile
 
 logger = logging.getLogger(__name__)
 
 class FileHandler:
     """Класс для работы с файлами - скачивание и отправка"""
     
+    # Облачный Bot API не отдает через getFile файлы больше 20 МБ
+    CLOUD_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+    
     @staticmethod
-    async def download_file(bot: Bot, file_id: str) -> Optional[bytes]:
+    async def download_file(bot: Bot, file_id: str, file_unique_id: str = None,
+                            file_size: int = None) -> Optional[Union[bytes, FSInputFile]]:
         """
         Скачивание файла по file_id
         
+        Если передан file_unique_id, файл сначала ищется в локальном кэше
+        медиа, а скачанный файл сохраняется в него. С локальным сервером
+        Bot API файл не копируется в память: возвращается FSInputFile по пути
+        на диске, который читается порциями при отправке.
+        
+        Скачанные байты занимают место в общем лимите byte_budget: оно
+        резервируется по file_size до скачивания и остается занятым после
+        возврата, пока вызывающий не освободит его через release_buffer().
+        
         Args:
             bot: Бот для скачивания
             file_id: ID файла
+            file_unique_id: Постоянный ID файла (одинаков для всех ботов)
+            file_size: Размер файла, если известен
             
         Returns:
-            Содержимое файла в байтах или None
+            Содержимое файла в байтах, FSInputFile (локальный сервер) или None
         """
+        from utils.byte_budget import byte_budget
+        
+        if FileHandler.is_local(bot):
+            return await FileHandler._local_file(bot, file_id)
+        
+        await byte_budget.acquire(file_size or 0)
+        file_bytes = None
+        try:
+            file_bytes = await FileHandler._fetch(bot, file_id, file_unique_id)
+        finally:
+            # Резерв остается только за байтами, отданными вызывающему
+            byte_budget.resize(file_size or 0, len(file_bytes) if file_bytes else 0)
+        
+        return file_bytes
+    
+    @staticmethod
+    def release_buffer(file_bytes: Union[bytes, str, InputFile, None]):
+        """Освобождение места в byte_budget, занятого байтами из download_file"""
+        from utils.byte_budget import byte_budget
+        
+        if isinstance(file_bytes, bytes):
+            byte_budget.release(len(file_bytes))
+    
+    @staticmethod
+    async def _local_file(bot: Bot, file_id: str) -> Optional[FSInputFile]:
+        """Файл на диске локального сервера Bot API"""
+        from config import config
+        
         try:
-            # Получаем информацию о файле
             file_info = await bot.get_file(file_id)
+            # Передаем путь, а не содержимое: файл читается порциями при отправке
+            return FSInputFile(
+                bot.session.api.wrap_local_file.to_local(file_info.file_path),
+                chunk_size=config.STREAM_CHUNK_SIZE
+            )
             
-            # Скачиваем файл
-            file_content = await bot.download_file(file_info.file_path)
-            
-            if isinstance(file_content, io.BytesIO):
-                return file_content.getvalue()
-            else:
-                return file_content
-                
         except Exception as e:
-            logger.error(f"Ошибка при скачивании файла {file_id}: {e}")
+            logger.error(f"Ошибка при получении локального пути файла {file_id}: {e}")
             return None
     
     @staticmethod
-    async def send_photo_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes, 
-                                  filename: str = "photo.jpg", caption: str = None,
-                                  caption_entities=None, message_thread_id: int = None,
-                                  use_parse_mode: bool = False) -> bool:
-        """Отправка фото из байтов"""
+    async def _fetch(bot: Bot, file_id: str, file_unique_id: str = None) -> Optional[bytes]:
+        """Байты файла из кэша медиа или из облачного Bot API"""
+        from utils.media_cache import media_cache
+        
+        if file_unique_id:
+            file_bytes = await media_cache.get(file_unique_id)
+            if file_bytes is not None:
+                return file_bytes
+        
         try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'photo': input_file,
-                'caption': caption
-            }
+            # Получаем информацию о файле
+            file_info = await bot.get_file(file_id)
             
-            # Если нужно использовать parse_mode, не передаем caption_entities
-            if use_parse_mode:
-                from aiogram.enums import ParseMode
-                kwargs['parse_mode'] = ParseMode.MARKDOWN_V2
-            else:
-                kwargs['caption_entities'] = caption_entities
+            # Скачиваем файл
+            file_content = await bot.download_file(file_info.file_path)
             
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
+            if isinstance(file_content, io.BytesIO):
+                file_content = file_content.getvalue()
             
-            await bot.send_photo(**kwargs)
-            return True
+            if file_unique_id and file_content:
+                await media_cache.put(file_unique_id, file_content)
             
+            return file_content
+                
         except Exception as e:
-            logger.error(f"Ошибка при отправке фото: {e}")
-            return False
+            if FileHandler._is_too_big(e):
+                FileHandler._log_too_big(file_id)
+            else:
+                logger.error(f"Ошибка при скачивании файла {file_id}: {e}")
+            return None
     
     @staticmethod
-    async def send_video_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                  filename: str = "video.mp4", caption: str = None,
-                                  caption_entities=None, message_thread_id: int = None,
-                                  duration: int = None, width: int = None, height: int = None,
-                                  use_parse_mode: bool = False) -> bool:
-        """Отправка видео из байтов"""
-        try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'video': input_file,
-                'caption': caption
-            }
-            
-            # Если нужно использовать parse_mode, не передаем caption_entities
-            if use_parse_mode:
-                from aiogram.enums import ParseMode
-                kwargs['parse_mode'] = ParseMode.MARKDOWN_V2
-            else:
-                kwargs['caption_entities'] = caption_entities
-            
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
-            if duration:
-                kwargs['duration'] = duration
-            if width:
-                kwargs['width'] = width
-            if height:
-                kwargs['height'] = height
-            
-            await bot.send_video(**kwargs)
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка при отправке видео: {e}")
-            return False
+    def is_local(bot: Bot) -> bool:
+        """Работает ли бот через собственный сервер Bot API в локальном режиме"""
+        return bot.session.api.is_local
     
     @staticmethod
-    async def send_voice_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                  filename: str = "voice.ogg", caption: str = None,
-                                  caption_entities=None, message_thread_id: int = None,
-                                  duration: int = None, use_parse_mode: bool = False) -> bool:
-        """Отправка голосового из байтов"""
-        try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'voice': input_file,
-                'caption': caption
-            }
-            
-            # Если нужно использовать parse_mode, не передаем caption_entities
-            if use_parse_mode:
-                from aiogram.enums import ParseMode
-                kwargs['parse_mode'] = ParseMode.MARKDOWN_V2
-            else:
-                kwargs['caption_entities'] = caption_entities
-            
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
-            if duration:
-                kwargs['duration'] = duration
-            
-            await bot.send_voice(**kwargs)
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка при отправке голосового: {e}")
-            return False
+    def _is_too_big(error: Exception) -> bool:
+        """Отказ облачного Bot API отдать файл больше 20 МБ"""
+        return "file is too big" in str(error).lower()
     
     @staticmethod
-    async def send_video_note_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                       filename: str = "video_note.mp4", message_thread_id: int = None,
-                                       duration: int = None, length: int = None) -> bool:
-        """Отправка видеокружка из байтов"""
-        try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'video_note': input_file
-            }
-            
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
-            if duration:
-                kwargs['duration'] = duration
-            if length:
-                kwargs['length'] = length
-            
-            await bot.send_video_note(**kwargs)
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка при отправке видеокружка: {e}")
-            return False
+    def _log_too_big(file_id: str, file_size: int = None):
+        size = f" ({file_size / 1024 / 1024:.1f} МБ)" if file_size else ""
+        logger.error(
+            f"Файл {file_id}{size} больше 20 МБ: облачный Bot API не отдает такие файлы, "
+            f"для их пересылки нужен собственный сервер Bot API (TELEGRAM_API_URL)"
+        )
     
     @staticmethod
-    async def send_document_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                     filename: str, caption: str = None,
-                                     caption_entities=None, message_thread_id: int = None,
-                                     use_parse_mode: bool = False) -> bool:
-        """Отправка документа из байтов"""
+    async def local_file_uri(bot: Bot, file_id: str) -> Optional[str]:
+        """
+        Ссылка file:// на файл в каталоге локального сервера Bot API
+        
+        Сервер принимает такую ссылку при отправке и читает файл сам,
+        без скачивания и загрузки через бота.
+        """
         try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'document': input_file,
-                'caption': caption
-            }
-            
-            # Если нужно использовать parse_mode, не передаем caption_entities
-            if use_parse_mode:
-                from aiogram.enums import ParseMode
-                kwargs['parse_mode'] = ParseMode.MARKDOWN_V2
-            else:
-                kwargs['caption_entities'] = caption_entities
-            
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
-            
-            await bot.send_document(**kwargs)
-            return True
+            file_info = await bot.get_file(file_id)
+            return f"file://{file_info.file_path}"
             
         except Exception as e:
-            logger.error(f"Ошибка при отправке документа: {e}")
-            return False
+            logger.error(f"Ошибка при получении локального пути файла {file_id}: {e}")
+            return None
     
     @staticmethod
-    async def send_audio_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                  filename: str = "audio.mp3", caption: str = None,
-                                  caption_entities=None, message_thread_id: int = None,
-                                  duration: int = None, performer: str = None, title: str = None) -> bool:
-        """Отправка аудио из байтов"""
-        try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
-            
-            kwargs = {
-                'chat_id': chat_id,
-                'audio': input_file,
-                'caption': caption,
-                'caption_entities': caption_entities
-            }
+    async def stream_file(bot: Bot, file_id: str, filename: str, file_size: int = None) -> Optional[InputFile]:
+        """
+        Потоковая передача файла без загрузки в память
+        
+        Файл скачивается сессией бота-источника порциями по STREAM_CHUNK_SIZE
+        прямо во время загрузки целевым ботом, поэтому расход памяти не зависит
+        от размера файла. С локальным сервером Bot API файл читается порциями
+        прямо с диска. Поток одноразовый: для повторной отправки нужен новый.
+        Через облачный Bot API файлы больше 20 МБ получить нельзя.
+        
+        Args:
+            bot: Бот, который получил файл
+            file_id: ID файла у этого бота
+            filename: Имя файла для загрузки
+            file_size: Размер файла, если известен (файл больше лимита не запрашивается)
             
-            if message_thread_id:
-                kwargs['message_thread_id'] = message_thread_id
-            if duration:
-                kwargs['duration'] = duration
-            if performer:
-                kwargs['performer'] = performer
-            if title:
-                kwargs['title'] = title
+        Returns:
+            Файл для отправки или None
+        """
+        from config import config
+        
+        if file_size and file_size > FileHandler.CLOUD_DOWNLOAD_LIMIT and not FileHandler.is_local(bot):
+            FileHandler._log_too_big(file_id, file_size)
+            return None
+        
+        try:
+            file_info = await bot.get_file(file_id)
             
-            await bot.send_audio(**kwargs)
-            return True
+            if FileHandler.is_local(bot):
+                return FSInputFile(
+                    bot.session.api.wrap_local_file.to_local(file_info.file_path),
+                    filename=filename,
+                    chunk_size=config.STREAM_CHUNK_SIZE
+                )
+            
+            return URLInputFile(
+                url=bot.session.api.file_url(bot.token, file_info.file_path),
+                filename=filename,
+                chunk_size=config.STREAM_CHUNK_SIZE,
+                timeout=config.STREAM_TIMEOUT,
+                bot=bot
+            )
             
         except Exception as e:
-            logger.error(f"Ошибка при отправке аудио: {e}")
-            return False
+            if FileHandler._is_too_big(e):
+                FileHandler._log_too_big(file_id, file_size)
+            else:
+                logger.error(f"Ошибка при подготовке потока файла {file_id}: {e}")
+            return None
     
     @staticmethod
-    async def send_animation_from_bytes(bot: Bot, chat_id: int, file_bytes: bytes,
-                                      filename: str = "animation.gif", caption: str = None,
-                                      caption_entities=None, message_thread_id: int = None,
-                                      duration: int = None, width: int = None, height: int = None) -> bool:
-        """Отправка анимации из байтов"""
-        try:
-            input_file = BufferedInputFile(file_bytes, filename=filename)
+    def stream_buffer_size(*file_sources) -> int:
+        """
+        Память под потоки от бота-источника на время загрузки
+        
+        Поток держит в памяти одну порцию STREAM_CHUNK_SIZE. Байты уже учтены
+        при скачивании (или это небольшой файл из Redis), а file_id, ссылки
+        file:// и файлы на диске память бота не занимают.
+        """
+        return sum(source.chunk_size for source in file_sources if isinstance(source, URLInputFile))
+    
+    @staticmethod
+    def _input_file(file_bytes: Union[bytes, str, InputFile], filename: str):
+        """Байты отправляются как новый файл, строка - как file_id, уже известный боту"""
+        if isinstance(file_bytes, (str, InputFile)):
+            return file_bytes
+        return BufferedInputFile(file_bytes, filename=filename)
+    
+    @staticmethod
+    async def send_media(bot: Bot, codec, chat_id: int, file_bytes: Union[bytes, str, InputFile],
+                         filename: str = None, caption: str = None, message_thread_id: int = None,
+                         reply_to_message_id: int = None, **fields) -> Optional[Message]:
+        """
+        Отправка файла любого типа медиа
+        
+        Args:
+            bot: Бот для отправки
+            codec: Описание типа медиа (MediaCodec)
+            chat_id: ID целевого чата
+            file_bytes: Байты, file_id или InputFile
+            filename: Имя файла для загрузки
+            caption: Подпись в Markdown V2 (игнорируется для типов без подписи)
+            message_thread_id: ID темы (для групп)
+            reply_to_message_id: ID сообщения, на которое нужно ответить
+            **fields: Дополнительные параметры send_{type} (duration, width, ...)
             
+        Returns:
+            Отправленное сообщение или None
+        """
+        from utils.byte_budget import byte_budget
+        
+        try:
             kwargs = {
                 'chat_id': chat_id,
-                'animation': input_file,
-                'caption': caption,
-                'caption_entities': caption_entities
+                codec.type: FileHandler._input_file(file_bytes, filename or codec.default_filename),
+                **fields
             }
             
+            if codec.caption and caption:
+                from aiogram.enums import ParseMode
+                kwargs['caption'] = caption
+                kwargs['parse_mode'] = ParseMode.MARKDOWN_V2
+            
             if message_thread_id:
                 kwargs['message_thread_id'] = message_thread_id
-            if duration:
-                kwargs['duration'] = duration
-            if width:
-                kwargs['width'] = width
-            if height:
-                kwargs['height'] = height
+            if reply_to_message_id:
+                kwargs['reply_parameters'] = ReplyParameters(
+                    message_id=reply_to_message_id,
+                    allow_sending_without_reply=True
+                )
             
-            await bot.send_animation(**kwargs)
-            return True
+            async with byte_budget.reserve(FileHandler.stream_buffer_size(file_bytes)):
+                return await getattr(bot, codec.send_method)(**kwargs)
             
         except Exception as e:
-            logger.error(f"Ошибка при отправке анимации: {e}")
-            return False
\ No newline at end of file
+            from utils.topic_manager import TopicNotFoundError
+            TopicNotFoundError.check(e)
+            logger.error(f"Ошибка при отправке {codec.type}: {e}")
+            return None
@@ -0,0 +1,61 @@
+import logging
+from typing import Optional
+from aiogram.types import Message
+from config import config
+from utils.redis_manager import redis_manager
+
+logger = logging.getLogger(__name__)
+
+
+class FileIdCache:
+    """Кэш file_id, полученных целевым ботом после первой загрузки файла
+
+    Ключ - (target_bot_id, file_unique_id исходного файла). file_unique_id
+    одинаков для всех ботов, а file_id действует только для бота, который
+    его получил, поэтому повторная пересылка того же файла тем же ботом
+    идет по file_id без скачивания и загрузки.
+    """
+
+    @staticmethod
+    def _key(target_bot_id: int, file_unique_id: str) -> str:
+        return f"file_id:{target_bot_id}:{file_unique_id}"
+
+    @staticmethod
+    def extract_file_id(sent_message: Message) -> Optional[str]:
+        """file_id файла в отправленном сообщении"""
+        from utils.media_codecs import get_codec
+
+        codec = get_codec(sent_message)
+        return codec.get_media(sent_message).file_id if codec else None
+
+    @classmethod
+    async def get(cls, target_bot_id: Optional[int], file_unique_id: Optional[str]) -> Optional[str]:
+        """Получение file_id для целевого бота"""
+        if not target_bot_id or not file_unique_id:
+            return None
+
+        file_id = await redis_manager.get(cls._key(target_bot_id, file_unique_id))
+        if file_id:
+            logger.debug(f"Файл {file_unique_id} найден в кэше бота {target_bot_id}")
+            return str(file_id)
+        return None
+
+    @classmethod
+    async def remember(cls, target_bot_id: int, file_unique_id: Optional[str],
+                       sent_message: Optional[Message]) -> bool:
+        """Сохранение file_id, который целевой бот получил после отправки"""
+        if not file_unique_id or not sent_message:
+            return False
+
+        file_id = cls.extract_file_id(sent_message)
+        if not file_id:
+            return False
+
+        return await redis_manager.set(
+            cls._key(target_bot_id, file_unique_id), file_id, expire=config.FILE_ID_CACHE_TTL
+        )
+
+    @classmethod
+    async def forget(cls, target_bot_id: int, file_unique_id: str) -> bool:
+        """Удаление недействительного file_id"""
+        return await redis_manager.delete(cls._key(target_bot_id, file_unique_id))
@@ -220,6 +220,7 @@ class MarkdownV2Utils:
 🔒 {MarkdownV2Utils.code('/ban')} \\- заблокировать пользователя
 🔓 {MarkdownV2Utils.code('/unban')} \\- разблокировать пользователя
 ❌ {MarkdownV2Utils.code('/end')} \\- завершить диалог
+⏱ {MarkdownV2Utils.code('/endidle 12h')} \\- завершить диалоги без сообщений дольше 12 часов
 ❓ {MarkdownV2Utils.code('/help')} \\- показать справку
 
 💬 Для ответа пользователю просто напишите сообщение в теме\\."""
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """Локальный кэш скачанных файлов с адресацией по содержимому
+
+    Содержимое хранится в objects/{sha256[:2]}/{sha256}, поэтому одинаковые
+    файлы лежат на диске один раз. Файл Telegram находится по file_unique_id
+    через ссылку ids/{file_unique_id}, в которой записан хэш содержимого.
+    Общий размер ограничен MEDIA_CACHE_MAX_BYTES, при переполнении удаляются
+    давно не использованные файлы. Файлы старше MEDIA_CACHE_TTL с последнего
+    обращения считаются устаревшими. Блокировка защищает только индекс в
+    памяти: чтение и запись файлов идут параллельно, файлы появляются на
+    месте целиком (запись во временный файл и os.replace).
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None, ttl: int = None):
+        self.directory = directory or config.MEDIA_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else config.MEDIA_CACHE_MAX_BYTES
+        self.ttl = ttl or config.MEDIA_CACHE_TTL
+        # Порядок обращений к содержимому {sha256: размер}, последние в конце
+        self._lru: Optional[OrderedDict] = None
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _id_path(self, file_unique_id: str) -> str:
+        return os.path.join(self.directory, 'ids', os.path.basename(file_unique_id))
+
+    def _scan(self) -> OrderedDict:
+        """Восстановление индекса по файлам на диске, от давно использованных к недавним"""
+        objects_dir = os.path.join(self.directory, 'objects')
+        os.makedirs(objects_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.directory, 'ids'), exist_ok=True)
+
+        entries = []
+        for root, _, files in os.walk(objects_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        entries.sort()
+        return OrderedDict((name, size) for _, name, size in entries)
+
+    async def _load(self):
+        if self._lru is None:
+            self._lru = await asyncio.to_thread(self._scan)
+            self._size = sum(self._lru.values())
+            logger.info(f"Кэш медиа {self.directory}: {len(self._lru)} файлов, {self._size} байт")
+
+    def _read(self, file_unique_id: str) -> Optional[Tuple[str, bytes]]:
+        """Чтение файла по ссылке; устаревший файл не возвращается"""
+        try:
+            with open(self._id_path(file_unique_id), 'r') as f:
+                digest = f.read().strip()
+            path = self._object_path(digest)
+            if os.path.getmtime(path) < time.time() - self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Время изменения служит временем последнего обращения после перезапуска
+            os.utime(path)
+            return digest, data
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _replace(path: str, data: bytes):
+        """Запись через временный файл: читатели видят файл только целиком"""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write(self, file_unique_id: str, digest: str, data: bytes):
+        """Запись содержимого (если его еще нет) и ссылки на него"""
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._replace(path, data)
+
+        self._replace(self._id_path(file_unique_id), digest.encode())
+
+    def _remove(self, digest: str):
+        try:
+            os.remove(self._object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    async def get(self, file_unique_id: Optional[str]) -> Optional[bytes]:
+        """Получение файла из кэша"""
+        if not self.enabled or not file_unique_id:
+            return None
+
+        async with self._lock:
+            await self._load()
+
+        try:
+            cached = await asyncio.to_thread(self._read, file_unique_id)
+        except OSError as e:
+            logger.error(f"Ошибка чтения файла {file_unique_id} из кэша медиа: {e}")
+            cached = None
+
+        if cached is None:
+            self.misses += 1
+            return None
+
+        digest, data = cached
+        async with self._lock:
+            if digest in self._lru:
+                self._lru.move_to_end(digest)
+        self.hits += 1
+        logger.debug(f"Файл {file_unique_id} найден в кэше медиа")
+        return data
+
+    async def put(self, file_unique_id: Optional[str], data: bytes) -> bool:
+        """Сохранение скачанного файла"""
+        if not self.enabled or not file_unique_id or len(data) > self.max_bytes:
+            return False
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        async with self._lock:
+            await self._load()
+
+        try:
+            await asyncio.to_thread(self._write, file_unique_id, digest, data)
+        except OSError as e:
+            logger.error(f"Ошибка записи файла {file_unique_id} в кэш медиа: {e}")
+            return False
+
+        async with self._lock:
+            if digest not in self._lru:
+                self._size += len(data)
+            self._lru[digest] = len(data)
+            self._lru.move_to_end(digest)
+            evicted = self._pop_evicted()
+
+        for digest in evicted:
+            await asyncio.to_thread(self._remove, digest)
+        return True
+
+    def _pop_evicted(self) -> List[str]:
+        """Удаление из индекса давно не использованных файлов сверх лимита размера"""
+        evicted = []
+        # Самый свежий файл не удаляется, даже если он один занимает весь лимит
+        while self._size > self.max_bytes and len(self._lru) > 1:
+            digest, size = self._lru.popitem(last=False)
+            evicted.append(digest)
+            self._size -= size
+            self.evictions += 1
+        return evicted
+
+    async def cleanup(self) -> int:
+        """Удаление устаревших файлов и ссылок на удаленное содержимое"""
+        if not self.enabled:
+            return 0
+
+        async with self._lock:
+            await self._load()
+            removed = await asyncio.to_thread(self._cleanup_files)
+            self._lru = None
+            await self._load()
+
+        if removed:
+            logger.info(f"Удалено {removed} устаревших файлов из кэша медиа")
+        return removed
+
+    def _cleanup_files(self) -> int:
+        deadline = time.time() - self.ttl
+        removed = 0
+        for digest in list(self._lru):
+            path = self._object_path(digest)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+
+        ids_dir = os.path.join(self.directory, 'ids')
+        for entry in list(os.scandir(ids_dir)):
+            try:
+                with open(entry.path, 'r') as f:
+                    digest = f.read().strip()
+                if not digest or not os.path.exists(self._object_path(digest)):
+                    os.remove(entry.path)
+            except (FileNotFoundError, ValueError):
+                pass
+
+        return removed
+
+    def get_stats(self) -> Dict[str, float]:
+        """Метрики кэша"""
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'files': len(self._lru) if self._lru is not None else 0,
+            'size': self._size,
+            'max_bytes': self.max_bytes
+        }
+
+
+# Глобальный экземпляр кэша медиа
+media_cache = MediaCache()
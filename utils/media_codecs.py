@@ -0,0 +1,161 @@
+from typing import Any, Dict, Optional, Tuple, Type
+from aiogram.enums import ChatAction
+from aiogram.types import (
+    Message, InputMedia, InputMediaPhoto, InputMediaVideo, InputMediaAudio, InputMediaDocument
+)
+from config import config
+
+
+class MediaCodec:
+    """
+    Описание типа медиа для пересылки
+
+    Один экземпляр на тип сообщения: откуда взять файл, какие поля сохранить,
+    каким методом и с какими параметрами отправить, можно ли передать файл
+    потоком и с какими типами его можно объединить в альбом. Подготовка,
+    хранение и отправка файлов работают по этому описанию одинаково для
+    всех типов.
+    """
+
+    def __init__(self, type: str, default_filename: str, chat_action: str,
+                 fields: Tuple[str, ...] = (), send_fields: Tuple[str, ...] = (),
+                 caption: bool = True, streamable: bool = True,
+                 album: Optional[str] = None, input_media: Optional[Type[InputMedia]] = None):
+        """
+        Args:
+            type: Тип сообщения, он же атрибут Message и имя параметра send_{type}
+            default_filename: Имя файла, если у исходного файла его нет
+            chat_action: Индикатор активности на время пересылки
+            fields: Поля файла, которые сохраняются вместе с сообщением
+            send_fields: Поля, передаваемые в send_{type} и InputMedia
+            caption: Поддерживает ли тип подпись
+            streamable: Можно ли передавать большой файл потоком вместо скачивания
+            album: Группа типов, совместимых в одном send_media_group
+            input_media: Класс элемента send_media_group
+        """
+        self.type = type
+        self.default_filename = default_filename
+        self.chat_action = chat_action
+        self.fields = fields
+        self.send_fields = send_fields
+        self.caption = caption
+        self.streamable = streamable
+        self.album = album
+        self.input_media = input_media
+
+    @property
+    def send_method(self) -> str:
+        """Имя метода бота для отправки"""
+        return f"send_{self.type}"
+
+    def get_media(self, message: Message):
+        """Файл сообщения (для фото - наибольший размер)"""
+        media = getattr(message, self.type, None)
+        if isinstance(media, list):
+            return media[-1] if media else None
+        return media
+
+    def get_filename(self, media, message_id: str) -> str:
+        """Имя файла для загрузки"""
+        file_name = getattr(media, 'file_name', None)
+        if file_name:
+            return file_name
+
+        stem, dot, extension = self.default_filename.rpartition('.')
+        if not dot:
+            return f"{self.default_filename}_{message_id}"
+        return f"{stem}_{message_id}.{extension}"
+
+    def describe(self, media, message_id: str) -> Dict[str, Any]:
+        """Данные файла для сохранения вместе с сообщением"""
+        data = {
+            'type': self.type,
+            'file_id': media.file_id,
+            'file_unique_id': media.file_unique_id,
+            'file_size': media.file_size,
+            'filename': self.get_filename(media, message_id)
+        }
+        for field in self.fields:
+            data[field] = getattr(media, field, None)
+        return data
+
+    def send_kwargs(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Параметры отправки из сохраненных данных (пустые не передаются)"""
+        return {
+            field: message_data[field]
+            for field in self.send_fields
+            if message_data.get(field)
+        }
+
+    def should_stream(self, media) -> bool:
+        """Передавать ли файл потоком от бота-источника вместо скачивания заранее"""
+        return self.streamable and (media.file_size or 0) >= config.STREAM_MIN_FILE_SIZE
+
+
+class StickerCodec(MediaCodec):
+    """Стикер: расширение файла зависит от формата (webp, tgs или webm)"""
+
+    def get_filename(self, media, message_id: str) -> str:
+        if getattr(media, 'is_animated', False):
+            return f"sticker_{message_id}.tgs"
+        if getattr(media, 'is_video', False):
+            return f"sticker_{message_id}.webm"
+        return super().get_filename(media, message_id)
+
+
+# Типы медиа в порядке определения: у анимации Telegram заполняет и document,
+# поэтому она проверяется раньше документа
+MEDIA_CODECS: Dict[str, MediaCodec] = {codec.type: codec for codec in (
+    MediaCodec(
+        'photo', 'photo.jpg', ChatAction.UPLOAD_PHOTO,
+        fields=('width', 'height'),
+        album='visual', input_media=InputMediaPhoto
+    ),
+    MediaCodec(
+        'video', 'video.mp4', ChatAction.UPLOAD_VIDEO,
+        fields=('width', 'height', 'duration', 'mime_type'),
+        send_fields=('duration', 'width', 'height'),
+        album='visual', input_media=InputMediaVideo
+    ),
+    MediaCodec(
+        'animation', 'animation.mp4', ChatAction.UPLOAD_VIDEO,
+        fields=('width', 'height', 'duration', 'mime_type'),
+        send_fields=('duration', 'width', 'height')
+    ),
+    MediaCodec(
+        'voice', 'voice.ogg', ChatAction.UPLOAD_VOICE,
+        fields=('duration', 'mime_type'),
+        send_fields=('duration',)
+    ),
+    MediaCodec(
+        'video_note', 'video_note.mp4', ChatAction.UPLOAD_VIDEO_NOTE,
+        fields=('length', 'duration'),
+        send_fields=('duration', 'length'),
+        caption=False
+    ),
+    MediaCodec(
+        # upload_voice Telegram показывает только для голосовых, музыка - это файл
+        'audio', 'audio.mp3', ChatAction.UPLOAD_DOCUMENT,
+        fields=('duration', 'performer', 'title', 'mime_type'),
+        send_fields=('duration', 'performer', 'title'),
+        album='audio', input_media=InputMediaAudio
+    ),
+    MediaCodec(
+        'document', 'document', ChatAction.UPLOAD_DOCUMENT,
+        fields=('mime_type',),
+        album='document', input_media=InputMediaDocument
+    ),
+    StickerCodec(
+        'sticker', 'sticker.webp', ChatAction.CHOOSE_STICKER,
+        fields=('width', 'height', 'is_animated', 'is_video', 'emoji', 'set_name'),
+        caption=False, streamable=False
+    ),
+)}
+
+
+def get_codec(message: Message) -> Optional[MediaCodec]:
+    """Описание медиа сообщения или None, если файла в нем нет"""
+    for codec in MEDIA_CODECS.values():
+        if codec.get_media(message):
+            return codec
+    return None
@@ -1,21 +1,49 @@
 import asyncio
 import logging
-from typing import Dict, List
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List
 from aiogram.types import Message
+from config import config
 from utils.message_storage import MessageStorage
 from utils.message_sender import MessageSender
-from utils.topic_manager import TopicManager
+from utils.topic_manager import TopicManager, TopicNotFoundError
+from utils.chat_action_manager import chat_action_manager
+from utils.redis_manager import redis_manager
 
 logger = logging.getLogger(__name__)
 
 class MediaGroupHandler:
-    """Класс для обработки медиагрупп (альбомов) через Redis"""
+    """Класс для обработки медиагрупп (альбомов) через Redis
+
+    Части альбома собираются в Redis-списке, поэтому альбом, части которого
+    получили разные процессы, отправляется целиком и не теряется при
+    перезапуске. Альбом отправляется, когда новых частей нет дольше таймаута,
+    или сразу после ALBUM_MAX_SIZE частей (больше в альбоме не бывает).
+    Таймаут подстраивается под интервалы между частями для каждого источника.
+    """
+    
+    PENDING_KEY = "album:pending"
+    # Доля последнего интервала в скользящем среднем
+    GAP_SMOOTHING = 0.3
+    # Во сколько раз таймаут больше среднего интервала между частями
+    GAP_MULTIPLIER = 3
     
     def __init__(self):
-        # Словарь для хранения временных данных медиагрупп
-        # Ключ: media_group_id, Значение: {'messages': [], 'timer': asyncio.Task}
-        self._media_groups: Dict[str, Dict] = {}
-        self._timeout = 1.0  # Таймаут ожидания завершения медиагруппы в секундах
+        # Локальные таймеры ожидания: media_group_id -> asyncio.Task
+        self._timers: Dict[str, asyncio.Task] = {}
+    
+    @staticmethod
+    def _parts_key(media_group_id: str) -> str:
+        return f"album:{media_group_id}:parts"
+    
+    @staticmethod
+    def _meta_key(media_group_id: str) -> str:
+        return f"album:{media_group_id}"
+    
+    @staticmethod
+    def _gap_key(source: str) -> str:
+        return f"album:gap:{source}"
     
     async def handle_message(self, message: Message, chat_data, main_bot, is_from_user: bool = True):
         """
@@ -34,30 +62,156 @@ class MediaGroupHandler:
         
         # Сообщение является частью медиагруппы
         media_group_id = message.media_group_id
+        source = f"{message.bot.id}:{message.chat.id}"
+        now = time.time()
+        
+        meta = await redis_manager.hgetall(self._meta_key(media_group_id))
+        
+        count = await redis_manager.rpush_with_expire(
+            self._parts_key(media_group_id),
+            message.model_dump_json(exclude_none=True),
+            config.MEDIA_GROUP_TTL
+        )
+        if not count:
+            # Без Redis альбом не собрать - пересылаем часть отдельно, чтобы не потерять
+            logger.warning(f"Не удалось сохранить часть медиагруппы {media_group_id}, пересылаем отдельно")
+            await self._handle_single_message(message, chat_data, main_bot, is_from_user)
+            return
+        
+        await redis_manager.hset_with_expire(self._meta_key(media_group_id), {
+            'last_at': now,
+            'chat_data_id': chat_data.id,
+            'bot_id': message.bot.id,
+            'is_from_user': int(is_from_user)
+        }, config.MEDIA_GROUP_TTL)
+        await redis_manager.sadd(self.PENDING_KEY, media_group_id)
+        
+        if meta and meta.get('last_at'):
+            timeout = await self._observe_gap(source, now - float(meta['last_at']))
+        else:
+            timeout = self._timeout_for(await redis_manager.get(self._gap_key(source)))
+        
+        logger.debug(f"Часть {count} медиагруппы {media_group_id}, таймаут {timeout:.2f} сек")
+        
+        timer = self._timers.pop(media_group_id, None)
+        if timer:
+            timer.cancel()
+        
+        if count >= MessageSender.ALBUM_MAX_SIZE:
+            # Альбом заполнен - ждать больше нечего
+            await self._flush(media_group_id, chat_data, main_bot, message.bot, is_from_user)
+            return
+        
+        self._timers[media_group_id] = asyncio.create_task(
+            self._flush_after_timeout(media_group_id, timeout, chat_data, main_bot, message.bot, is_from_user)
+        )
+    
+    async def resume(self):
+        """Отправка медиагрупп, собранных до перезапуска"""
+        from database.database import async_session
+        from database.queries import DatabaseQueries
+        from utils.bot_manager import bot_manager
+        
+        main_bot = await bot_manager.get_bot(0)
+        
+        for media_group_id in await redis_manager.smembers(self.PENDING_KEY):
+            meta = await redis_manager.hgetall(self._meta_key(media_group_id))
+            if not meta or not await redis_manager.exists(self._parts_key(media_group_id)):
+                await redis_manager.srem(self.PENDING_KEY, media_group_id)
+                continue
+            
+            bot = bot_manager.get_bot_by_telegram_id(int(meta['bot_id']))
+            async with async_session() as session:
+                chat_data = await DatabaseQueries(session).get_chat_by_id(int(meta['chat_data_id']))
+            
+            if not bot or not chat_data or not main_bot:
+                logger.warning(f"Не удалось восстановить медиагруппу {media_group_id}")
+                continue
+            
+            logger.info(f"Отправляем медиагруппу {media_group_id}, собранную до перезапуска")
+            self._timers[media_group_id] = asyncio.create_task(
+                self._flush_after_timeout(
+                    media_group_id, 0, chat_data, main_bot, bot, bool(int(meta.get('is_from_user', 1)))
+                )
+            )
+    
+    async def _observe_gap(self, source: str, gap: float) -> float:
+        """Учет интервала между частями альбома и расчет нового таймаута"""
+        average = await redis_manager.get(self._gap_key(source))
+        if isinstance(average, (int, float)):
+            average = self.GAP_SMOOTHING * gap + (1 - self.GAP_SMOOTHING) * average
+        else:
+            average = gap
         
-        if media_group_id not in self._media_groups:
-            # Создаем новую медиагруппу
-            self._media_groups[media_group_id] = {
-                'messages': [],
-                'chat_data': chat_data,
-                'main_bot': main_bot,
-                'is_from_user': is_from_user,
-                'timer': None
-            }
+        await redis_manager.set(self._gap_key(source), average, expire=config.MEDIA_GROUP_GAP_TTL)
+        return self._timeout_for(average)
+    
+    def _timeout_for(self, average_gap) -> float:
+        """Таймаут ожидания следующей части по среднему интервалу"""
+        if not isinstance(average_gap, (int, float)):
+            return config.MEDIA_GROUP_TIMEOUT
         
-        # Добавляем сообщение в медиагруппу
-        self._media_groups[media_group_id]['messages'].append(message)
+        return min(
+            max(average_gap * self.GAP_MULTIPLIER, config.MEDIA_GROUP_MIN_TIMEOUT),
+            config.MEDIA_GROUP_MAX_TIMEOUT
+        )
+    
+    async def _flush_after_timeout(self, media_group_id: str, timeout: float, chat_data, main_bot, bot,
+                                   is_from_user: bool):
+        """Отправка медиагруппы, когда новых частей нет дольше таймаута"""
+        try:
+            delay = timeout
+            while True:
+                await asyncio.sleep(delay)
+                
+                meta = await redis_manager.hgetall(self._meta_key(media_group_id))
+                if not meta:
+                    break
+                
+                # Часть могла прийти в другой процесс - досыпаем оставшееся время
+                idle = time.time() - float(meta.get('last_at', 0))
+                if idle >= timeout:
+                    break
+                delay = timeout - idle
+            
+            if self._timers.get(media_group_id) is asyncio.current_task():
+                del self._timers[media_group_id]
+            
+            await self._flush(media_group_id, chat_data, main_bot, bot, is_from_user)
+            
+        except asyncio.CancelledError:
+            # Таймер был отменен, это нормально
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при обработке медиагруппы {media_group_id}: {e}")
+    
+    async def _flush(self, media_group_id: str, chat_data, main_bot, bot, is_from_user: bool):
+        """Забрать собранные части из Redis и отправить медиагруппу"""
+        # Переименование атомарно: части забирает только один процесс,
+        # а опоздавшие части попадут в новый список
+        claimed_key = f"{self._parts_key(media_group_id)}:{uuid.uuid4().hex}"
+        if not await redis_manager.rename(self._parts_key(media_group_id), claimed_key):
+            return
         
-        # Отменяем предыдущий таймер если он был
-        if self._media_groups[media_group_id]['timer']:
-            self._media_groups[media_group_id]['timer'].cancel()
+        raw_messages = await redis_manager.lrange(claimed_key)
+        await redis_manager.delete(claimed_key)
+        await redis_manager.srem(self.PENDING_KEY, media_group_id)
         
-        # Создаем новый таймер
-        self._media_groups[media_group_id]['timer'] = asyncio.create_task(
-            self._process_media_group_after_timeout(media_group_id)
+        messages = sorted(
+            (Message.model_validate_json(raw, context={'bot': bot}) for raw in raw_messages),
+            key=lambda message: message.message_id
         )
+        if not messages:
+            return
         
-        logger.debug(f"Добавлено сообщение в медиагруппу {media_group_id}, всего сообщений: {len(self._media_groups[media_group_id]['messages'])}")
+        logger.info(f"Обрабатываем медиагруппу {media_group_id} с {len(messages)} сообщениями")
+        
+        if is_from_user:
+            # Медиагруппа от пользователя в группу
+            await self._handle_media_group_to_group(messages, chat_data, main_bot, media_group_id)
+        else:
+            # Медиагруппа от оператора пользователю
+            await self._handle_media_group_to_user(messages, chat_data, main_bot, media_group_id)
     
     async def _handle_single_message(self, message: Message, chat_data, main_bot, is_from_user: bool):
         """Обработка одиночного сообщения"""
@@ -66,12 +220,6 @@ class MediaGroupHandler:
                 # Сообщение от пользователя в группу
                 direction = "to_group"
                 
-                # Сохраняем сообщение в Redis
-                message_id = await MessageStorage.save_message(message, chat_data, direction)
-                if not message_id:
-                    logger.error("Не удалось сохранить сообщение в Redis")
-                    return
-                
                 # Получаем данные бота
                 bot_data = chat_data.bot
                 if not bot_data.group_id:
@@ -86,15 +234,31 @@ class MediaGroupHandler:
                 
                 chat_data.topic_id = topic_id
                 
-                # Отправляем информацию о пользователе
-                await MessageSender.send_user_info_message(
-                    main_bot, chat_data, bot_data.group_id, topic_id
-                )
-                
-                # Отправляем сообщение из хранилища
-                success = await MessageSender.send_message_from_storage(
-                    main_bot, message_id, bot_data.group_id, topic_id
-                )
+                # Показываем операторам индикатор загрузки, пока файл пересылается
+                async with chat_action_manager.action(
+                    main_bot, bot_data.group_id, chat_action_manager.get_media_action(message), topic_id
+                ):
+                    # Подготавливаем сообщение к пересылке
+                    prepared = await MessageStorage.prepare_message(message, chat_data, direction, main_bot.id)
+                    if not prepared:
+                        logger.error("Не удалось подготовить сообщение к пересылке")
+                        return
+                    
+                    async def send(topic_id: int) -> bool:
+                        # Отправляем информацию о пользователе
+                        await MessageSender.send_user_info_message(
+                            main_bot, chat_data, bot_data.group_id, topic_id
+                        )
+                        
+                        # Отправляем сообщение
+                        return await MessageSender.send_prepared_message(
+                            main_bot, prepared, bot_data.group_id, topic_id
+                        )
+                    
+                    try:
+                        success = await self._send_to_topic(main_bot, chat_data, bot_data.group_id, topic_id, send)
+                    finally:
+                        MessageStorage.release_prepared(prepared)
                 
                 if success:
                     # Сохраняем в БД
@@ -107,12 +271,6 @@ class MediaGroupHandler:
                 # Сообщение от оператора пользователю
                 direction = "to_user"
                 
-                # Сохраняем сообщение в Redis
-                message_id = await MessageStorage.save_message(message, chat_data, direction)
-                if not message_id:
-                    logger.error("Не удалось сохранить сообщение в Redis")
-                    return
-                
                 # Получаем бота пользователя
                 from utils.bot_manager import bot_manager
                 user_bot = await bot_manager.get_bot(chat_data.bot_id)
@@ -120,10 +278,23 @@ class MediaGroupHandler:
                     logger.error("Бот пользователя недоступен")
                     return
                 
-                # Отправляем сообщение пользователю
-                success = await MessageSender.send_message_from_storage(
-                    user_bot, message_id, chat_data.user_id
-                )
+                # Показываем пользователю индикатор загрузки, пока файл пересылается
+                async with chat_action_manager.action(
+                    user_bot, chat_data.user_id, chat_action_manager.get_media_action(message)
+                ):
+                    # Подготавливаем сообщение к пересылке
+                    prepared = await MessageStorage.prepare_message(message, chat_data, direction, user_bot.id)
+                    if not prepared:
+                        logger.error("Не удалось подготовить сообщение к пересылке")
+                        return
+                    
+                    try:
+                        # Отправляем сообщение пользователю
+                        success = await MessageSender.send_prepared_message(
+                            user_bot, prepared, chat_data.user_id
+                        )
+                    finally:
+                        MessageStorage.release_prepared(prepared)
                 
                 if success:
                     # Сохраняем в БД
@@ -135,50 +306,9 @@ class MediaGroupHandler:
         except Exception as e:
             logger.error(f"Ошибка при обработке одиночного сообщения: {e}")
     
-    async def _process_media_group_after_timeout(self, media_group_id: str):
-        """Обработка медиагруппы после таймаута"""
-        try:
-            await asyncio.sleep(self._timeout)
-            
-            if media_group_id not in self._media_groups:
-                return
-            
-            group_data = self._media_groups[media_group_id]
-            messages = group_data['messages']
-            chat_data = group_data['chat_data']
-            main_bot = group_data['main_bot']
-            is_from_user = group_data['is_from_user']
-            
-            logger.info(f"Обрабатываем медиагруппу {media_group_id} с {len(messages)} сообщениями")
-            
-            if is_from_user:
-                # Медиагруппа от пользователя в группу
-                await self._handle_media_group_to_group(messages, chat_data, main_bot, media_group_id)
-            else:
-                # Медиагруппа от оператора пользователю
-                await self._handle_media_group_to_user(messages, chat_data, main_bot, media_group_id)
-            
-            # Удаляем обработанную медиагруппу
-            del self._media_groups[media_group_id]
-            
-        except asyncio.CancelledError:
-            # Таймер был отменен, это нормально
-            pass
-        except Exception as e:
-            logger.error(f"Ошибка при обработке медиагруппы {media_group_id}: {e}")
-            # Удаляем медиагруппу в случае ошибки
-            if media_group_id in self._media_groups:
-                del self._media_groups[media_group_id]
-    
     async def _handle_media_group_to_group(self, messages: List[Message], chat_data, main_bot, media_group_id: str):
         """Обработка медиагруппы от пользователя в группу"""
         try:
-            # Сохраняем медиагруппу в Redis
-            message_ids = await MessageStorage.save_media_group(messages, chat_data, "to_group")
-            if not message_ids:
-                logger.error("Не удалось сохранить медиагруппу в Redis")
-                return
-            
             # Получаем данные бота
             bot_data = chat_data.bot
             if not bot_data.group_id:
@@ -193,15 +323,31 @@ class MediaGroupHandler:
             
             chat_data.topic_id = topic_id
             
-            # Отправляем информацию о пользователе
-            await MessageSender.send_user_info_message(
-                main_bot, chat_data, bot_data.group_id, topic_id
-            )
-            
-            # Отправляем медиагруппу из хранилища
-            success = await MessageSender.send_media_group_from_storage(
-                main_bot, media_group_id, bot_data.group_id, topic_id
-            )
+            # Показываем операторам индикатор загрузки, пока альбом пересылается
+            async with chat_action_manager.action(
+                main_bot, bot_data.group_id, chat_action_manager.get_media_action(messages[0]), topic_id
+            ):
+                # Подготавливаем медиагруппу к пересылке
+                prepared = await MessageStorage.prepare_media_group(messages, chat_data, "to_group", main_bot.id)
+                if not prepared:
+                    logger.error("Не удалось подготовить медиагруппу к пересылке")
+                    return
+                
+                async def send(topic_id: int) -> bool:
+                    # Отправляем информацию о пользователе
+                    await MessageSender.send_user_info_message(
+                        main_bot, chat_data, bot_data.group_id, topic_id
+                    )
+                    
+                    # Отправляем медиагруппу
+                    return await MessageSender.send_prepared_media_group(
+                        main_bot, prepared, bot_data.group_id, topic_id
+                    )
+                
+                try:
+                    success = await self._send_to_topic(main_bot, chat_data, bot_data.group_id, topic_id, send)
+                finally:
+                    MessageStorage.release_prepared(prepared)
             
             if success:
                 # Сохраняем в БД каждое сообщение
@@ -218,12 +364,6 @@ class MediaGroupHandler:
     async def _handle_media_group_to_user(self, messages: List[Message], chat_data, main_bot, media_group_id: str):
         """Обработка медиагруппы от оператора пользователю"""
         try:
-            # Сохраняем медиагруппу в Redis
-            message_ids = await MessageStorage.save_media_group(messages, chat_data, "to_user")
-            if not message_ids:
-                logger.error("Не удалось сохранить медиагруппу в Redis")
-                return
-            
             # Получаем бота пользователя
             from utils.bot_manager import bot_manager
             user_bot = await bot_manager.get_bot(chat_data.bot_id)
@@ -231,10 +371,23 @@ class MediaGroupHandler:
                 logger.error("Бот пользователя недоступен")
                 return
             
-            # Отправляем медиагруппу пользователю
-            success = await MessageSender.send_media_group_from_storage(
-                user_bot, media_group_id, chat_data.user_id
-            )
+            # Показываем пользователю индикатор загрузки, пока альбом пересылается
+            async with chat_action_manager.action(
+                user_bot, chat_data.user_id, chat_action_manager.get_media_action(messages[0])
+            ):
+                # Подготавливаем медиагруппу к пересылке
+                prepared = await MessageStorage.prepare_media_group(messages, chat_data, "to_user", user_bot.id)
+                if not prepared:
+                    logger.error("Не удалось подготовить медиагруппу к пересылке")
+                    return
+                
+                try:
+                    # Отправляем медиагруппу пользователю
+                    success = await MessageSender.send_prepared_media_group(
+                        user_bot, prepared, chat_data.user_id
+                    )
+                finally:
+                    MessageStorage.release_prepared(prepared)
             
             if success:
                 # Сохраняем в БД каждое сообщение
@@ -248,8 +401,32 @@ class MediaGroupHandler:
         except Exception as e:
             logger.error(f"Ошибка при обработке медиагруппы пользователю: {e}")
     
+    async def _send_to_topic(self, main_bot, chat_data, group_id: int, topic_id: int,
+                             send: Callable[[int], Awaitable[bool]]) -> bool:
+        """
+        Отправка в тему чата с восстановлением удаленной темы
+        
+        Если оператор удалил тему, Telegram отвечает "message thread not found".
+        Тогда тема создается заново (один раз на чат, с историей последних
+        сообщений), и отправка повторяется в новую тему.
+        
+        Args:
+            send: Отправка в тему с переданным ID
+        """
+        try:
+            return await send(topic_id)
+        except TopicNotFoundError as e:
+            logger.warning(f"Тема {topic_id} чата {chat_data.id} не найдена: {e}")
+        
+        topic_id = await TopicManager.recreate_topic(main_bot, chat_data, group_id, topic_id)
+        if not topic_id:
+            logger.error(f"Не удалось создать тему заново для чата {chat_data.id}")
+            return False
+        
+        return await send(topic_id)
+    
     async def _save_to_database(self, message: Message, chat_data, from_user: bool):
-        """Сохранение сообщения в базу данных"""
+        """Сохранение сообщения в базу данных и отметка активности в чате"""
         try:
             from database.database import async_session
             from database.queries import DatabaseQueries
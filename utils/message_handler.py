@@ -1,11 +1,11 @@
 import logging
-from aiogram.types import Message, MessageEntity, BufferedInputFile
+from aiogram.types import Message, MessageEntity
 from aiogram import Bot
 from database.database import async_session
 from database.queries import DatabaseQueries
 from utils.topic_manager import TopicManager
+from utils.media_codecs import get_codec
 from config import config
-import io
 
 logger = logging.getLogger(__name__)
 
@@ -100,111 +100,44 @@ class MessageHandler:
 
     @staticmethod
     async def _forward_media_message(source_message: Message, target_bot: Bot, target_chat_id: int, message_thread_id: int):
-        """Пересылка медиа сообщения через скачивание файла"""
+        """Пересылка медиа сообщения через повторную загрузку файла"""
+        from utils.file_handler import FileHandler
+        from utils.file_id_cache import FileIdCache
+        from utils.message_storage import MessageStorage
+        from utils.text_formatter import TextFormatter
+        
         try:
-            if source_message.photo:
-                # Фото
-                file_info = await source_message.bot.get_file(source_message.photo[-1].file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
-                
-                await target_bot.send_photo(
-                    chat_id=target_chat_id,
-                    photo=BufferedInputFile(file_bytes.read(), filename="photo.jpg"),
-                    caption=source_message.caption,
-                    caption_entities=source_message.caption_entities,
-                    message_thread_id=message_thread_id
-                )
-            elif source_message.video:
-                # Видео
-                file_info = await source_message.bot.get_file(source_message.video.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
-                
-                await target_bot.send_video(
-                    chat_id=target_chat_id,
-                    video=BufferedInputFile(file_bytes.read(), filename="video.mp4"),
-                    caption=source_message.caption,
-                    caption_entities=source_message.caption_entities,
-                    message_thread_id=message_thread_id,
-                    duration=source_message.video.duration,
-                    width=source_message.video.width,
-                    height=source_message.video.height
-                )
-            elif source_message.document:
-                # Документ
-                file_info = await source_message.bot.get_file(source_message.document.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
-                
-                filename = source_message.document.file_name or "document"
-                await target_bot.send_document(
-                    chat_id=target_chat_id,
-                    document=BufferedInputFile(file_bytes.read(), filename=filename),
-                    caption=source_message.caption,
-                    caption_entities=source_message.caption_entities,
-                    message_thread_id=message_thread_id
-                )
-            elif source_message.voice:
-                # Голосовое сообщение
-                file_info = await source_message.bot.get_file(source_message.voice.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
-                
-                await target_bot.send_voice(
-                    chat_id=target_chat_id,
-                    voice=BufferedInputFile(file_bytes.read(), filename="voice.ogg"),
-                    message_thread_id=message_thread_id,
-                    duration=source_message.voice.duration
-                )
-            elif source_message.video_note:
-                # Видео-заметка (кружочек)
-                file_info = await source_message.bot.get_file(source_message.video_note.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
-                
-                await target_bot.send_video_note(
-                    chat_id=target_chat_id,
-                    video_note=BufferedInputFile(file_bytes.read(), filename="video_note.mp4"),
-                    message_thread_id=message_thread_id,
-                    duration=source_message.video_note.duration,
-                    length=source_message.video_note.length
-                )
-            elif source_message.sticker:
-                # Стикер
-                file_info = await source_message.bot.get_file(source_message.sticker.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
+            codec = get_codec(source_message)
+            if codec:
+                media = codec.get_media(source_message)
+                filename = codec.get_filename(media, str(source_message.message_id))
                 
-                await target_bot.send_sticker(
-                    chat_id=target_chat_id,
-                    sticker=BufferedInputFile(file_bytes.read(), filename="sticker.webp"),
-                    message_thread_id=message_thread_id
-                )
-            elif source_message.animation:
-                # GIF анимация
-                file_info = await source_message.bot.get_file(source_message.animation.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
+                async def send(file_source):
+                    return await FileHandler.send_media(
+                        target_bot, codec, target_chat_id, file_source,
+                        filename=filename,
+                        caption=TextFormatter.format_caption_with_entities(
+                            source_message.caption,
+                            MessageStorage.serialize_entities(source_message.caption_entities)
+                        ),
+                        message_thread_id=message_thread_id,
+                        **{field: getattr(media, field, None) for field in codec.send_fields}
+                    )
                 
-                await target_bot.send_animation(
-                    chat_id=target_chat_id,
-                    animation=BufferedInputFile(file_bytes.read(), filename="animation.gif"),
-                    caption=source_message.caption,
-                    caption_entities=source_message.caption_entities,
-                    message_thread_id=message_thread_id,
-                    duration=source_message.animation.duration,
-                    width=source_message.animation.width,
-                    height=source_message.animation.height
-                )
-            elif source_message.audio:
-                # Аудио
-                file_info = await source_message.bot.get_file(source_message.audio.file_id)
-                file_bytes = await source_message.bot.download_file(file_info.file_path)
+                # Файл, который целевой бот уже получал, отправляется по file_id без загрузки
+                sent_message = None
+                cached_file_id = await FileIdCache.get(target_bot.id, media.file_unique_id)
+                if cached_file_id:
+                    sent_message = await send(cached_file_id)
+                    if not sent_message:
+                        logger.warning(f"file_id файла {media.file_unique_id} не принят, загружаем заново")
+                        await FileIdCache.forget(target_bot.id, media.file_unique_id)
                 
-                await target_bot.send_audio(
-                    chat_id=target_chat_id,
-                    audio=BufferedInputFile(file_bytes.read(), filename="audio.mp3"),
-                    caption=source_message.caption,
-                    caption_entities=source_message.caption_entities,
-                    message_thread_id=message_thread_id,
-                    duration=source_message.audio.duration,
-                    performer=source_message.audio.performer,
-                    title=source_message.audio.title
-                )
+                if not sent_message:
+                    sent_message = await MessageHandler._upload_media(source_message.bot, codec, media, filename, send)
+                    if not sent_message:
+                        raise Exception(f"Не удалось переслать файл {media.file_id}")
+                    await FileIdCache.remember(target_bot.id, media.file_unique_id, sent_message)
             elif source_message.location:
                 # Геолокация
                 await target_bot.send_location(
@@ -253,6 +186,35 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"Ошибка при пересылке медиа: {e}")
 
+    @staticmethod
+    async def _upload_media(source_bot: Bot, codec, media, filename: str, send):
+        """
+        Загрузка файла целевым ботом
+        
+        Большие файлы и файлы локального сервера Bot API передаются потоком,
+        небольшие скачиваются целиком и занимают место в byte_budget до конца
+        отправки.
+        
+        Returns:
+            Отправленное сообщение или None
+        """
+        from utils.file_handler import FileHandler
+        
+        if codec.should_stream(media) or FileHandler.is_local(source_bot):
+            file_source = await FileHandler.stream_file(
+                source_bot, media.file_id, filename, file_size=media.file_size
+            )
+            return await send(file_source) if file_source else None
+        
+        file_bytes = await FileHandler.download_file(source_bot, media.file_id, media.file_unique_id, media.file_size)
+        if not file_bytes:
+            return None
+        
+        try:
+            return await send(file_bytes)
+        finally:
+            FileHandler.release_buffer(file_bytes)
+
     @staticmethod
     async def forward_to_user(message: Message, chat_data, user_bot: Bot):
         """Пересылка сообщения пользователю"""
@@ -312,23 +274,12 @@ class MessageHandler:
         """Определение типа сообщения"""
         if message.text:
             return 'text'
-        elif message.photo:
-            return 'photo'
-        elif message.video:
-            return 'video'
-        elif message.document:
-            return 'document'
-        elif message.voice:
-            return 'voice'
-        elif message.video_note:
-            return 'video_note'
-        elif message.sticker:
-            return 'sticker'
-        elif message.animation:
-            return 'animation'
-        elif message.audio:
-            return 'audio'
-        elif message.location:
+        
+        codec = get_codec(message)
+        if codec:
+            return codec.type
+        
+        if message.location:
             return 'location'
         elif message.contact:
             return 'contact'
@@ -360,14 +311,7 @@ class MessageHandler:
         """Проверка, содержит ли сообщение какой-либо контент"""
         return any([
             message.text,
-            message.photo,
-            message.video,
-            message.document,
-            message.voice,
-            message.video_note,
-            message.sticker,
-            message.animation,
-            message.audio,
+            get_codec(message),
             message.location,
             message.contact,
             message.poll,
@@ -0,0 +1,55 @@
+import logging
+from typing import Optional, Tuple
+from config import config
+from utils.redis_manager import redis_manager
+
+logger = logging.getLogger(__name__)
+
+
+class MessageMapping:
+    """Связь исходного сообщения с его пересланной копией
+
+    Ключ - (bot_id, chat_id, message_id) исходного сообщения, значение -
+    (bot_id, chat_id, message_id) копии. Записи лежат в Redis hash, разбитых
+    на корзины по BUCKET_SIZE сообщений: маленькие hash хранятся в компактной
+    кодировке, а TTL истекает вместе со старыми сообщениями.
+    """
+
+    BUCKET_SIZE = 100
+
+    @classmethod
+    def _key(cls, bot_id: int, chat_id: int, message_id: int) -> str:
+        return f"msgmap:{bot_id}:{chat_id}:{message_id // cls.BUCKET_SIZE}"
+
+    @classmethod
+    async def save(cls, bot_id: int, chat_id: int, message_id: int,
+                   target_bot_id: int, target_chat_id: int, target_message_id: int) -> bool:
+        """Сохранение связи исходного сообщения с копией"""
+        key = cls._key(bot_id, chat_id, message_id)
+        value = f"{target_bot_id}:{target_chat_id}:{target_message_id}"
+
+        success = await redis_manager.hset_with_expire(
+            key, {str(message_id): value}, config.MESSAGE_MAPPING_TTL
+        )
+        if success:
+            logger.debug(f"Связь {bot_id}:{chat_id}:{message_id} -> {value} сохранена")
+        return success
+
+    @classmethod
+    async def get(cls, bot_id: int, chat_id: int, message_id: int) -> Optional[Tuple[int, int, int]]:
+        """
+        Получение копии сообщения
+
+        Returns:
+            (bot_id, chat_id, message_id) копии или None
+        """
+        value = await redis_manager.hget(cls._key(bot_id, chat_id, message_id), str(message_id))
+        if not value:
+            return None
+
+        try:
+            target_bot_id, target_chat_id, target_message_id = str(value).split(':')
+            return int(target_bot_id), int(target_chat_id), int(target_message_id)
+        except ValueError:
+            logger.warning(f"Некорректная связь сообщения {message_id}: {value}")
+            return None
@@ -1,18 +1,23 @@
+import asyncio
 import logging
-import base64
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from aiogram import Bot
-from aiogram.types import MessageEntity
+from aiogram.types import Message, MessageEntity, ReplyParameters, InputFile
 from utils.message_storage import MessageStorage
+from utils.message_mapping import MessageMapping
 from utils.file_handler import FileHandler
-from utils.redis_manager import redis_manager
+from utils.blob_store import blob_store
+from utils.byte_budget import byte_budget
+from utils.media_codecs import MediaCodec, MEDIA_CODECS
+from utils.topic_manager import TopicNotFoundError
+from config import config
 
 logger = logging.getLogger(__name__)
 
 class MessageSender:
     """Класс для восстановления и отправки сообщений из Redis"""
     
-
+    ALBUM_MAX_SIZE = 10
     
     @staticmethod
     def _restore_entities(entities_data: List[Dict]) -> List[MessageEntity]:
@@ -47,20 +52,180 @@ class MessageSender:
         return entities
     
     @staticmethod
-    async def _get_file_bytes_from_redis(file_key: str) -> Optional[bytes]:
-        """Получение файла из Redis и декодирование из base64"""
-        try:
-            file_base64 = await redis_manager.get(file_key)
-            if file_base64 and isinstance(file_base64, str):
-                # Декодируем из base64
-                file_bytes = base64.b64decode(file_base64)
-                return file_bytes
-            else:
-                logger.error(f"Файл не найден в Redis по ключу {file_key}")
-                return None
-        except Exception as e:
-            logger.error(f"Ошибка при получении файла из Redis: {e}")
+    async def _get_file_source(message_data: Dict[str, Any]) -> Optional[Union[bytes, str, InputFile]]:
+        """Файл для отправки: file_id целевого бота из кэша, байты в памяти, поток от бота-источника или файл из хранилища"""
+        if message_data.get('cached_file_id'):
+            return message_data['cached_file_id']
+        
+        if message_data.get('file_bytes'):
+            return message_data['file_bytes']
+        
+        if message_data.get('local_file'):
+            return await MessageSender._local_file_from_source(message_data)
+        
+        if message_data.get('stream'):
+            return await MessageSender._stream_from_source(message_data)
+        
+        file_key = message_data.get('file_key')
+        if not file_key:
+            return None
+        return await blob_store.open(file_key, message_data.get('filename') or 'file')
+    
+    @staticmethod
+    async def _local_file_from_source(message_data: Dict[str, Any]) -> Optional[str]:
+        """Путь file:// к файлу на локальном сервере Bot API"""
+        from utils.bot_manager import bot_manager
+        
+        source_bot = bot_manager.get_bot_by_telegram_id(message_data.get('source_bot_id'))
+        if not source_bot or not message_data.get('file_id'):
+            logger.error(f"Бот-источник {message_data.get('source_bot_id')} для файла недоступен")
+            return None
+        
+        return await FileHandler.local_file_uri(source_bot, message_data['file_id'])
+    
+    @staticmethod
+    async def _stream_from_source(message_data: Dict[str, Any]) -> Optional[InputFile]:
+        """Поток файла от бота, который получил исходное сообщение"""
+        from utils.bot_manager import bot_manager
+        
+        source_bot = bot_manager.get_bot_by_telegram_id(message_data.get('source_bot_id'))
+        if not source_bot or not message_data.get('file_id'):
+            logger.error(f"Бот-источник {message_data.get('source_bot_id')} для файла недоступен")
+            return None
+        
+        return await FileHandler.stream_file(
+            source_bot, message_data['file_id'], message_data.get('filename') or 'file',
+            file_size=message_data.get('file_size')
+        )
+    
+    @staticmethod
+    def _format_caption(message_data: Dict[str, Any]) -> Optional[str]:
+        """Подпись сообщения в Markdown V2"""
+        from utils.text_formatter import TextFormatter
+        
+        return TextFormatter.format_caption_with_entities(
+            message_data.get('caption'),
+            message_data.get('caption_entities', [])
+        )
+    
+    @staticmethod
+    async def _send_file(bot: Bot, codec: MediaCodec, message_data: Dict[str, Any], target_chat_id: int,
+                         message_thread_id: Optional[int] = None,
+                         reply_to_message_id: Optional[int] = None) -> Optional[Message]:
+        """
+        Отправка файла сообщения через FileHandler
+        
+        Если закэшированный file_id или путь file:// не принимается, файл
+        передается заново потоком от бота-источника (устаревший file_id
+        удаляется из кэша). После загрузки файла file_id, выданный целевому
+        боту, сохраняется для следующих пересылок.
+        """
+        from utils.file_id_cache import FileIdCache
+        
+        async def send(file_source):
+            return await FileHandler.send_media(
+                bot, codec, target_chat_id, file_source,
+                filename=message_data.get('filename'),
+                caption=MessageSender._format_caption(message_data),
+                message_thread_id=message_thread_id,
+                reply_to_message_id=reply_to_message_id,
+                **codec.send_kwargs(message_data)
+            )
+        
+        file_source = await MessageSender._get_file_source(message_data)
+        
+        sent_message = None
+        if file_source:
+            sent_message = await send(file_source)
+        
+        if not sent_message and (message_data.get('cached_file_id') or message_data.get('local_file')):
+            logger.warning(f"Файл сообщения {message_data.get('message_id')} не принят по ссылке, загружаем заново")
+            if message_data.get('cached_file_id'):
+                await FileIdCache.forget(bot.id, message_data.get('file_unique_id'))
+            
+            file_source = await MessageSender._stream_from_source(message_data)
+            if file_source:
+                sent_message = await send(file_source)
+        
+        if not sent_message:
+            return None
+        
+        await MessageSender._after_file_sent(bot, message_data, file_source, sent_message)
+        return sent_message
+    
+    @staticmethod
+    async def _after_file_sent(bot: Bot, message_data: Dict[str, Any],
+                               file_source: Union[bytes, str, InputFile], sent_message: Message):
+        """Удаление файла из хранилища и запоминание file_id после отправки"""
+        from utils.file_id_cache import FileIdCache
+        
+        if message_data.get('file_key'):
+            # Удаляем файл из хранилища
+            await blob_store.delete(message_data['file_key'])
+        
+        if file_source != message_data.get('cached_file_id'):
+            await FileIdCache.remember(bot.id, message_data.get('file_unique_id'), sent_message)
+    
+    @staticmethod
+    async def _save_mapping(message_data: Dict[str, Any], bot: Bot, sent_message: Optional[Message]):
+        """Сохранение связи исходного сообщения с отправленной копией в обе стороны"""
+        if not sent_message or not message_data.get('source_bot_id'):
+            return
+        
+        source = (message_data['source_bot_id'], message_data['chat_id'], message_data['message_id'])
+        target = (bot.id, sent_message.chat.id, sent_message.message_id)
+        
+        await MessageMapping.save(*source, *target)
+        # Обратная связь нужна, чтобы ответы на копию приходили ответом на оригинал
+        await MessageMapping.save(*target, *source)
+    
+    @staticmethod
+    def _reply_parameters(reply_to_message_id: Optional[int]) -> Optional[ReplyParameters]:
+        """Параметры ответа для отправки сообщения"""
+        if not reply_to_message_id:
+            return None
+        return ReplyParameters(message_id=reply_to_message_id, allow_sending_without_reply=True)
+    
+    @staticmethod
+    async def _resolve_reply(message_data: Dict[str, Any], bot: Bot, target_chat_id: int) -> Optional[int]:
+        """Поиск сообщения в целевом чате, на которое нужно ответить"""
+        reply_to_message_id = message_data.get('reply_to_message_id')
+        if not reply_to_message_id or not message_data.get('source_bot_id'):
+            return None
+        
+        target = await MessageMapping.get(
+            message_data['source_bot_id'], message_data['chat_id'], reply_to_message_id
+        )
+        if not target:
             return None
+        
+        target_bot_id, reply_chat_id, reply_message_id = target
+        if target_bot_id != bot.id or reply_chat_id != target_chat_id:
+            return None
+        
+        return reply_message_id
+    
+    @staticmethod
+    async def send_prepared_message(bot: Bot, prepared: Dict[str, Any], target_chat_id: int,
+                                    message_thread_id: Optional[int] = None) -> bool:
+        """Отправка сообщения, подготовленного MessageStorage.prepare_message"""
+        if 'storage_id' in prepared:
+            return await MessageSender.send_message_from_storage(
+                bot, prepared['storage_id'], target_chat_id, message_thread_id
+            )
+        return await MessageSender.send_message_data(bot, prepared, target_chat_id, message_thread_id)
+    
+    @staticmethod
+    async def send_prepared_media_group(bot: Bot, prepared: Dict[str, Any], target_chat_id: int,
+                                        message_thread_id: Optional[int] = None) -> bool:
+        """Отправка медиагруппы, подготовленной MessageStorage.prepare_media_group"""
+        if 'storage_id' in prepared:
+            return await MessageSender.send_media_group_from_storage(
+                bot, prepared['storage_id'], target_chat_id, message_thread_id
+            )
+        return await MessageSender.send_media_group_data(
+            bot, prepared['messages'], target_chat_id, message_thread_id
+        )
     
     @staticmethod
     async def send_message_from_storage(bot: Bot, message_id: str, target_chat_id: int, 
@@ -77,14 +242,37 @@ class MessageSender:
         Returns:
             True если успешно отправлено
         """
-        try:
-            # Получаем данные сообщения
-            message_data = await MessageStorage.get_message(message_id)
-            if not message_data:
-                logger.error(f"Сообщение {message_id} не найдено в хранилище")
-                return False
+        # Получаем данные сообщения
+        message_data = await MessageStorage.get_message(message_id)
+        if not message_data:
+            logger.error(f"Сообщение {message_id} не найдено в хранилище")
+            return False
+        
+        if not await MessageSender.send_message_data(bot, message_data, target_chat_id, message_thread_id):
+            return False
+        
+        # Удаляем сообщение из хранилища после успешной отправки
+        await MessageStorage.delete_message(message_id)
+        return True
+    
+    @staticmethod
+    async def send_message_data(bot: Bot, message_data: Dict[str, Any], target_chat_id: int,
+                                message_thread_id: Optional[int] = None) -> bool:
+        """
+        Отправка сообщения по его данным
+        
+        Args:
+            bot: Бот для отправки
+            message_data: Данные сообщения (MessageStorage.build_message_data)
+            target_chat_id: ID целевого чата
+            message_thread_id: ID темы (для групп)
             
+        Returns:
+            True если успешно отправлено
+        """
+        try:
             message_type = message_data.get('type', 'unknown')
+            reply_to_message_id = await MessageSender._resolve_reply(message_data, bot, target_chat_id)
             
             # Обрабатываем разные типы сообщений
             if message_type == 'text':
@@ -98,172 +286,21 @@ class MessageSender:
                 
                 from aiogram.enums import ParseMode
                 
-                await bot.send_message(
+                sent_message = await bot.send_message(
                     chat_id=target_chat_id,
                     text=formatted_text,
                     parse_mode=ParseMode.MARKDOWN_V2,
-                    message_thread_id=message_thread_id
+                    message_thread_id=message_thread_id,
+                    reply_parameters=MessageSender._reply_parameters(reply_to_message_id)
                 )
                 
-            elif message_type == 'photo':
-                file_key = message_data.get('file_key')
-                if file_key:
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if file_bytes:
-                        from utils.text_formatter import TextFormatter
-                        
-                        # Преобразуем подпись с entities в Markdown V2
-                        formatted_caption = TextFormatter.format_caption_with_entities(
-                            message_data.get('caption'),
-                            message_data.get('caption_entities', [])
-                        )
-                        
-                        success = await FileHandler.send_photo_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'photo.jpg'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                        if success:
-                            # Удаляем файл из Redis
-                            await redis_manager.delete(file_key)
-                        else:
-                            raise Exception("Не удалось отправить фото")
-                    else:
-                        raise Exception("Не удалось получить файл фото из Redis")
-                else:
-                    raise Exception("Нет ключа файла для фото")
-                    
-            elif message_type == 'video':
-                file_key = message_data.get('file_key')
-                if file_key:
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if file_bytes:
-                        from utils.text_formatter import TextFormatter
-                        
-                        # Преобразуем подпись с entities в Markdown V2
-                        formatted_caption = TextFormatter.format_caption_with_entities(
-                            message_data.get('caption'),
-                            message_data.get('caption_entities', [])
-                        )
-                        
-                        success = await FileHandler.send_video_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'video.mp4'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            duration=message_data.get('duration'),
-                            width=message_data.get('width'),
-                            height=message_data.get('height'),
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                        if success:
-                            # Удаляем файл из Redis
-                            await redis_manager.delete(file_key)
-                        else:
-                            raise Exception("Не удалось отправить видео")
-                    else:
-                        raise Exception("Не удалось получить файл видео из Redis")
-                else:
-                    raise Exception("Нет ключа файла для видео")
-                    
-            elif message_type == 'voice':
-                file_key = message_data.get('file_key')
-                if file_key:
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if file_bytes:
-                        from utils.text_formatter import TextFormatter
-                        
-                        # Преобразуем подпись с entities в Markdown V2
-                        formatted_caption = TextFormatter.format_caption_with_entities(
-                            message_data.get('caption'),
-                            message_data.get('caption_entities', [])
-                        )
-                        
-                        success = await FileHandler.send_voice_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'voice.ogg'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            duration=message_data.get('duration'),
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                        if success:
-                            # Удаляем файл из Redis
-                            await redis_manager.delete(file_key)
-                        else:
-                            raise Exception("Не удалось отправить голосовое")
-                    else:
-                        raise Exception("Не удалось получить файл голосового из Redis")
-                else:
-                    raise Exception("Нет ключа файла для голосового")
-                    
-            elif message_type == 'video_note':
-                file_key = message_data.get('file_key')
-                if file_key:
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if file_bytes:
-                        success = await FileHandler.send_video_note_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'video_note.mp4'),
-                            message_thread_id=message_thread_id,
-                            duration=message_data.get('duration'),
-                            length=message_data.get('length')
-                        )
-                        if success:
-                            # Удаляем файл из Redis
-                            await redis_manager.delete(file_key)
-                        else:
-                            raise Exception("Не удалось отправить видеокружок")
-                    else:
-                        raise Exception("Не удалось получить файл видеокружка из Redis")
-                else:
-                    raise Exception("Нет ключа файла для видеокружка")
-                    
-            elif message_type == 'document':
-                file_key = message_data.get('file_key')
-                if file_key:
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if file_bytes:
-                        from utils.text_formatter import TextFormatter
-                        
-                        # Преобразуем подпись с entities в Markdown V2
-                        formatted_caption = TextFormatter.format_caption_with_entities(
-                            message_data.get('caption'),
-                            message_data.get('caption_entities', [])
-                        )
-                        
-                        success = await FileHandler.send_document_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'document'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                        if success:
-                            # Удаляем файл из Redis
-                            await redis_manager.delete(file_key)
-                        else:
-                            raise Exception("Не удалось отправить документ")
-                    else:
-                        raise Exception("Не удалось получить файл документа из Redis")
-                else:
-                    raise Exception("Нет ключа файла для документа")
+            elif message_type in MEDIA_CODECS:
+                sent_message = await MessageSender._send_file(
+                    bot, MEDIA_CODECS[message_type], message_data, target_chat_id,
+                    message_thread_id, reply_to_message_id
+                )
+                if not sent_message:
+                    raise Exception(f"Не удалось отправить {message_type}")
                     
             else:
                 logger.warning(f"Неподдерживаемый тип сообщения: {message_type}")
@@ -271,13 +308,14 @@ class MessageSender:
             
             logger.info(f"Сообщение типа {message_type} успешно отправлено")
             
-            # Удаляем сообщение из хранилища после успешной отправки
-            await MessageStorage.delete_message(message_id)
+            # Запоминаем, каким сообщением стал оригинал у получателя
+            await MessageSender._save_mapping(message_data, bot, sent_message)
             
             return True
             
         except Exception as e:
-            logger.error(f"Ошибка при отправке сообщения {message_id}: {e}")
+            TopicNotFoundError.check(e)
+            logger.error(f"Ошибка при отправке сообщения {message_data.get('message_id')}: {e}")
             return False
     
     @staticmethod
@@ -295,104 +333,183 @@ class MessageSender:
         Returns:
             True если успешно отправлено
         """
-        try:
-            # Получаем данные медиагруппы
-            group_data = await MessageStorage.get_media_group(media_group_id)
-            if not group_data:
-                logger.error(f"Медиагруппа {media_group_id} не найдена в хранилище")
-                return False
+        # Получаем данные медиагруппы
+        group_data = await MessageStorage.get_media_group(media_group_id)
+        if not group_data:
+            logger.error(f"Медиагруппа {media_group_id} не найдена в хранилище")
+            return False
+        
+        if not await MessageSender.send_media_group_data(
+            bot, group_data.get('messages', []), target_chat_id, message_thread_id
+        ):
+            return False
+        
+        # Удаляем медиагруппу из хранилища
+        await MessageStorage.delete_media_group(media_group_id)
+        return True
+    
+    @staticmethod
+    async def send_media_group_data(bot: Bot, messages: List[Dict[str, Any]], target_chat_id: int,
+                                    message_thread_id: Optional[int] = None) -> bool:
+        """
+        Отправка медиагруппы по данным ее сообщений
+        
+        Совместимые элементы отправляются одним send_media_group (до 10 штук),
+        отдельная отправка каждого элемента используется только как запасной путь.
+        
+        Args:
+            bot: Бот для отправки
+            messages: Данные сообщений медиагруппы
+            target_chat_id: ID целевого чата
+            message_thread_id: ID темы (для групп)
             
-            messages = group_data.get('messages', [])
+        Returns:
+            True если отправлено хотя бы одно сообщение
+        """
+        media_group_id = messages[0].get('media_group_id') if messages else None
+        
+        try:
             if not messages:
                 logger.warning(f"Медиагруппа {media_group_id} пуста")
                 return False
             
-            # Отправляем каждое сообщение медиагруппы отдельно
+            # Ответом на сообщение делаем только первый элемент
+            reply_to_message_id = await MessageSender._resolve_reply(messages[0], bot, target_chat_id)
+            
             sent_count = 0
-            for message_data in messages:
-                try:
-                    message_type = message_data.get('type')
-                    file_key = message_data.get('file_key')
-                    
-                    if not file_key:
-                        logger.warning(f"Нет ключа файла для сообщения в медиагруппе")
-                        continue
-                    
-                    file_bytes = await MessageSender._get_file_bytes_from_redis(file_key)
-                    if not file_bytes:
-                        logger.warning(f"Не удалось получить файл из Redis для медиагруппы")
-                        continue
-                    
-                    # Подпись только для первого элемента, преобразованная в Markdown V2
-                    formatted_caption = None
-                    if sent_count == 0:
-                        from utils.text_formatter import TextFormatter
-                        formatted_caption = TextFormatter.format_caption_with_entities(
-                            message_data.get('caption'),
-                            message_data.get('caption_entities', [])
-                        )
-                    
-                    success = False
-                    if message_type == 'photo':
-                        success = await FileHandler.send_photo_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'photo.jpg'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                    elif message_type == 'video':
-                        success = await FileHandler.send_video_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'video.mp4'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            duration=message_data.get('duration'),
-                            width=message_data.get('width'),
-                            height=message_data.get('height'),
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
-                        )
-                    elif message_type == 'document':
-                        success = await FileHandler.send_document_from_bytes(
-                            bot=bot,
-                            chat_id=target_chat_id,
-                            file_bytes=file_bytes,
-                            filename=message_data.get('filename', 'document'),
-                            caption=formatted_caption,
-                            caption_entities=None,  # Не передаем entities, так как уже в Markdown
-                            message_thread_id=message_thread_id,
-                            use_parse_mode=True  # Используем parse_mode для Markdown V2
+            for chunk in MessageSender._split_album(messages):
+                chunk_sent = None
+                if len(chunk) > 1:
+                    chunk_sent = await MessageSender._send_album_chunk(
+                        bot, chunk, target_chat_id, message_thread_id,
+                        reply_to_message_id if sent_count == 0 else None
+                    )
+                
+                if chunk_sent is None:
+                    # Отправляем элементы по одному
+                    chunk_sent = 0
+                    for message_data in chunk:
+                        sent_message = await MessageSender._send_album_item(
+                            bot, message_data, target_chat_id, message_thread_id,
+                            reply_to_message_id if sent_count + chunk_sent == 0 else None
                         )
-                    
-                    if success:
-                        sent_count += 1
-                        # Удаляем файл из Redis
-                        await redis_manager.delete(file_key)
-                    
-                except Exception as msg_error:
-                    logger.error(f"Ошибка отправки сообщения из медиагруппы: {msg_error}")
-                    continue
+                        if sent_message:
+                            chunk_sent += 1
+                            await MessageSender._save_mapping(message_data, bot, sent_message)
+                
+                sent_count += chunk_sent
             
             if sent_count > 0:
                 logger.info(f"Медиагруппа {media_group_id}: отправлено {sent_count} из {len(messages)} сообщений")
-                
-                # Удаляем медиагруппу из хранилища
-                await MessageStorage.delete_media_group(media_group_id)
                 return True
             else:
                 logger.error(f"Не удалось отправить ни одного сообщения из медиагруппы {media_group_id}")
                 return False
             
         except Exception as e:
+            TopicNotFoundError.check(e)
             logger.error(f"Ошибка при отправке медиагруппы {media_group_id}: {e}")
             return False
     
+    @staticmethod
+    def _split_album(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Разбиение медиагруппы на части для send_media_group
+        
+        Фото и видео можно смешивать, документы и аудио отправляются только
+        с элементами своего типа, в одной части не больше ALBUM_MAX_SIZE
+        элементов. Остальные типы идут отдельными частями из одного элемента.
+        """
+        chunks = []
+        last_kind = None
+        
+        for message_data in messages:
+            codec = MEDIA_CODECS.get(message_data.get('type'))
+            kind = codec.album if codec else None
+            
+            if (chunks and kind and kind == last_kind
+                    and len(chunks[-1]) < MessageSender.ALBUM_MAX_SIZE):
+                chunks[-1].append(message_data)
+            else:
+                chunks.append([message_data])
+            
+            last_kind = kind
+        
+        return chunks
+    
+    @staticmethod
+    async def _send_album_chunk(bot: Bot, chunk: List[Dict[str, Any]], target_chat_id: int,
+                                message_thread_id: Optional[int],
+                                reply_to_message_id: Optional[int]) -> Optional[int]:
+        """
+        Отправка части медиагруппы одним запросом
+        
+        Returns:
+            Число отправленных сообщений или None, если нужна отдельная отправка
+        """
+        from aiogram.enums import ParseMode
+        
+        # Файлы получаем параллельно, с ограничением числа одновременных загрузок
+        semaphore = asyncio.Semaphore(config.MEDIA_DOWNLOAD_CONCURRENCY)
+        
+        async def get_source(message_data: Dict[str, Any]):
+            async with semaphore:
+                return await MessageSender._get_file_source(message_data)
+        
+        file_sources = await asyncio.gather(*[get_source(message_data) for message_data in chunk])
+        if not all(file_sources):
+            logger.warning("Не все файлы медиагруппы доступны, отправляем по одному")
+            return None
+        
+        media = []
+        for message_data, file_source in zip(chunk, file_sources):
+            codec = MEDIA_CODECS[message_data['type']]
+            media.append(codec.input_media(
+                media=FileHandler._input_file(file_source, message_data.get('filename') or 'file'),
+                caption=MessageSender._format_caption(message_data),
+                parse_mode=ParseMode.MARKDOWN_V2,
+                **codec.send_kwargs(message_data)
+            ))
+        
+        try:
+            async with byte_budget.reserve(FileHandler.stream_buffer_size(*file_sources)):
+                sent_messages = await bot.send_media_group(
+                    chat_id=target_chat_id,
+                    media=media,
+                    message_thread_id=message_thread_id,
+                    reply_parameters=MessageSender._reply_parameters(reply_to_message_id)
+                )
+        except Exception as e:
+            TopicNotFoundError.check(e)
+            logger.warning(f"send_media_group не удался, отправляем по одному: {e}")
+            return None
+        
+        for message_data, file_source, sent_message in zip(chunk, file_sources, sent_messages):
+            await MessageSender._after_file_sent(bot, message_data, file_source, sent_message)
+            await MessageSender._save_mapping(message_data, bot, sent_message)
+        
+        return len(sent_messages)
+    
+    @staticmethod
+    async def _send_album_item(bot: Bot, message_data: Dict[str, Any], target_chat_id: int,
+                               message_thread_id: Optional[int],
+                               reply_to_message_id: Optional[int]) -> Optional[Message]:
+        """Отправка одного элемента медиагруппы отдельным сообщением"""
+        try:
+            codec = MEDIA_CODECS.get(message_data.get('type'))
+            if not codec:
+                logger.warning(f"Тип {message_data.get('type')} не поддерживается в медиагруппе")
+                return None
+            
+            return await MessageSender._send_file(
+                bot, codec, message_data, target_chat_id, message_thread_id, reply_to_message_id
+            )
+            
+        except Exception as e:
+            TopicNotFoundError.check(e)
+            logger.error(f"Ошибка отправки сообщения из медиагруппы: {e}")
+            return None
+    
     @staticmethod
     async def send_user_info_message(bot: Bot, chat_data, target_chat_id: int, 
                                    message_thread_id: Optional[int] = None) -> bool:
@@ -436,5 +553,68 @@ class MessageSender:
             return True
             
         except Exception as e:
+            TopicNotFoundError.check(e)
             logger.error(f"Ошибка при отправке информационного сообщения: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    @staticmethod
+    async def edit_forwarded_message(message: Message) -> bool:
+        """
+        Повторение правки сообщения в его пересланной копии
+        
+        Args:
+            message: Отредактированное исходное сообщение
+            
+        Returns:
+            True если копия обновлена
+        """
+        try:
+            target = await MessageMapping.get(message.bot.id, message.chat.id, message.message_id)
+            if not target:
+                logger.debug(f"Нет пересланной копии для сообщения {message.message_id} в чате {message.chat.id}")
+                return False
+            
+            target_bot_id, target_chat_id, target_message_id = target
+            
+            from utils.bot_manager import bot_manager
+            target_bot = bot_manager.get_bot_by_telegram_id(target_bot_id)
+            if not target_bot:
+                logger.warning(f"Бот {target_bot_id} для правки сообщения недоступен")
+                return False
+            
+            from utils.text_formatter import TextFormatter
+            from aiogram.enums import ParseMode
+            
+            if message.text:
+                formatted_text = TextFormatter.format_text_with_entities(
+                    message.text,
+                    MessageStorage.serialize_entities(message.entities)
+                )
+                await target_bot.edit_message_text(
+                    chat_id=target_chat_id,
+                    message_id=target_message_id,
+                    text=formatted_text,
+                    parse_mode=ParseMode.MARKDOWN_V2
+                )
+            elif message.caption:
+                formatted_caption = TextFormatter.format_caption_with_entities(
+                    message.caption,
+                    MessageStorage.serialize_entities(message.caption_entities)
+                )
+                await target_bot.edit_message_caption(
+                    chat_id=target_chat_id,
+                    message_id=target_message_id,
+                    caption=formatted_caption,
+                    parse_mode=ParseMode.MARKDOWN_V2
+                )
+            else:
+                # Правка без текста и подписи (например, замена файла) стерла бы подпись копии
+                logger.debug(f"Правка сообщения {message.message_id} не меняет текст или подпись, копия не изменена")
+                return False
+            
+            logger.info(f"Правка сообщения {message.message_id} перенесена в {target_chat_id}:{target_message_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка при переносе правки сообщения {message.message_id}: {e}")
+            return False
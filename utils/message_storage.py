@@ -1,10 +1,13 @@
+import asyncio
 import json
 import logging
 import uuid
-import base64
 from typing import Dict, Any, Optional, List
 from aiogram.types import Message, MessageEntity
 from utils.redis_manager import redis_manager
+from utils.blob_store import blob_store
+from utils.media_codecs import MediaCodec, get_codec
+from config import config
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +15,7 @@ class MessageStorage:
     """Класс для сохранения и восстановления сообщений через Redis"""
     
     @staticmethod
-    def _serialize_entities(entities: List[MessageEntity]) -> List[Dict]:
+    def serialize_entities(entities: List[MessageEntity]) -> List[Dict]:
         """Сериализация entities для сохранения"""
         if not entities:
             return []
@@ -44,26 +47,80 @@ class MessageStorage:
         return result
     
     @staticmethod
-    async def save_message(message: Message, chat_data, direction: str = "to_group") -> str:
+    async def _store_file(bot, message_id: str, codec: MediaCodec, media, target_bot_id: Optional[int],
+                          in_memory: bool = False) -> Optional[Dict[str, Any]]:
         """
-        Сохранение сообщения в Redis
+        Подготовка файла к пересылке
+        
+        Если целевой бот уже получал этот файл, используется его file_id без
+        скачивания. С локальным сервером Bot API файл передается по пути
+        file://. Большие файлы, если тип это допускает, не скачиваются
+        заранее: при отправке они передаются потоком от бота-источника. Остальные файлы скачиваются и
+        сохраняются в хранилище файлов, а при in_memory остаются в памяти и
+        занимают место в byte_budget до release_prepared().
+        
+        Returns:
+            {'cached_file_id': ...}, {'local_file': True}, {'stream': True},
+            {'file_key': ...} или {'file_bytes': ...}, None при ошибке
+        """
+        from utils.file_id_cache import FileIdCache
+        from utils.file_handler import FileHandler
+        
+        cached_file_id = await FileIdCache.get(target_bot_id, media.file_unique_id)
+        if cached_file_id:
+            return {'cached_file_id': cached_file_id}
+        
+        # Локальный сервер Bot API сам прочитает файл по пути file://
+        if FileHandler.is_local(bot):
+            return {'local_file': True}
+        
+        if codec.should_stream(media):
+            return {'stream': True}
+        
+        # Скачиваем файл и сохраняем в хранилище файлов
+        file_bytes = await FileHandler.download_file(bot, media.file_id, media.file_unique_id, media.file_size)
+        if not file_bytes:
+            return None
+        
+        if in_memory:
+            return {'file_bytes': file_bytes}
+        
+        try:
+            file_key = await blob_store.put(message_id, file_bytes)
+        finally:
+            FileHandler.release_buffer(file_bytes)
+        if not file_key:
+            return None
+        
+        return {'file_key': file_key}
+    
+    @staticmethod
+    async def build_message_data(message: Message, chat_data, direction: str = "to_group",
+                                 target_bot_id: Optional[int] = None, message_id: Optional[str] = None,
+                                 in_memory: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Подготовка данных сообщения для отправки
         
         Args:
             message: Объект сообщения
             chat_data: Данные чата
             direction: "to_group" или "to_user"
+            target_bot_id: Telegram ID бота-получателя (для повторного использования file_id)
+            message_id: ID сообщения в хранилище (для имени файла)
+            in_memory: Оставить скачанный файл в памяти вместо хранилища файлов
             
         Returns:
-            Уникальный ID сохраненного сообщения
+            Данные сообщения или None
         """
         try:
-            message_id = str(uuid.uuid4())
+            message_id = message_id or str(uuid.uuid4())
             
             # Базовая информация о сообщении
             message_data = {
                 'message_id': message.message_id,
                 'chat_id': message.chat.id,
                 'original_chat_id': message.chat.id,  # Для fallback
+                'source_bot_id': message.bot.id if message.bot else None,
                 'from_user_id': message.from_user.id if message.from_user else None,
                 'date': message.date.timestamp() if message.date else None,
                 'direction': direction,
@@ -73,191 +130,30 @@ class MessageStorage:
             }
             
             # Определяем тип сообщения и сохраняем соответствующие данные
+            codec = get_codec(message)
+            
             if message.text:
                 message_data.update({
                     'type': 'text',
                     'text': message.text,
-                    'entities': MessageStorage._serialize_entities(message.entities)
-                })
-                
-            elif message.photo:
-                from utils.file_handler import FileHandler
-                
-                photo = message.photo[-1]  # Берем фото наибольшего размера
-                
-                # Скачиваем файл и сохраняем в Redis
-                file_bytes = await FileHandler.download_file(message.bot, photo.file_id)
-                if file_bytes:
-                    # Кодируем в base64 для сохранения в Redis
-                    file_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                    file_key = f"file:{message_id}"
-                    await redis_manager.set(file_key, file_base64, expire=3600)
-                    
-                    message_data.update({
-                        'type': 'photo',
-                        'file_key': file_key,
-                        'file_id': photo.file_id,
-                        'file_unique_id': photo.file_unique_id,
-                        'width': photo.width,
-                        'height': photo.height,
-                        'file_size': photo.file_size,
-                        'filename': f"photo_{message_id}.jpg",
-                        'caption': message.caption,
-                        'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
-                    })
-                else:
-                    logger.error(f"Не удалось скачать фото {photo.file_id}")
-                    return None
-                
-            elif message.video:
-                from utils.file_handler import FileHandler
-                
-                # Скачиваем файл и сохраняем в Redis
-                file_bytes = await FileHandler.download_file(message.bot, message.video.file_id)
-                if file_bytes:
-                    # Кодируем в base64 для сохранения в Redis
-                    file_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                    file_key = f"file:{message_id}"
-                    await redis_manager.set(file_key, file_base64, expire=3600)
-                    
-                    message_data.update({
-                        'type': 'video',
-                        'file_key': file_key,
-                        'file_id': message.video.file_id,
-                        'file_unique_id': message.video.file_unique_id,
-                        'width': message.video.width,
-                        'height': message.video.height,
-                        'duration': message.video.duration,
-                        'file_size': message.video.file_size,
-                        'filename': message.video.file_name or f"video_{message_id}.mp4",
-                        'mime_type': message.video.mime_type,
-                        'caption': message.caption,
-                        'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
-                    })
-                else:
-                    logger.error(f"Не удалось скачать видео {message.video.file_id}")
-                    return None
-                
-            elif message.voice:
-                from utils.file_handler import FileHandler
-                
-                # Скачиваем файл и сохраняем в Redis
-                file_bytes = await FileHandler.download_file(message.bot, message.voice.file_id)
-                if file_bytes:
-                    # Кодируем в base64 для сохранения в Redis
-                    file_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                    file_key = f"file:{message_id}"
-                    await redis_manager.set(file_key, file_base64, expire=3600)
-                    
-                    message_data.update({
-                        'type': 'voice',
-                        'file_key': file_key,
-                        'file_id': message.voice.file_id,
-                        'file_unique_id': message.voice.file_unique_id,
-                        'duration': message.voice.duration,
-                        'file_size': message.voice.file_size,
-                        'filename': f"voice_{message_id}.ogg",
-                        'mime_type': message.voice.mime_type,
-                        'caption': message.caption,
-                        'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
-                    })
-                else:
-                    logger.error(f"Не удалось скачать голосовое {message.voice.file_id}")
-                    return None
-                
-            elif message.video_note:
-                from utils.file_handler import FileHandler
-                
-                # Скачиваем файл и сохраняем в Redis
-                file_bytes = await FileHandler.download_file(message.bot, message.video_note.file_id)
-                if file_bytes:
-                    # Кодируем в base64 для сохранения в Redis
-                    file_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                    file_key = f"file:{message_id}"
-                    await redis_manager.set(file_key, file_base64, expire=3600)
-                    
-                    message_data.update({
-                        'type': 'video_note',
-                        'file_key': file_key,
-                        'file_id': message.video_note.file_id,
-                        'file_unique_id': message.video_note.file_unique_id,
-                        'length': message.video_note.length,
-                        'duration': message.video_note.duration,
-                        'filename': f"video_note_{message_id}.mp4",
-                        'file_size': message.video_note.file_size
-                    })
-                else:
-                    logger.error(f"Не удалось скачать видеокружок {message.video_note.file_id}")
-                    return None
-                
-            elif message.audio:
-                message_data.update({
-                    'type': 'audio',
-                    'file_id': message.audio.file_id,
-                    'file_unique_id': message.audio.file_unique_id,
-                    'duration': message.audio.duration,
-                    'performer': message.audio.performer,
-                    'title': message.audio.title,
-                    'file_name': message.audio.file_name,
-                    'mime_type': message.audio.mime_type,
-                    'file_size': message.audio.file_size,
-                    'caption': message.caption,
-                    'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
+                    'entities': MessageStorage.serialize_entities(message.entities)
                 })
                 
-            elif message.document:
-                from utils.file_handler import FileHandler
+            elif codec:
+                media = codec.get_media(message)
                 
-                # Скачиваем файл и сохраняем в Redis
-                file_bytes = await FileHandler.download_file(message.bot, message.document.file_id)
-                if file_bytes:
-                    # Кодируем в base64 для сохранения в Redis
-                    file_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                    file_key = f"file:{message_id}"
-                    await redis_manager.set(file_key, file_base64, expire=3600)
-                    
-                    message_data.update({
-                        'type': 'document',
-                        'file_key': file_key,
-                        'file_id': message.document.file_id,
-                        'file_unique_id': message.document.file_unique_id,
-                        'filename': message.document.file_name or f"document_{message_id}",
-                        'mime_type': message.document.mime_type,
-                        'file_size': message.document.file_size,
-                        'caption': message.caption,
-                        'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
-                    })
-                else:
-                    logger.error(f"Не удалось скачать документ {message.document.file_id}")
+                file_source = await MessageStorage._store_file(
+                    message.bot, message_id, codec, media, target_bot_id, in_memory
+                )
+                if not file_source:
+                    logger.error(f"Не удалось скачать {codec.type} {media.file_id}")
                     return None
                 
-            elif message.sticker:
                 message_data.update({
-                    'type': 'sticker',
-                    'file_id': message.sticker.file_id,
-                    'file_unique_id': message.sticker.file_unique_id,
-                    'width': message.sticker.width,
-                    'height': message.sticker.height,
-                    'is_animated': message.sticker.is_animated,
-                    'is_video': message.sticker.is_video,
-                    'emoji': message.sticker.emoji,
-                    'set_name': message.sticker.set_name,
-                    'file_size': message.sticker.file_size
-                })
-                
-            elif message.animation:
-                message_data.update({
-                    'type': 'animation',
-                    'file_id': message.animation.file_id,
-                    'file_unique_id': message.animation.file_unique_id,
-                    'width': message.animation.width,
-                    'height': message.animation.height,
-                    'duration': message.animation.duration,
-                    'file_name': message.animation.file_name,
-                    'mime_type': message.animation.mime_type,
-                    'file_size': message.animation.file_size,
+                    **codec.describe(media, message_id),
+                    **file_source,
                     'caption': message.caption,
-                    'caption_entities': MessageStorage._serialize_entities(message.caption_entities)
+                    'caption_entities': MessageStorage.serialize_entities(message.caption_entities)
                 })
                 
             elif message.location:
@@ -315,24 +211,109 @@ class MessageStorage:
                     'content_type': str(message.content_type) if hasattr(message, 'content_type') else 'unknown'
                 })
             
+            # Сохраняем ответ на сообщение (служебное сообщение создания темы ответом не считается)
+            reply = message.reply_to_message
+            if reply and not reply.forum_topic_created:
+                message_data['reply_to_message_id'] = reply.message_id
+            
             # Сохраняем медиагруппу если есть
             if message.media_group_id:
                 message_data['media_group_id'] = message.media_group_id
             
-            # Сохраняем в Redis с TTL 1 час
-            key = f"message:{message_id}"
-            success = await redis_manager.set(key, message_data, expire=3600)
-            
-            if success:
-                logger.info(f"Сообщение {message_data['type']} сохранено в Redis с ID {message_id}")
-                return message_id
-            else:
-                logger.error(f"Не удалось сохранить сообщение в Redis")
-                return None
+            return message_data
                 
         except Exception as e:
-            logger.error(f"Ошибка при сохранении сообщения: {e}")
+            logger.error(f"Ошибка при подготовке сообщения: {e}")
+            return None
+    
+    @staticmethod
+    async def save_message(message: Message, chat_data, direction: str = "to_group",
+                           target_bot_id: Optional[int] = None) -> str:
+        """
+        Сохранение сообщения в Redis
+        
+        Args:
+            message: Объект сообщения
+            chat_data: Данные чата
+            direction: "to_group" или "to_user"
+            target_bot_id: Telegram ID бота-получателя (для повторного использования file_id)
+            
+        Returns:
+            Уникальный ID сохраненного сообщения
+        """
+        message_id = str(uuid.uuid4())
+        
+        message_data = await MessageStorage.build_message_data(
+            message, chat_data, direction, target_bot_id, message_id
+        )
+        if not message_data:
             return None
+        
+        # Сохраняем в Redis с TTL 1 час
+        key = f"message:{message_id}"
+        success = await redis_manager.set(key, message_data, expire=3600)
+        
+        if success:
+            logger.info(f"Сообщение {message_data['type']} сохранено в Redis с ID {message_id}")
+            return message_id
+        else:
+            logger.error(f"Не удалось сохранить сообщение в Redis")
+            return None
+    
+    @staticmethod
+    async def prepare_message(message: Message, chat_data, direction: str = "to_group",
+                              target_bot_id: Optional[int] = None, direct: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Подготовка сообщения к пересылке
+        
+        Сообщение, которое отправляется сразу в этом же процессе (direct),
+        передается отправителю в памяти вместе с файлом. Для отложенной или
+        повторяемой отправки сообщение сохраняется в Redis, а файл - в
+        хранилище файлов, и отправитель читает их оттуда.
+        
+        Returns:
+            Данные сообщения, {'storage_id': ...} или None
+        """
+        if direct:
+            return await MessageStorage.build_message_data(
+                message, chat_data, direction, target_bot_id, in_memory=True
+            )
+        
+        message_id = await MessageStorage.save_message(message, chat_data, direction, target_bot_id)
+        return {'storage_id': message_id} if message_id else None
+    
+    @staticmethod
+    async def prepare_media_group(messages: List[Message], chat_data, direction: str = "to_group",
+                                  target_bot_id: Optional[int] = None, direct: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Подготовка медиагруппы к пересылке
+        
+        По умолчанию альбом сохраняется в хранилище: его файлы не держатся в
+        памяти все сразу, пока отправляются части альбома.
+        
+        Returns:
+            {'messages': [...]} при direct, {'storage_id': ...} или None
+        """
+        if direct:
+            results = await MessageStorage._gather_bounded([
+                MessageStorage.build_message_data(message, chat_data, direction, target_bot_id, in_memory=True)
+                for message in messages
+            ])
+            prepared = [message_data for message_data in results if message_data]
+            return {'messages': prepared} if prepared else None
+        
+        message_ids = await MessageStorage.save_media_group(messages, chat_data, direction, target_bot_id)
+        return {'storage_id': messages[0].media_group_id} if message_ids else None
+    
+    @staticmethod
+    def release_prepared(prepared: Optional[Dict[str, Any]]):
+        """Освобождение места в byte_budget, занятого файлами подготовленного сообщения в памяти"""
+        from utils.file_handler import FileHandler
+        
+        if not prepared:
+            return
+        for message_data in prepared.get('messages', [prepared]):
+            FileHandler.release_buffer(message_data.get('file_bytes'))
     
     @staticmethod
     async def get_message(message_id: str) -> Optional[Dict[str, Any]]:
@@ -369,14 +350,14 @@ class MessageStorage:
             return False
     
     @staticmethod
-    async def save_media_group(messages: List[Message], chat_data, direction: str = "to_group") -> List[str]:
+    async def save_media_group(messages: List[Message], chat_data, direction: str = "to_group",
+                               target_bot_id: Optional[int] = None) -> List[str]:
         """Сохранение медиагруппы в Redis"""
-        message_ids = []
-        
-        for message in messages:
-            message_id = await MessageStorage.save_message(message, chat_data, direction)
-            if message_id:
-                message_ids.append(message_id)
+        results = await MessageStorage._gather_bounded([
+            MessageStorage.save_message(message, chat_data, direction, target_bot_id)
+            for message in messages
+        ])
+        message_ids = [message_id for message_id in results if message_id]
         
         # Сохраняем информацию о медиагруппе
         if message_ids and messages[0].media_group_id:
@@ -393,6 +374,17 @@ class MessageStorage:
         
         return message_ids
     
+    @staticmethod
+    async def _gather_bounded(coroutines: List) -> List[Any]:
+        """Параллельное выполнение скачиваний с ограничением MEDIA_DOWNLOAD_CONCURRENCY, порядок сохраняется"""
+        semaphore = asyncio.Semaphore(config.MEDIA_DOWNLOAD_CONCURRENCY)
+        
+        async def run(coroutine):
+            async with semaphore:
+                return await coroutine
+        
+        return await asyncio.gather(*[run(coroutine) for coroutine in coroutines])
+    
     @staticmethod
     async def get_media_group(media_group_id: str) -> Optional[Dict[str, Any]]:
         """Получение медиагруппы из Redis"""
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Полосы приоритета исходящих запросов (меньше - важнее)"""
+    CONTROL = 0  # Команды операторов (/ban, /end, /hold ...)
+    TEXT = 1     # Короткие текстовые ответы
+    MEDIA = 2    # Загрузка медиа и альбомов
+    BULK = 3     # Массовые рассылки
+
+
+# Полосы долгих запросов: загрузка файла держит слот на все время передачи
+HEAVY_LANES = (Priority.MEDIA, Priority.BULK)
+
+
+# Приоритет, заданный обработчиком для всех запросов внутри текущей задачи
+current_priority: ContextVar[Optional[Priority]] = ContextVar('current_priority', default=None)
+
+
+class PriorityScheduler:
+    """Планировщик исходящих запросов бота с приоритетными полосами
+
+    Ограничивает число одновременных запросов и общий темп (запросов в секунду).
+    Свободный слот получает самая приоритетная полоса, но полоса, пропущенная
+    starvation_limit раз подряд, обслуживается вне очереди. Медиа и рассылки
+    занимают не больше max_concurrent - reserved_slots слотов, чтобы загрузки
+    файлов не держали все слоты, нужные командам и текстовым ответам.
+    """
+
+    def __init__(self, rate_per_second: float = None, max_concurrent: int = None,
+                 starvation_limit: int = None, reserved_slots: int = None):
+        rate_per_second = rate_per_second if rate_per_second is not None else config.OUTBOUND_RATE_PER_SECOND
+        self._interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._max_concurrent = max_concurrent or config.OUTBOUND_MAX_CONCURRENT
+        self._starvation_limit = starvation_limit or config.OUTBOUND_STARVATION_LIMIT
+        reserved_slots = reserved_slots if reserved_slots is not None else config.OUTBOUND_RESERVED_SLOTS
+        self._heavy_limit = max(1, self._max_concurrent - reserved_slots)
+
+        self._lanes: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        self._skipped: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._active = 0
+        self._heavy_active = 0
+        self._next_slot = 0.0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """Контекстный менеджер для выполнения запроса в полосе priority"""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: Priority):
+        """Ожидание слота для запроса"""
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(future)
+        self._dispatch()
+
+        try:
+            delay = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже был выдан - возвращаем его
+                self.release(priority)
+            else:
+                try:
+                    self._lanes[priority].remove(future)
+                except ValueError:
+                    pass
+            raise
+
+        # Соблюдаем общий темп запросов бота
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release(priority)
+                raise
+
+    def release(self, priority: Priority):
+        """Освобождение слота полосы priority"""
+        self._active -= 1
+        if priority in HEAVY_LANES:
+            self._heavy_active -= 1
+        self._dispatch()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Текущее состояние очередей"""
+        stats = {p.name.lower(): len(self._lanes[p]) for p in Priority}
+        stats['active'] = self._active
+        stats['heavy_active'] = self._heavy_active
+        return stats
+
+    def _dispatch(self):
+        """Выдача свободных слотов ожидающим запросам"""
+        while self._active < self._max_concurrent:
+            # Отмененные запросы не должны влиять на выбор полосы и счетчики пропусков
+            for queue in self._lanes.values():
+                while queue and queue[0].done():
+                    queue.popleft()
+
+            lane = self._pick_lane()
+            if lane is None:
+                return
+
+            future = self._lanes[lane].popleft()
+            now = time.monotonic()
+            slot_time = max(now, self._next_slot)
+            self._next_slot = slot_time + self._interval
+            self._active += 1
+            if lane in HEAVY_LANES:
+                self._heavy_active += 1
+            future.set_result(slot_time - now)
+
+    def _pick_lane(self) -> Optional[Priority]:
+        """Выбор полосы для следующего слота (медиа и рассылки - только в пределах своей доли)"""
+        heavy_full = self._heavy_active >= self._heavy_limit
+        waiting = [p for p in Priority if self._lanes[p] and not (heavy_full and p in HEAVY_LANES)]
+        if not waiting:
+            return None
+
+        chosen = waiting[0]
+        for lane in waiting[1:]:
+            if self._skipped[lane] >= self._starvation_limit:
+                logger.debug(f"Полоса {lane.name} обслуживается вне очереди после {self._skipped[lane]} пропусков")
+                chosen = lane
+                break
+
+        for lane in Priority:
+            if lane == chosen or lane not in waiting:
+                self._skipped[lane] = 0
+            else:
+                self._skipped[lane] += 1
+
+        return chosen
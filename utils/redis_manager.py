@@ -1,14 +1,44 @@
 import json
 import logging
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Set
 import redis.asyncio as redis
 from config import config
 
 logger = logging.getLogger(__name__)
 
 class RedisManager:
+    # Удаление блокировки, только если ее держит владелец токена
+    RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    # Продление блокировки, только если ее держит владелец токена
+    REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+    # Удаление участников, оценка которых не обновилась после max_score
+    ZREM_BY_SCORE_SCRIPT = """
+local removed = 0
+for i = 2, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= tonumber(ARGV[1]) then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        # Отдельный клиент без декодирования ответов для бинарных данных
+        self.binary: Optional[redis.Redis] = None
         self.connected = False
 
     async def connect(self):
@@ -20,6 +50,8 @@ class RedisManager:
                 decode_responses=True
             )
             
+            self.binary = redis.from_url(config.REDIS_URL, decode_responses=False)
+            
             # Проверяем соединение
             await self.redis.ping()
             self.connected = True
@@ -29,11 +61,14 @@ class RedisManager:
             logger.error(f"Ошибка подключения к Redis: {e}")
             self.connected = False
             self.redis = None
+            self.binary = None
 
     async def disconnect(self):
         """Отключение от Redis"""
         if self.redis:
             await self.redis.close()
+            if self.binary:
+                await self.binary.close()
             self.connected = False
             logger.info("Отключились от Redis")
 
@@ -89,6 +124,32 @@ class RedisManager:
             logger.error(f"Ошибка удаления из Redis: {e}")
             return False
 
+    async def set_bytes(self, key: str, value: bytes, expire: Optional[int] = None) -> bool:
+        """Установка бинарного значения без кодирования"""
+        if not self.connected or not self.binary:
+            logger.warning("Redis не подключен")
+            return False
+        
+        try:
+            await self.binary.set(key, value, ex=expire)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка записи в Redis: {e}")
+            return False
+
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        """Получение бинарного значения"""
+        if not self.connected or not self.binary:
+            logger.warning("Redis не подключен")
+            return None
+        
+        try:
+            return await self.binary.get(key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis: {e}")
+            return None
+
     async def exists(self, key: str) -> bool:
         """Проверка существования ключа"""
         if not self.connected or not self.redis:
@@ -132,6 +193,25 @@ class RedisManager:
             logger.error(f"Ошибка записи hash в Redis: {e}")
             return False
 
+    async def hset_with_expire(self, name: str, mapping: Dict[str, Any], seconds: int) -> bool:
+        """Установка hash значений и TTL за один запрос"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            str_mapping = {k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else str(v)
+                           for k, v in mapping.items()}
+            
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(name, mapping=str_mapping)
+                pipe.expire(name, seconds)
+                await pipe.execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка записи hash с TTL в Redis: {e}")
+            return False
+
     async def hget(self, name: str, key: str) -> Optional[Any]:
         """Получение значения из hash"""
         if not self.connected or not self.redis:
@@ -185,6 +265,220 @@ class RedisManager:
             logger.error(f"Ошибка удаления hash ключей: {e}")
             return False
 
+    async def sadd(self, name: str, *values: str) -> bool:
+        """Добавление элементов в множество"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            await self.redis.sadd(name, *values)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка добавления в множество Redis: {e}")
+            return False
+
+    async def srem(self, name: str, *values: str) -> bool:
+        """Удаление элементов из множества"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            result = await self.redis.srem(name, *values)
+            return result > 0
+        except Exception as e:
+            logger.error(f"Ошибка удаления из множества Redis: {e}")
+            return False
+
+    async def smembers(self, name: str) -> Set[str]:
+        """Получение всех элементов множества"""
+        if not self.connected or not self.redis:
+            return set()
+        
+        try:
+            return await self.redis.smembers(name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения множества из Redis: {e}")
+            return set()
+
+    async def set_nx(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """Установка значения, только если ключа еще нет"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            return bool(await self.redis.set(key, value, ex=expire, nx=True))
+        except Exception as e:
+            logger.error(f"Ошибка записи в Redis: {e}")
+            return False
+
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Снятие блокировки, поставленной set_nx с этим токеном (чужую блокировку не трогает)"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            return bool(await self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, key, token))
+        except Exception as e:
+            logger.error(f"Ошибка снятия блокировки в Redis: {e}")
+            return False
+
+    async def refresh_lock(self, key: str, token: str, seconds: int) -> bool:
+        """Продление блокировки с этим токеном (False, если она истекла или принадлежит другому)"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            return bool(await self.redis.eval(self.REFRESH_LOCK_SCRIPT, 1, key, token, seconds))
+        except Exception as e:
+            logger.error(f"Ошибка продления блокировки в Redis: {e}")
+            return False
+
+    async def rename(self, src: str, dst: str) -> bool:
+        """Атомарное переименование ключа (False, если ключа нет)"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            return bool(await self.redis.rename(src, dst))
+        except redis.ResponseError:
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка переименования ключа в Redis: {e}")
+            return False
+
+    async def getdel(self, key: str) -> Optional[Any]:
+        """Атомарное получение и удаление значения"""
+        if not self.connected or not self.redis:
+            return None
+        
+        try:
+            value = await self.redis.getdel(key)
+            if value is None:
+                return None
+            
+            try:
+                return json.loads(value)
+            except (json.JSONDecodeError, TypeError):
+                return value
+                
+        except Exception as e:
+            logger.error(f"Ошибка чтения из Redis: {e}")
+            return None
+
+    async def rpush_with_expire(self, name: str, value: str, seconds: int) -> int:
+        """Добавление в конец списка и установка TTL, возвращает длину списка"""
+        if not self.connected or not self.redis:
+            return 0
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.rpush(name, value)
+                pipe.expire(name, seconds)
+                length, _ = await pipe.execute()
+            return length
+            
+        except Exception as e:
+            logger.error(f"Ошибка записи списка в Redis: {e}")
+            return 0
+
+    async def rpush(self, name: str, *values: str) -> int:
+        """Добавление в конец списка, возвращает длину списка"""
+        if not self.connected or not self.redis:
+            return 0
+        
+        try:
+            return await self.redis.rpush(name, *values)
+        except Exception as e:
+            logger.error(f"Ошибка записи списка в Redis: {e}")
+            return 0
+
+    async def lpop(self, name: str) -> Optional[str]:
+        """Извлечение первого элемента списка без разбора JSON"""
+        if not self.connected or not self.redis:
+            return None
+        
+        try:
+            return await self.redis.lpop(name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения списка из Redis: {e}")
+            return None
+
+    async def llen(self, name: str) -> int:
+        """Длина списка"""
+        if not self.connected or not self.redis:
+            return 0
+        
+        try:
+            return await self.redis.llen(name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения списка из Redis: {e}")
+            return 0
+
+    async def lrange(self, name: str, start: int = 0, end: int = -1) -> List[str]:
+        """Получение элементов списка без разбора JSON"""
+        if not self.connected or not self.redis:
+            return []
+        
+        try:
+            return await self.redis.lrange(name, start, end)
+        except Exception as e:
+            logger.error(f"Ошибка чтения списка из Redis: {e}")
+            return []
+
+    async def zadd(self, name: str, mapping: Dict[str, float]) -> bool:
+        """Добавление в сортированное множество (оценка существующих участников заменяется)"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            await self.redis.zadd(name, mapping)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи сортированного множества в Redis: {e}")
+            return False
+
+    async def zrange_by_score(self, name: str, max_score: float, limit: int, offset: int = 0) -> List[str]:
+        """До limit участников с оценкой не больше max_score, начиная с offset"""
+        if not self.connected or not self.redis:
+            return []
+        
+        try:
+            return await self.redis.zrangebyscore(name, '-inf', max_score, start=offset, num=limit)
+        except Exception as e:
+            logger.error(f"Ошибка чтения сортированного множества из Redis: {e}")
+            return []
+
+    async def zrem_by_score(self, name: str, members: List[str], max_score: float) -> int:
+        """Удаление участников, если их оценка все еще не больше max_score"""
+        if not self.connected or not self.redis or not members:
+            return 0
+        
+        try:
+            return int(await self.redis.eval(self.ZREM_BY_SCORE_SCRIPT, 1, name, max_score, *members))
+        except Exception as e:
+            logger.error(f"Ошибка удаления из сортированного множества в Redis: {e}")
+            return 0
+
+    async def publish(self, channel: str, message: Any) -> bool:
+        """Публикация сообщения в канал"""
+        if not self.connected or not self.redis:
+            return False
+        
+        try:
+            if isinstance(message, (dict, list)):
+                message = json.dumps(message, ensure_ascii=False)
+            await self.redis.publish(channel, message)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка публикации в Redis: {e}")
+            return False
+
+    def pubsub(self):
+        """Подписка на каналы (None, если Redis не подключен)"""
+        if not self.connected or not self.redis:
+            return None
+        return self.redis.pubsub()
+
     # Методы для кеширования данных бота
     async def cache_bot_data(self, bot_id: int, data: Dict[str, Any], expire: int = 3600):
         """Кеширование данных бота"""
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class StatsReporter:
+    """Периодическая запись метрик в лог
+
+    Раз в STATS_LOG_INTERVAL записываются очереди планировщиков исходящих
+    запросов каждого бота, занятость лимита памяти пересылок и доля
+    попаданий в кэши тем и медиа.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Текущие метрики по источникам"""
+        from middlewares.priority import PriorityRequestMiddleware
+        from utils.bot_manager import bot_manager
+        from utils.byte_budget import byte_budget
+        from utils.media_cache import media_cache
+        from utils.topic_manager import TopicManager
+
+        stats = {
+            'byte_budget': byte_budget.get_stats(),
+            'media_cache': media_cache.get_stats(),
+            'topic_cache': TopicManager.get_cache_stats()
+        }
+
+        for bot_id, bot in bot_manager.connected_bots.items():
+            for middleware in bot.session.middleware:
+                if isinstance(middleware, PriorityRequestMiddleware):
+                    stats[f'scheduler:{bot_id}'] = middleware.scheduler.get_stats()
+
+        return stats
+
+    def log(self):
+        """Запись метрик в лог, по строке на источник"""
+        for name, values in self.collect().items():
+            formatted = ", ".join(
+                f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in values.items()
+            )
+            logger.info(f"Метрики {name}: {formatted}")
+
+    def start(self):
+        """Запуск периодической записи (STATS_LOG_INTERVAL=0 - выключена)"""
+        if config.STATS_LOG_INTERVAL <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(config.STATS_LOG_INTERVAL)
+            try:
+                self.log()
+            except Exception as e:
+                logger.error(f"Ошибка при сборе метрик: {e}")
+
+
+# Глобальный экземпляр записи метрик
+stats_reporter = StatsReporter()
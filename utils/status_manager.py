@@ -2,10 +2,12 @@ from database.database import async_session
 from database.queries import DatabaseQueries
 from database.models import Chat
 from utils.topic_manager import TopicManager
+from utils.topic_router import topic_router
 from config import config
 from sqlalchemy.orm import selectinload
 from sqlalchemy import select
 import logging
+from typing import List
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +36,7 @@ class StatusManager:
             
 
             await db.update_chat_status(chat_id, new_status)
+            await topic_router.invalidate([chat_id])
             
 
             chat_data.status = new_status
@@ -49,6 +52,58 @@ class StatusManager:
                 except Exception as e:
                     logger.error(f"Ошибка при обновлении названия темы: {e}")
 
+    @staticmethod
+    async def end_idle_chats(idle_seconds: int, bot_id: int = None, group_id: int = None,
+                             chat_ids: List[int] = None, group_bot=None,
+                             include_hold: bool = False) -> int:
+        """
+        Завершение всех диалогов бота или группы без сообщений дольше idle_seconds
+        
+        Статусы меняются одним запросом (можно ограничить списком chat_ids),
+        названия тем завершенных диалогов ставятся в очередь переименований пачкой.
+        Диалоги на удержании завершаются только с include_hold=True.
+        
+        Returns:
+            Число завершенных диалогов
+        """
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            chats = await db.end_idle_chats(
+                idle_seconds, bot_id=bot_id, group_id=group_id, chat_ids=chat_ids,
+                include_hold=include_hold
+            )
+        
+        logger.info(f"Завершено диалогов без активности: {len(chats)} (бот {bot_id}, группа {group_id})")
+        await topic_router.invalidate(chat.id for chat in chats)
+        
+        if group_bot and chats:
+            try:
+                await TopicManager.rename_topics(group_bot, chats)
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении названий тем: {e}")
+        
+        return len(chats)
+    
+    @staticmethod
+    def parse_idle_period(text: str) -> int:
+        """
+        Длительность простоя в секундах: 30m, 12h, 2d (число без единицы - часы)
+        
+        Raises:
+            ValueError: Длительность не распознана
+        """
+        units = {'m': 60, 'h': 3600, 'd': 86400}
+        text = text.strip().lower()
+        unit = units['h']
+        if text and text[-1] in units:
+            unit = units[text[-1]]
+            text = text[:-1]
+        
+        value = int(text)
+        if value <= 0:
+            raise ValueError("Длительность должна быть положительной")
+        return value * unit
+
     @staticmethod
     def get_status_emoji(status: str) -> str:
         """Получение эмодзи для статуса"""
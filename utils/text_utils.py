@@ -168,6 +168,30 @@ Press the button below to choose a group ⬇️"""
         "bot_deleted": {
             "ru": f"🗑️ {bold('Бот удален')}",
             "en": f"🗑️ {bold('Bot deleted')}"
+        },
+        "broadcast_prompt": {
+            "ru": f"📢 {bold('Отправьте сообщение для рассылки')}\n\nПоддерживаются текст, фото, видео, документы и GIF\\.",
+            "en": f"📢 {bold('Send the message to broadcast')}\n\nText, photos, videos, documents and GIFs are supported\\."
+        },
+        "broadcast_started": {
+            "ru": f"📢 {bold('Рассылка запущена')}\nID\\: {code('{job_id}')}\n\nОтчет придет по завершении\\.",
+            "en": f"📢 {bold('Broadcast started')}\nID\\: {code('{job_id}')}\n\nYou will get a report when it finishes\\."
+        },
+        "broadcast_unsupported": {
+            "ru": f"❌ {bold('Этот тип сообщения нельзя разослать')}",
+            "en": f"❌ {bold('This message type cannot be broadcast')}"
+        },
+        "broadcast_finished": {
+            "ru": f"""📢 {bold('Рассылка завершена')} {code('{job_id}')}
+
+✅ Доставлено\\: {{delivered}}
+🚫 Заблокировали бота\\: {{blocked}}
+❌ Ошибки\\: {{failed}}""",
+            "en": f"""📢 {bold('Broadcast finished')} {code('{job_id}')}
+
+✅ Delivered\\: {{delivered}}
+🚫 Blocked the bot\\: {{blocked}}
+❌ Failed\\: {{failed}}"""
         }
     }
     
@@ -0,0 +1,102 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TopicCache:
+    """Кэш информации о темах с ограничением размера
+
+    В памяти хранится не больше TOPIC_CACHE_MAX_SIZE записей: при
+    переполнении удаляются давно не использованные, записи старше
+    TOPIC_CACHE_TTL считаются устаревшими. Если включен TOPIC_CACHE_REDIS,
+    записи дублируются в Redis, и другие процессы (или этот же после
+    перезапуска) берут их оттуда при промахе в памяти.
+    """
+
+    def __init__(self, max_size: int = None, ttl: int = None, use_redis: bool = None):
+        self.max_size = max_size or config.TOPIC_CACHE_MAX_SIZE
+        self.ttl = ttl or config.TOPIC_CACHE_TTL
+        self.use_redis = config.TOPIC_CACHE_REDIS if use_redis is None else use_redis
+        # {chat_id: (время устаревания, информация о теме)}, последние использованные в конце
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(chat_id: int) -> str:
+        return f"topic_info:{chat_id}"
+
+    def get_local(self, chat_id: int) -> Optional[Dict]:
+        """Запись из памяти без обращения к Redis"""
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return None
+
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del self._entries[chat_id]
+            return None
+
+        self._entries.move_to_end(chat_id)
+        return info
+
+    async def get(self, chat_id: int) -> Optional[Dict]:
+        """Информация о теме чата или None"""
+        info = self.get_local(chat_id)
+        if info is not None:
+            self.hits += 1
+            return info
+
+        if self.use_redis:
+            info = await redis_manager.get(self._key(chat_id))
+            if isinstance(info, dict):
+                self.redis_hits += 1
+                self._store(chat_id, info)
+                return info
+
+        self.misses += 1
+        return None
+
+    async def set(self, chat_id: int, info: Dict):
+        """Сохранение информации о теме"""
+        self._store(chat_id, info)
+        if self.use_redis:
+            await redis_manager.set(self._key(chat_id), info, expire=self.ttl)
+
+    def _store(self, chat_id: int, info: Dict):
+        self._entries[chat_id] = (time.monotonic() + self.ttl, info)
+        self._entries.move_to_end(chat_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, chat_id: int):
+        """Удаление записи чата"""
+        self._entries.pop(chat_id, None)
+        if self.use_redis:
+            await redis_manager.delete(self._key(chat_id))
+
+    def clear(self):
+        """Очистка памяти (записи в Redis устаревают по TTL)"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Метрики кэша"""
+        requests = self.hits + self.redis_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.redis_hits) / requests if requests else 0.0,
+            'evictions': self.evictions
+        }
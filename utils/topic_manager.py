@@ -1,31 +1,68 @@
 
 import asyncio
 import logging
-from typing import Dict, Optional
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from database.database import async_session
 from database.queries import DatabaseQueries
+from utils.topic_cache import TopicCache
+from utils.topic_pool import topic_pool
+from utils.topic_renamer import topic_renamer
+from utils.topic_router import topic_router
 from config import config
 
 logger = logging.getLogger(__name__)
 
+
+class TopicNotFoundError(Exception):
+    """Тема, в которую отправляется сообщение, удалена из группы"""
+    
+    @staticmethod
+    def matches(error: Exception) -> bool:
+        """Сообщает ли ошибка Telegram, что темы больше нет"""
+        text = str(error).lower()
+        return isinstance(error, TelegramBadRequest) and (
+            'thread not found' in text or 'topic_deleted' in text
+        )
+    
+    @classmethod
+    def check(cls, error: Exception):
+        """Пробрасывает ошибку об удаленной теме, чтобы ее не поглотил общий обработчик"""
+        if isinstance(error, cls):
+            raise error
+        if cls.matches(error):
+            raise cls(str(error)) from error
+
+
 class TopicManager:
     """Класс для управления темами в супергруппах"""
     
     # Кэш информации о темах {chat_id: topic_info}
-    _topic_cache: Dict[int, Dict] = {}
+    _topic_cache = TopicCache()
     
-    # Очередь обновлений тем для батчевой обработки
-    _update_queue: Dict[int, Dict] = {}
-    
-    # Флаг для предотвращения множественных обновлений
-    _update_in_progress = False
+    # Блокировки создания темы в процессе {chat_id: [asyncio.Lock, число ожидающих]}
+    _creation_locks: Dict[int, List] = {}
+    # Время жизни блокировки создания темы в Redis и интервал проверки (сек)
+    CREATION_LOCK_TTL = 30
+    CREATION_POLL_INTERVAL = 0.2
+    # Пределы сводки истории для темы, созданной заново (символов)
+    REPLAY_TEXT_LIMIT = 500
+    REPLAY_MAX_LENGTH = 4000
+    # Размер порции чатов при сверке названий тем
+    RECONCILE_BATCH_SIZE = 500
     
     @classmethod
     async def create_topic(cls, bot: Bot, group_id: int, chat_data) -> Optional[int]:
         """
         Создание новой темы для чата
         
+        Если в группе есть запас заранее созданных тем, чат получает одну
+        из них, а название меняется через очередь переименований.
+        
         Args:
             bot: Экземпляр бота
             group_id: ID группы
@@ -37,26 +74,33 @@ class TopicManager:
         try:
             topic_name = cls._generate_topic_name(chat_data)
             
-            # Создаем тему
-            topic = await bot.create_forum_topic(
-                chat_id=group_id,
-                name=topic_name
-            )
-            
-            topic_id = topic.message_thread_id
+            topic_id = await topic_pool.claim(bot, group_id)
+            if topic_id:
+                await topic_renamer.request(bot, group_id, topic_id, topic_name)
+            else:
+                # Создаем тему
+                topic = await bot.create_forum_topic(
+                    chat_id=group_id,
+                    name=topic_name
+                )
+                
+                topic_id = topic.message_thread_id
+                await topic_renamer.remember(group_id, topic_id, topic_name)
             
             # Обновляем в БД
             async with async_session() as session:
                 db = DatabaseQueries(session)
-                await db.update_chat_topic(chat_data.id, topic_id)
+                await db.update_chat_topic(chat_data.id, topic_id, group_id)
+            
+            await topic_router.add(group_id, topic_id, chat_data.id)
             
             # Кэшируем информацию о теме
-            cls._topic_cache[chat_data.id] = {
+            await cls._topic_cache.set(chat_data.id, {
                 'topic_id': topic_id,
                 'name': topic_name,
                 'group_id': group_id,
                 'status': chat_data.status
-            }
+            })
             
             logger.info(f"Создана тема {topic_id} для чата {chat_data.id}")
             return topic_id
@@ -68,7 +112,10 @@ class TopicManager:
     @classmethod
     async def update_topic_name(cls, bot: Bot, chat_data, group_id: int):
         """
-        Обновление названия темы (с батчевой обработкой)
+        Обновление названия темы
+        
+        Переименование ставится в общую очередь TopicRenamer, где быстрые
+        смены названия объединяются в одно.
         
         Args:
             bot: Экземпляр бота
@@ -83,81 +130,107 @@ class TopicManager:
             new_name = cls._generate_topic_name(chat_data)
             
             # Проверяем кэш - нужно ли обновление
-            cached_info = cls._topic_cache.get(chat_data.id)
+            cached_info = await cls._topic_cache.get(chat_data.id)
             if cached_info and cached_info.get('name') == new_name:
                 logger.debug(f"Название темы {chat_data.topic_id} не изменилось: {new_name}")
                 return  # Название не изменилось
             
-            # Проверяем, что тема существует
-            try:
-                # Пытаемся получить информацию о теме
-                await bot.get_chat(group_id)  # Проверяем доступ к группе
-            except Exception as e:
-                logger.error(f"Нет доступа к группе {group_id}: {e}")
+            # Проверяем доступ к группе (результат кэшируется)
+            if not await topic_renamer.has_access(bot, group_id):
                 return
             
-            # Добавляем в очередь обновлений
-            cls._update_queue[chat_data.id] = {
-                'topic_id': chat_data.topic_id,
-                'new_name': new_name,
-                'group_id': group_id,
-                'bot': bot
-            }
+            await topic_renamer.request(bot, group_id, chat_data.topic_id, new_name)
             
             # Обновляем кэш
-            cls._topic_cache[chat_data.id] = {
+            await cls._topic_cache.set(chat_data.id, {
                 'topic_id': chat_data.topic_id,
                 'name': new_name,
                 'group_id': group_id,
                 'status': chat_data.status
-            }
-            
-            logger.debug(f"Запланировано обновление темы {chat_data.topic_id} на: {new_name}")
-            
-            # Запускаем батчевое обновление
-            if not cls._update_in_progress:
-                asyncio.create_task(cls._process_topic_updates())
+            })
                 
         except Exception as e:
             logger.error(f"Ошибка при подготовке обновления темы: {e}")
     
     @classmethod
-    async def _process_topic_updates(cls):
-        """Батчевая обработка обновлений тем"""
-        if cls._update_in_progress:
-            return
+    async def reconcile_topics(cls, bot: Bot) -> int:
+        """
+        Сверка названий тем со статусами чатов после перезапуска
         
-        cls._update_in_progress = True
+        Переименования, запрошенные во время простоя, теряются, и названия
+        тем расходятся со статусами. Чаты каждой группы читаются порциями,
+        ожидаемое название сравнивается с последним отправленным, и только
+        отличающиеся ставятся в очередь TopicRenamer с ее ограничением частоты.
         
-        try:
-            # Ждем немного, чтобы собрать больше обновлений
-            await asyncio.sleep(1)
-            
-            # Обрабатываем все накопленные обновления
-            updates_to_process = dict(cls._update_queue)
-            cls._update_queue.clear()
+        Args:
+            bot: Бот, который создает темы в группах
             
-            for chat_id, update_info in updates_to_process.items():
-                try:
-                    await update_info['bot'].edit_forum_topic(
-                        chat_id=update_info['group_id'],
-                        message_thread_id=update_info['topic_id'],
-                        name=update_info['new_name'],
-
-                    )
+        Returns:
+            Число тем, поставленных на переименование
+        """
+        queued = 0
+        
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            group_ids = await db.get_linked_group_ids()
+        
+        for group_id in group_ids:
+            try:
+                if not await topic_renamer.has_access(bot, group_id):
+                    continue
+                
+                after_chat_id = 0
+                while True:
+                    async with async_session() as session:
+                        db = DatabaseQueries(session)
+                        chats = await db.get_group_topic_chats(group_id, after_chat_id, cls.RECONCILE_BATCH_SIZE)
+                    if not chats:
+                        break
                     
-                    logger.debug(f"Обновлено название темы {update_info['topic_id']}: {update_info['new_name']}")
+                    queued += await cls.rename_topics(bot, chats)
                     
-                except Exception as e:
-                    logger.error(f"Ошибка при обновлении темы {update_info['topic_id']}: {e}")
-                
-                # Небольшая задержка между обновлениями
-                await asyncio.sleep(0.1)
-                
-        except Exception as e:
-            logger.error(f"Ошибка при батчевом обновлении тем: {e}")
-        finally:
-            cls._update_in_progress = False
+                    after_chat_id = chats[-1].id
+                    
+            except Exception as e:
+                logger.error(f"Ошибка при сверке тем группы {group_id}: {e}")
+        
+        if queued:
+            logger.info(f"Сверка тем: {queued} тем поставлено на переименование")
+        return queued
+    
+    @classmethod
+    async def rename_topics(cls, bot: Bot, chats) -> int:
+        """
+        Переименование тем нескольких чатов по их текущим статусам
+        
+        Названия ставятся в очередь TopicRenamer одной пачкой на группу,
+        темы, которые уже так называются, пропускаются.
+        
+        Args:
+            bot: Бот, который создает темы в группах
+            chats: Чаты или строки БД с полями id, group_id, topic_id, first_name, username, status
+            
+        Returns:
+            Число тем, поставленных на переименование
+        """
+        names: Dict[int, Dict[int, str]] = {}
+        for chat in chats:
+            if not chat.topic_id or not chat.group_id:
+                continue
+            
+            name = cls._generate_topic_name(chat)
+            names.setdefault(chat.group_id, {})[chat.topic_id] = name
+            await cls._topic_cache.set(chat.id, {
+                'topic_id': chat.topic_id,
+                'name': name,
+                'group_id': chat.group_id,
+                'status': chat.status
+            })
+        
+        queued = 0
+        for group_id, group_names in names.items():
+            queued += await topic_renamer.request_many(bot, group_id, group_names)
+        return queued
     
     @classmethod
     def _generate_topic_name(cls, chat_data) -> str:
@@ -178,7 +251,7 @@ class TopicManager:
         return f"{emoji} {name}"
     
     @classmethod
-    def get_cached_topic_info(cls, chat_id: int) -> Optional[Dict]:
+    async def get_cached_topic_info(cls, chat_id: int) -> Optional[Dict]:
         """
         Получение кэшированной информации о теме
         
@@ -188,10 +261,15 @@ class TopicManager:
         Returns:
             Информация о теме или None
         """
-        return cls._topic_cache.get(chat_id)
+        return await cls._topic_cache.get(chat_id)
+    
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, float]:
+        """Размер кэша тем и доля попаданий"""
+        return cls._topic_cache.get_stats()
     
     @classmethod
-    def clear_cache(cls, chat_id: Optional[int] = None):
+    async def clear_cache(cls, chat_id: Optional[int] = None):
         """
         Очистка кэша тем
         
@@ -199,7 +277,7 @@ class TopicManager:
             chat_id: ID чата для очистки (если None - очищает весь кэш)
         """
         if chat_id:
-            cls._topic_cache.pop(chat_id, None)
+            await cls._topic_cache.delete(chat_id)
         else:
             cls._topic_cache.clear()
     
@@ -208,6 +286,10 @@ class TopicManager:
         """
         Убеждается, что тема существует, создает если нет
         
+        Тема чата создается один раз: одновременные вызовы в процессе ждут
+        локальную блокировку чата, а в разных процессах - блокировку в Redis,
+        после чего получают ID уже созданной темы.
+        
         Args:
             bot: Экземпляр бота
             chat_data: Данные чата
@@ -219,4 +301,176 @@ class TopicManager:
         if chat_data.topic_id:
             return chat_data.topic_id
         
-        return await cls.create_topic(bot, group_id, chat_data)
+        async with cls._chat_lock(chat_data.id):
+            topic_id = await cls._create_topic_once(bot, chat_data, group_id)
+        
+        if topic_id:
+            chat_data.topic_id = topic_id
+        return topic_id
+    
+    @classmethod
+    async def recreate_topic(cls, bot: Bot, chat_data, group_id: int, lost_topic_id: int) -> Optional[int]:
+        """
+        Создание темы заново, если оператор удалил тему чата
+        
+        Ссылка на удаленную тему снимается в БД, маршрутизаторе и кэше, затем
+        тема создается так же, как в ensure_topic_exists. Одновременные ошибки
+        по одному чату дают одну новую тему: пришедшие позже получают уже
+        созданную. В новую тему одним сообщением отправляются последние
+        TOPIC_REPLAY_MESSAGES сообщений чата.
+        
+        Args:
+            bot: Экземпляр бота
+            chat_data: Данные чата
+            group_id: ID группы
+            lost_topic_id: ID удаленной темы
+            
+        Returns:
+            ID новой темы или None в случае ошибки
+        """
+        async with cls._chat_lock(chat_data.id):
+            topic_id = await cls._get_topic_id(chat_data.id)
+            if not topic_id or topic_id == lost_topic_id:
+                await cls._forget_topic(chat_data.id, group_id, lost_topic_id)
+                topic_id = await cls._create_topic_once(bot, chat_data, group_id, replay=True)
+        
+        chat_data.topic_id = topic_id
+        return topic_id
+    
+    @classmethod
+    @asynccontextmanager
+    async def _chat_lock(cls, chat_id: int):
+        """Локальная блокировка создания темы чата"""
+        entry = cls._creation_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                cls._creation_locks.pop(chat_id, None)
+    
+    @classmethod
+    async def _forget_topic(cls, chat_id: int, group_id: int, topic_id: int):
+        """Снятие ссылок на удаленную тему"""
+        await cls._topic_cache.delete(chat_id)
+        topic_router.remove(group_id, topic_id)
+        
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            # Условие на topic_id: тему, уже созданную другим процессом, не сбрасываем
+            if await db.clear_chat_topic(chat_id, topic_id):
+                logger.warning(f"Тема {topic_id} чата {chat_id} удалена, создаем новую")
+    
+    @classmethod
+    async def _get_topic_id(cls, chat_id: int) -> Optional[int]:
+        """ID темы чата из кэша или БД"""
+        cached_info = await cls._topic_cache.get(chat_id)
+        if cached_info and cached_info.get('topic_id'):
+            return cached_info['topic_id']
+        
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            return await db.get_chat_topic_id(chat_id)
+    
+    @classmethod
+    async def _create_topic_once(cls, bot: Bot, chat_data, group_id: int, replay: bool = False) -> Optional[int]:
+        """
+        Создание темы под блокировкой чата в Redis или ожидание темы, которую создает другой процесс
+        
+        При replay историю чата в новую тему отправляет только тот, кто ее создал.
+        Без Redis тему защищает только локальная блокировка чата.
+        """
+        from utils.redis_manager import redis_manager
+        
+        lock_key = f"topic_create:{chat_data.id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + cls.CREATION_LOCK_TTL
+        
+        while True:
+            # Тему мог создать предыдущий владелец блокировки
+            topic_id = await cls._get_topic_id(chat_data.id)
+            if topic_id:
+                return topic_id
+            
+            if not redis_manager.connected:
+                return await cls._create_and_replay(bot, chat_data, group_id, replay)
+            
+            if await redis_manager.set_nx(lock_key, token, expire=cls.CREATION_LOCK_TTL):
+                try:
+                    return await cls._create_and_replay(bot, chat_data, group_id, replay)
+                finally:
+                    # Блокировка могла истечь и достаться другому процессу - снимаем только свою
+                    await redis_manager.release_lock(lock_key, token)
+            
+            if time.monotonic() > deadline:
+                logger.error(f"Не дождались создания темы для чата {chat_data.id}")
+                return None
+            
+            await asyncio.sleep(cls.CREATION_POLL_INTERVAL)
+    
+    @classmethod
+    async def _create_and_replay(cls, bot: Bot, chat_data, group_id: int, replay: bool) -> Optional[int]:
+        """Создание темы и, при replay, отправка в нее истории чата"""
+        topic_id = await cls.create_topic(bot, group_id, chat_data)
+        if topic_id and replay:
+            await cls._replay_history(bot, chat_data, group_id, topic_id)
+        return topic_id
+    
+    @classmethod
+    async def _replay_history(cls, bot: Bot, chat_data, group_id: int, topic_id: int):
+        """Отправка в новую тему сводки последних сообщений чата"""
+        if config.TOPIC_REPLAY_MESSAGES <= 0:
+            return
+        
+        try:
+            async with async_session() as session:
+                db = DatabaseQueries(session)
+                messages = await db.get_recent_messages(chat_data.id, config.TOPIC_REPLAY_MESSAGES)
+            
+            if not messages:
+                return
+            
+            from aiogram.enums import ParseMode
+            
+            await bot.send_message(
+                chat_id=group_id,
+                text=cls._format_history(messages),
+                parse_mode=ParseMode.MARKDOWN_V2,
+                message_thread_id=topic_id
+            )
+            logger.info(f"В тему {topic_id} отправлена история чата {chat_data.id} ({len(messages)} сообщений)")
+            
+        except Exception as e:
+            logger.error(f"Ошибка при отправке истории чата {chat_data.id}: {e}")
+    
+    @classmethod
+    def _format_history(cls, messages) -> str:
+        """
+        Сводка сообщений в Markdown V2
+        
+        Длинные сообщения обрезаются, а если сводка не помещается в одно
+        сообщение Telegram, в нее попадают только самые поздние.
+        """
+        from utils.markdown_utils import bold, code, escape_md
+        
+        header = bold("♻️ Тема была удалена и создана заново") + "\n" + escape_md("Последние сообщения чата:")
+        
+        lines = []
+        length = len(header)
+        for message in reversed(messages):
+            text = message.content or f"[{message.message_type}]"
+            if len(text) > cls.REPLAY_TEXT_LIMIT:
+                text = text[:cls.REPLAY_TEXT_LIMIT] + "…"
+            
+            author = "👤" if message.from_user else "👨‍💼"
+            sent_at = message.created_at.strftime('%d.%m %H:%M') if message.created_at else ''
+            line = f"{author} {code(sent_at)} {escape_md(text)}"
+            
+            length += len(line) + 1
+            if length > cls.REPLAY_MAX_LENGTH:
+                break
+            lines.append(line)
+        
+        return "\n\n".join([header, "\n".join(reversed(lines))])
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import uuid
+from typing import Dict, Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TopicPool:
+    """Запас заранее созданных тем в группах операторов
+
+    Темы с нейтральным названием TOPIC_POOL_NAME создаются в фоне и хранятся
+    в Redis-списке группы. Новый чат забирает готовую тему из списка вместо
+    ожидания create_forum_topic, а название меняется через очередь
+    переименований. Когда в запасе остается меньше TOPIC_POOL_MIN тем, он
+    пополняется до TOPIC_POOL_SIZE одним процессом на группу, с паузой
+    TOPIC_RENAME_GROUP_INTERVAL между созданиями.
+    """
+
+    REFILL_LOCK_TTL = 120
+
+    def __init__(self):
+        # Локальные задачи пополнения: group_id -> asyncio.Task
+        self._refills: Dict[int, asyncio.Task] = {}
+        self._worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def _pool_key(group_id: int) -> str:
+        return f"topic_pool:{group_id}"
+
+    @staticmethod
+    def _refill_key(group_id: int) -> str:
+        return f"topic_pool:refill:{group_id}"
+
+    @property
+    def enabled(self) -> bool:
+        return config.TOPIC_POOL_SIZE > 0
+
+    async def claim(self, bot: Bot, group_id: int) -> Optional[int]:
+        """
+        Выдача готовой темы группы
+
+        Returns:
+            ID темы или None, если запас пуст
+        """
+        if not self.enabled:
+            return None
+
+        pool_key = self._pool_key(group_id)
+        topic_id = await redis_manager.lpop(pool_key)
+
+        # Пополняем запас, только когда он опустился ниже TOPIC_POOL_MIN
+        low_water = min(max(config.TOPIC_POOL_MIN, 1), config.TOPIC_POOL_SIZE)
+        if topic_id is None or await redis_manager.llen(pool_key) < low_water:
+            self.schedule_refill(bot, group_id)
+
+        if topic_id is None:
+            logger.info(f"Запас тем группы {group_id} пуст, тема создается по запросу")
+            return None
+        return int(topic_id)
+
+    async def warm_up(self, bot: Bot):
+        """Пополнение запаса во всех группах, к которым привязаны боты"""
+        if not self.enabled:
+            return
+
+        from database.database import async_session
+        from database.queries import DatabaseQueries
+
+        async with async_session() as session:
+            db = DatabaseQueries(session)
+            group_ids = await db.get_linked_group_ids()
+
+        for group_id in group_ids:
+            self.schedule_refill(bot, group_id)
+
+    def schedule_refill(self, bot: Bot, group_id: int):
+        """Запуск пополнения запаса группы в фоне"""
+        if not self.enabled:
+            return
+
+        task = self._refills.get(group_id)
+        if task and not task.done():
+            return
+
+        self._refills[group_id] = asyncio.create_task(self._refill(bot, group_id))
+
+    async def _refill(self, bot: Bot, group_id: int):
+        """Создание тем, пока в запасе группы меньше TOPIC_POOL_SIZE"""
+        from utils.topic_renamer import topic_renamer
+
+        pool_key = self._pool_key(group_id)
+        lock_key = self._refill_key(group_id)
+
+        # Запас группы пополняет только один процесс
+        if not await redis_manager.set_nx(lock_key, self._worker_id, expire=self.REFILL_LOCK_TTL):
+            return
+
+        try:
+            while await redis_manager.llen(pool_key) < config.TOPIC_POOL_SIZE:
+                try:
+                    topic = await bot.create_forum_topic(chat_id=group_id, name=config.TOPIC_POOL_NAME)
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Лимит Telegram при пополнении запаса тем группы {group_id}, ждем {e.retry_after} сек")
+                    await asyncio.sleep(e.retry_after)
+                    continue
+
+                await topic_renamer.remember(group_id, topic.message_thread_id, config.TOPIC_POOL_NAME)
+                await redis_manager.rpush(pool_key, str(topic.message_thread_id))
+                if not await redis_manager.refresh_lock(lock_key, self._worker_id, self.REFILL_LOCK_TTL):
+                    # Блокировка истекла и могла достаться другому процессу - он и продолжит
+                    logger.warning(f"Пополнение запаса тем группы {group_id} перешло к другому процессу")
+                    return
+
+                await asyncio.sleep(config.TOPIC_RENAME_GROUP_INTERVAL)
+
+            logger.debug(f"Запас тем группы {group_id} пополнен")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при пополнении запаса тем группы {group_id}: {e}")
+        finally:
+            await redis_manager.release_lock(lock_key, self._worker_id)
+
+
+# Глобальный запас тем
+topic_pool = TopicPool()
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TopicRenamer:
+    """Объединение переименований тем через Redis с ограничением частоты
+
+    Для каждой темы хранится только последнее нужное название, поэтому
+    быстрые смены статуса (ожидает -> отвечен -> ожидает) дают не больше
+    одного edit_forum_topic, а возврат к уже отправленному названию не дает
+    ни одного. Очередь группы разбирает один процесс (блокировка в Redis):
+    между переименованиями в группе выдерживается TOPIC_RENAME_GROUP_INTERVAL,
+    одна тема переименовывается не чаще раза в TOPIC_RENAME_INTERVAL.
+    Без Redis последние названия копятся в памяти процесса и отправляются
+    той же задачей разбора.
+    """
+
+    GROUPS_KEY = "topic_rename:groups"
+    # Время жизни неотправленного названия и отметки об отправленном (сек)
+    PENDING_TTL = 24 * 3600
+    APPLIED_TTL = 30 * 24 * 3600
+    DRAIN_LOCK_TTL = 60
+
+    def __init__(self):
+        # Локальные задачи разбора очереди: group_id -> asyncio.Task
+        self._drains: Dict[int, asyncio.Task] = {}
+        # Очередь без Redis: group_id -> {topic_id: (название, бот)}
+        self._local_pending: Dict[int, Dict[int, Tuple[str, Bot]]] = {}
+        self._worker_id = uuid.uuid4().hex
+
+    @staticmethod
+    def _pending_key(group_id: int) -> str:
+        return f"topic_rename:{group_id}"
+
+    @staticmethod
+    def _name_key(group_id: int, topic_id: int) -> str:
+        return f"topic_rename:{group_id}:{topic_id}"
+
+    @staticmethod
+    def _applied_key(group_id: int, topic_id: int) -> str:
+        return f"topic_name:{group_id}:{topic_id}"
+
+    @staticmethod
+    def _cooldown_key(group_id: int, topic_id: int) -> str:
+        return f"topic_rename:cooldown:{group_id}:{topic_id}"
+
+    @staticmethod
+    def _drain_key(group_id: int) -> str:
+        return f"topic_rename:drain:{group_id}"
+
+    @staticmethod
+    def _access_key(bot_id: int, group_id: int) -> str:
+        return f"group_access:{bot_id}:{group_id}"
+
+    async def has_access(self, bot: Bot, group_id: int) -> bool:
+        """Проверка доступа бота к группе (успешная проверка кэшируется на GROUP_ACCESS_TTL)"""
+        key = self._access_key(bot.id, group_id)
+        if await redis_manager.exists(key):
+            return True
+
+        try:
+            await bot.get_chat(group_id)
+        except Exception as e:
+            logger.error(f"Нет доступа к группе {group_id}: {e}")
+            return False
+
+        await redis_manager.set(key, 1, expire=config.GROUP_ACCESS_TTL)
+        return True
+
+    async def get_applied(self, group_id: int, topic_id: int) -> Optional[str]:
+        """Последнее название, отправленное в Telegram (None, если неизвестно)"""
+        applied = await redis_manager.get(self._applied_key(group_id, topic_id))
+        return str(applied) if applied is not None else None
+
+    async def remember(self, group_id: int, topic_id: int, name: str):
+        """Запоминание названия, с которым тема уже создана или переименована"""
+        await redis_manager.set(self._applied_key(group_id, topic_id), name, expire=self.APPLIED_TTL)
+
+    async def request(self, bot: Bot, group_id: int, topic_id: int, name: str) -> bool:
+        """
+        Запрос переименования темы
+
+        Более поздний запрос для той же темы заменяет еще не отправленный.
+
+        Returns:
+            True если переименование поставлено в очередь
+        """
+        return await self.request_many(bot, group_id, {topic_id: name}) > 0
+
+    async def request_many(self, bot: Bot, group_id: int, names: Dict[int, str]) -> int:
+        """
+        Запрос переименования нескольких тем группы
+
+        Args:
+            bot: Бот, от имени которого переименовываются темы
+            group_id: ID группы
+            names: Новые названия {topic_id: name}
+
+        Returns:
+            Число тем, поставленных в очередь
+        """
+        if not redis_manager.connected:
+            pending = self._local_pending.setdefault(group_id, {})
+            for topic_id, name in names.items():
+                pending[int(topic_id)] = (name, bot)
+            self._schedule(group_id)
+            return len(names)
+
+        queued = []
+        for topic_id, name in names.items():
+            if await self.get_applied(group_id, topic_id) == name:
+                # Тема уже называется так - отменяем отложенное переименование
+                await redis_manager.delete(self._name_key(group_id, topic_id))
+                continue
+
+            if await redis_manager.set(
+                self._name_key(group_id, topic_id), {'name': name, 'bot_id': bot.id}, expire=self.PENDING_TTL
+            ):
+                queued.append(str(topic_id))
+                logger.debug(f"Запланировано обновление темы {topic_id} на: {name}")
+
+        if not queued:
+            return 0
+
+        await redis_manager.sadd(self._pending_key(group_id), *queued)
+        await redis_manager.sadd(self.GROUPS_KEY, str(group_id))
+
+        self._schedule(group_id)
+        return len(queued)
+
+    async def resume(self):
+        """Разбор очередей, оставшихся после перезапуска"""
+        for group_id in await redis_manager.smembers(self.GROUPS_KEY):
+            if await redis_manager.smembers(self._pending_key(group_id)):
+                self._schedule(int(group_id), delay=0)
+            else:
+                await redis_manager.srem(self.GROUPS_KEY, group_id)
+
+    def _schedule(self, group_id: int, delay: Optional[float] = None):
+        task = self._drains.get(group_id)
+        if task and not task.done():
+            return
+
+        if delay is None:
+            delay = config.TOPIC_RENAME_DELAY
+        self._drains[group_id] = asyncio.create_task(self._drain(group_id, delay))
+
+    async def _drain(self, group_id: int, delay: float):
+        """Разбор очереди переименований группы, пока она не опустеет"""
+        pending_key = self._pending_key(group_id)
+        lock_key = self._drain_key(group_id)
+
+        try:
+            # Ждем немного, чтобы собрать больше обновлений
+            await asyncio.sleep(delay)
+
+            while True:
+                if group_id in self._local_pending:
+                    await self._rename_local_round(group_id)
+                    await asyncio.sleep(config.TOPIC_RENAME_GROUP_INTERVAL)
+                    continue
+
+                topic_ids = await redis_manager.smembers(pending_key)
+                if not topic_ids:
+                    # Без await до выхода: новый запрос запустит новую задачу
+                    self._drains.pop(group_id, None)
+                    return
+
+                # Очередь группы разбирает только один процесс
+                if await redis_manager.set_nx(lock_key, self._worker_id, expire=self.DRAIN_LOCK_TTL):
+                    try:
+                        await self._rename_round(group_id, topic_ids, lock_key)
+                    finally:
+                        # После долгого ожидания лимита блокировка могла истечь
+                        # и достаться другому процессу - снимаем только свою
+                        await redis_manager.release_lock(lock_key, self._worker_id)
+
+                await asyncio.sleep(config.TOPIC_RENAME_GROUP_INTERVAL)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при переименовании тем группы {group_id}: {e}")
+        finally:
+            if self._drains.get(group_id) is asyncio.current_task():
+                self._drains.pop(group_id, None)
+
+    async def _rename_round(self, group_id: int, topic_ids: Iterable[str], lock_key: str):
+        """Отправка накопленных переименований группы"""
+        from utils.bot_manager import bot_manager
+
+        pending_key = self._pending_key(group_id)
+
+        for topic_id in topic_ids:
+            # Тема недавно переименовывалась - последнее название уйдет после паузы
+            if await redis_manager.exists(self._cooldown_key(group_id, topic_id)):
+                continue
+
+            # Сначала убираем тему из очереди, затем забираем название:
+            # запрос, пришедший между этими шагами, снова добавит тему в очередь
+            await redis_manager.srem(pending_key, topic_id)
+            desired = await redis_manager.getdel(self._name_key(group_id, topic_id))
+            if not isinstance(desired, dict):
+                continue
+
+            name = desired['name']
+            if await self.get_applied(group_id, topic_id) == name:
+                continue
+
+            bot = bot_manager.get_bot_by_telegram_id(desired['bot_id'])
+            if not bot:
+                logger.warning(f"Бот {desired['bot_id']} для переименования темы {topic_id} не запущен")
+                continue
+
+            try:
+                await bot.edit_forum_topic(chat_id=group_id, message_thread_id=int(topic_id), name=name)
+                logger.debug(f"Обновлено название темы {topic_id}: {name}")
+
+            except TelegramRetryAfter as e:
+                logger.warning(f"Лимит Telegram при переименовании тем группы {group_id}, ждем {e.retry_after} сек")
+                await self._requeue(group_id, topic_id, desired)
+                await asyncio.sleep(e.retry_after)
+                return
+            except TelegramBadRequest as e:
+                if 'TOPIC_NOT_MODIFIED' not in str(e):
+                    logger.error(f"Ошибка при обновлении темы {topic_id}: {e}")
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении темы {topic_id}: {e}")
+                # Доступ к группе мог пропасть - при следующем запросе проверяем заново
+                await redis_manager.delete(self._access_key(bot.id, group_id))
+                continue
+
+            await self.remember(group_id, topic_id, name)
+            await redis_manager.set(self._cooldown_key(group_id, topic_id), 1, expire=config.TOPIC_RENAME_INTERVAL)
+            if not await redis_manager.refresh_lock(lock_key, self._worker_id, self.DRAIN_LOCK_TTL):
+                # Блокировка истекла и могла достаться другому процессу - он и продолжит
+                logger.warning(f"Очередь переименований группы {group_id} перешла к другому процессу")
+                return
+
+            await asyncio.sleep(config.TOPIC_RENAME_GROUP_INTERVAL)
+
+    async def _rename_local_round(self, group_id: int):
+        """Отправка переименований из очереди в памяти (без Redis)"""
+        pending = self._local_pending.pop(group_id, {})
+
+        while pending:
+            topic_id, (name, bot) = pending.popitem()
+            try:
+                await bot.edit_forum_topic(chat_id=group_id, message_thread_id=topic_id, name=name)
+                logger.debug(f"Обновлено название темы {topic_id}: {name}")
+
+            except TelegramRetryAfter as e:
+                logger.warning(f"Лимит Telegram при переименовании тем группы {group_id}, ждем {e.retry_after} сек")
+                # Более новые запросы, пришедшие за время отправки, не перезаписываем
+                pending[topic_id] = (name, bot)
+                queued = self._local_pending.setdefault(group_id, {})
+                for pending_topic_id, value in pending.items():
+                    queued.setdefault(pending_topic_id, value)
+                await asyncio.sleep(e.retry_after)
+                return
+            except TelegramBadRequest as e:
+                if 'TOPIC_NOT_MODIFIED' not in str(e):
+                    logger.error(f"Ошибка при обновлении темы {topic_id}: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении темы {topic_id}: {e}")
+
+            if pending:
+                await asyncio.sleep(config.TOPIC_RENAME_GROUP_INTERVAL)
+
+    async def _requeue(self, group_id: int, topic_id: str, desired: Dict[str, Any]):
+        """Возврат неотправленного названия в очередь (если нет более нового)"""
+        await redis_manager.set_nx(self._name_key(group_id, topic_id), json.dumps(desired, ensure_ascii=False), expire=self.PENDING_TTL)
+        await redis_manager.sadd(self._pending_key(group_id), topic_id)
+
+
+# Глобальный экземпляр переименования тем
+topic_renamer = TopicRenamer()
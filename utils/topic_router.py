@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from utils.redis_manager import redis_manager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TopicRouter:
+    """Таблица маршрутов (group_id, topic_id) -> чат
+
+    ID тем уникальны только внутри группы, поэтому маршрут включает группу.
+    Маршрут хранит поля чата, нужные обработчикам операторов, поэтому
+    сообщение в известной теме не стоит запроса к БД. Неизвестная тема
+    ищется в БД одним запросом по индексу (group_id, topic_id). В памяти
+    не больше TOPIC_CACHE_MAX_SIZE маршрутов, давно не использованные
+    удаляются.
+
+    Маршрут чата сбрасывается при смене статуса или темы. Другие процессы
+    (API) сообщают о смене статусов через канал Redis; пока подписка на
+    канал не работает, маршруты не запоминаются и чат читается из БД.
+
+    Темы, не привязанные к чатам (служебные темы операторов), запоминаются
+    в Redis на TOPIC_MISS_TTL, чтобы сообщения в них не стоили запроса к БД;
+    отметка снимается, когда тема становится темой чата.
+    """
+
+    INVALIDATE_CHANNEL = "topic_router:invalidate"
+
+    # Пауза перед повторной подпиской после ошибки (сек)
+    RESUBSCRIBE_DELAY = 5
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or config.TOPIC_CACHE_MAX_SIZE
+        # {(group_id, topic_id): поля чата}, последние использованные в конце
+        self._routes: OrderedDict = OrderedDict()
+        # {chat_id: (group_id, topic_id)} для сброса маршрута по ID чата
+        self._chat_routes: Dict[int, Tuple[int, int]] = {}
+        # Растет с каждым сбросом: чат, прочитанный до сброса, не запоминается
+        self._generation = 0
+        self._listening = False
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _miss_key(group_id: int, topic_id: int) -> str:
+        return f"topic_miss:{group_id}:{topic_id}"
+
+    def start(self):
+        """Подписка на сброс маршрутов из других процессов"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def add(self, group_id: int, topic_id: int, chat_id: int):
+        """Тема стала темой чата (вызывается после сохранения темы в БД)"""
+        self.forget_chat(chat_id)
+        self.remove(group_id, topic_id)
+        await redis_manager.delete(self._miss_key(group_id, topic_id))
+
+    def remove(self, group_id: int, topic_id: int):
+        """Удаление маршрута темы (тема удалена или заменена)"""
+        self._generation += 1
+        fields = self._routes.pop((group_id, topic_id), None)
+        if fields:
+            self._chat_routes.pop(fields['id'], None)
+
+    def forget_chat(self, chat_id: int):
+        """Удаление маршрута чата в этом процессе"""
+        self._generation += 1
+        route = self._chat_routes.pop(chat_id, None)
+        if route:
+            self._routes.pop(route, None)
+
+    async def invalidate(self, chat_ids: Iterable[int]):
+        """Сброс маршрутов чатов во всех процессах (после смены статуса)"""
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return
+
+        for chat_id in chat_ids:
+            self.forget_chat(chat_id)
+        await redis_manager.publish(self.INVALIDATE_CHANNEL, chat_ids)
+
+    async def get_chat(self, db, group_id: int, topic_id: int):
+        """
+        Чат с ботом по теме группы
+
+        Args:
+            db: DatabaseQueries для поиска неизвестной темы
+            group_id: ID группы операторов
+            topic_id: ID темы
+
+        Returns:
+            Chat (без загруженного бота) или None
+        """
+        from database.models import Chat
+
+        fields = self._routes.get((group_id, topic_id))
+        if fields is not None:
+            self._routes.move_to_end((group_id, topic_id))
+            # Каждый вызов получает свою копию: обработчик может менять поля
+            return Chat(**fields)
+
+        miss_key = self._miss_key(group_id, topic_id)
+        if config.TOPIC_MISS_TTL > 0 and await redis_manager.exists(miss_key):
+            return None
+
+        generation = self._generation
+        chat_data = await db.get_chat_by_topic(group_id, topic_id)
+        if chat_data is None and config.TOPIC_MISS_TTL > 0:
+            await redis_manager.set(miss_key, 1, expire=config.TOPIC_MISS_TTL)
+            # Тема могла стать темой чата между запросом и отметкой: add()
+            # снимает отметку после записи в БД, поэтому проверяем БД еще раз
+            chat_data = await db.get_chat_by_topic(group_id, topic_id)
+            if chat_data is not None:
+                await redis_manager.delete(miss_key)
+
+        if chat_data is not None and self._listening and generation == self._generation:
+            self._store(group_id, topic_id, {
+                column.name: getattr(chat_data, column.name) for column in Chat.__table__.columns
+            })
+        return chat_data
+
+    def _store(self, group_id: int, topic_id: int, fields: Dict):
+        self.forget_chat(fields['id'])
+        self._routes[(group_id, topic_id)] = fields
+        self._routes.move_to_end((group_id, topic_id))
+        self._chat_routes[fields['id']] = (group_id, topic_id)
+
+        while len(self._routes) > self.max_size:
+            _, evicted = self._routes.popitem(last=False)
+            self._chat_routes.pop(evicted['id'], None)
+
+    async def _listen(self):
+        """Прием сброшенных маршрутов из канала Redis"""
+        while True:
+            pubsub = redis_manager.pubsub()
+            try:
+                if pubsub is not None:
+                    await pubsub.subscribe(self.INVALIDATE_CHANNEL)
+                    self._listening = True
+                    async for message in pubsub.listen():
+                        if message.get('type') != 'message':
+                            continue
+                        for chat_id in json.loads(message['data']):
+                            self.forget_chat(int(chat_id))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на сброс маршрутов тем: {e}")
+            finally:
+                self._reset()
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+            await asyncio.sleep(self.RESUBSCRIBE_DELAY)
+
+    def _reset(self):
+        """Сбросы, пропущенные без подписки, не узнать - забываем все маршруты"""
+        self._listening = False
+        self._generation += 1
+        self._routes.clear()
+        self._chat_routes.clear()
+
+
+# Глобальная таблица маршрутов тем
+topic_router = TopicRouter()